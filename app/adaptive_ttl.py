@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+from typing import Any
+
+from app.cache import RedisCache
+from app.exceptions import CacheError
+from app.metrics import metrics
+
+logger = logging.getLogger("fastbgpq4")
+
+
+def content_hash(data: dict[str, Any]) -> str:
+    """Stable digest of a cached result, used to tell whether it changed."""
+    serialized = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(serialized.encode(), digest_size=16).hexdigest()
+
+
+class AdaptiveTTL:
+    """Per-key cache TTLs that follow how often a query's result changes.
+
+    Every time a result is written its content hash is compared with the
+    previous one: an unchanged result multiplies the key's TTL by
+    ``growth``, a changed one by ``shrink``, always within ``min_ttl`` and
+    ``max_ttl``. New keys start at ``default_ttl``. TTLs requested
+    explicitly are used as is, capped at ``max_ttl``.
+    """
+
+    def __init__(
+        self,
+        cache: RedisCache,
+        default_ttl: int = 300,
+        min_ttl: int = 60,
+        max_ttl: int = 3600,
+        growth: float = 2.0,
+        shrink: float = 0.5,
+        state_ttl: int = 604800,
+        enabled: bool = True,
+    ):
+        self.cache = cache
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.growth = growth
+        self.shrink = shrink
+        self.state_ttl = state_ttl
+        self.enabled = enabled
+
+    @staticmethod
+    def key(cache_key: str) -> str:
+        return f"ttlstate:{cache_key}"
+
+    def requested(self, ttl: int | None) -> int:
+        """TTL for a response before any result was written."""
+        return min(ttl if ttl is not None else self.default_ttl, self.max_ttl)
+
+    async def resolve(self, cache_key: str, data: dict[str, Any], ttl: int | None = None) -> int:
+        """Return the TTL to cache a freshly fetched result with."""
+        if ttl is not None or not self.enabled:
+            ttl = self.requested(ttl)
+            metrics.track_cache_ttl(ttl)
+            return ttl
+
+        digest = content_hash(data)
+        try:
+            state = await self.cache.get(self.key(cache_key))
+            if state is None:
+                ttl, outcome = self.default_ttl, "new"
+            elif state["hash"] == digest:
+                ttl, outcome = state["ttl"] * self.growth, "unchanged"
+            else:
+                ttl, outcome = state["ttl"] * self.shrink, "changed"
+            ttl = int(max(self.min_ttl, min(self.max_ttl, ttl)))
+            await self.cache.set(self.key(cache_key), {"hash": digest, "ttl": ttl}, self.state_ttl)
+        except CacheError as e:
+            # Without history fall back to the static default
+            logger.warning(f"Failed to update TTL state of {cache_key}: {e}")
+            ttl, outcome = self.requested(None), "unknown"
+
+        metrics.track_cache_content(outcome)
+        metrics.track_cache_ttl(ttl)
+        return ttl
@@ -1,15 +1,127 @@
+import secrets
 from functools import lru_cache
+from typing import Any
 
+from fastapi import Depends, Header, HTTPException
+
+from app.adaptive_ttl import AdaptiveTTL
 from app.bgpq4 import BGPq4Client
-from app.cache import RedisCache
+from app.budget import RetryBudget
+from app.cache import LocalCache, RedisCache
+from app.cache_tags import CacheTags
+from app.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry
 from app.config import settings
+from app.execution_pool import ExecutionPool
+from app.hedging import HedgePolicy
+from app.hotkeys import HitBuffer, HotKeyTracker
+from app.irr_mirrors import MirrorPool
+from app.job_events import JobEvents
+from app.job_store import JobStore
+from app.latency import LatencyTracker
+from app.negative_cache import BloomFilter, NegativeCache
+from app.prefix_index import PrefixIndexHolder
+from app.rpki import VRPHolder
+from app.shared_cache import SharedMemoryCache
 from app.tasks.broker import get_broker as _get_broker
 
 
+def cache_topology() -> dict[str, Any]:
+    """Where cached results live: one Redis, a Redis Cluster or client-side shards."""
+    return {
+        "redis_url": settings.redis_cluster_url or settings.redis_url,
+        "cluster": bool(settings.redis_cluster_url),
+        "shard_urls": settings.redis_shard_urls or None,
+    }
+
+
 @lru_cache
 def get_cache() -> RedisCache:
     """Get Redis cache instance."""
-    return RedisCache(settings.redis_url)
+    operation_timeout = settings.redis_operation_timeout_ms / 1000
+    return RedisCache(
+        **cache_topology(),
+        operation_timeout=operation_timeout,
+        breaker=CircuitBreaker(
+            "redis",
+            min_calls=settings.redis_circuit_min_calls,
+            window_seconds=settings.redis_circuit_window_seconds,
+            slow_call_seconds=operation_timeout,
+            open_seconds=settings.redis_circuit_open_seconds,
+        ),
+        fallback=(
+            LocalCache(settings.local_cache_max_entries)
+            if settings.local_cache_max_entries > 0
+            else None
+        ),
+        write_behind_max_pending=settings.write_behind_max_pending,
+        write_behind_batch_size=settings.write_behind_batch_size,
+        shared=(
+            SharedMemoryCache(
+                settings.shared_cache_path,
+                arena_bytes=settings.shared_cache_size_mb * 1024 * 1024,
+                slots=settings.shared_cache_slots,
+                max_ttl=settings.shared_cache_ttl,
+            )
+            if settings.shared_cache_path
+            else None
+        ),
+    )
+
+
+@lru_cache
+def get_retry_budget() -> RetryBudget:
+    """Get the process-wide bgpq4 retry budget."""
+    return RetryBudget(rate=settings.retry_budget_rate, burst=settings.retry_budget_burst)
+
+
+@lru_cache
+def get_circuit_breakers() -> CircuitBreakerRegistry | None:
+    """Get the process-wide circuit breakers, one per IRR source set."""
+    if not settings.circuit_breaker_enabled:
+        return None
+    return CircuitBreakerRegistry(
+        failure_rate=settings.circuit_breaker_failure_rate,
+        min_calls=settings.circuit_breaker_min_calls,
+        window_seconds=settings.circuit_breaker_window_seconds,
+        slow_call_seconds=settings.circuit_breaker_slow_call_ms / 1000,
+        open_seconds=settings.circuit_breaker_open_seconds,
+    )
+
+
+@lru_cache
+def get_hedge_policy() -> HedgePolicy | None:
+    """Get the process-wide hedging policy, if an alternate IRR host is set."""
+    if not settings.irr_hedge_host:
+        return None
+    return HedgePolicy(
+        settings.irr_hedge_host,
+        percentile=settings.hedge_percentile,
+        min_delay=settings.hedge_min_delay_ms / 1000,
+        default_delay=settings.hedge_default_delay_ms / 1000,
+        budget=RetryBudget(rate=settings.hedge_budget_rate, burst=settings.hedge_budget_burst),
+    )
+
+
+@lru_cache
+def get_mirror_pool() -> MirrorPool | None:
+    """Get the IRR mirror pool, if mirrors are configured."""
+    if not settings.irr_mirrors:
+        return None
+    return MirrorPool(
+        settings.irr_mirrors,
+        ewma_alpha=settings.mirror_ewma_alpha,
+        eject_failures=settings.mirror_eject_failures,
+        eject_seconds=settings.mirror_eject_seconds,
+        max_ejected_fraction=settings.mirror_max_ejected_fraction,
+    )
+
+
+@lru_cache
+def get_execution_pool() -> ExecutionPool:
+    """Get the pool limiting concurrent bgpq4 processes in the API."""
+    return ExecutionPool(
+        max_concurrency=settings.bgpq4_max_concurrency, max_queue=settings.bgpq4_max_queue
+    )
 
 
 @lru_cache
@@ -20,10 +132,163 @@ def get_bgpq4_client() -> BGPq4Client:
         default_sources=settings.irr_sources,
         max_retries=settings.max_retries,
         retry_backoff=settings.retry_backoff_factor,
+        retry_budget=get_retry_budget(),
+        breakers=get_circuit_breakers(),
+        pool=get_execution_pool(),
+        host=settings.irr_host,
+        hedge=get_hedge_policy(),
+        mirrors=get_mirror_pool(),
+    )
+
+
+@lru_cache
+def get_prefix_index() -> PrefixIndexHolder:
+    """Get reverse prefix index holder."""
+    return PrefixIndexHolder(
+        max_age_seconds=settings.prefix_index_refresh_interval,
+        rpsl_file=settings.prefix_index_rpsl_file,
     )
 
 
+@lru_cache
+def get_vrp_holder() -> VRPHolder:
+    """Get RPKI VRP holder."""
+    return VRPHolder(settings.rpki_vrp_file, reload_interval=settings.rpki_reload_interval)
+
+
 @lru_cache
 def get_broker():
     """Get Taskiq broker instance."""
-    return _get_broker(settings.redis_url)
+    return _get_broker(
+        settings.redis_url,
+        lane_weights=settings.job_lane_weights,
+        result_ttl=settings.job_result_ttl,
+    )
+
+
+def get_latency_tracker(cache: RedisCache = Depends(get_cache)) -> LatencyTracker:
+    """Get execution latency tracker backed by the cache's Redis."""
+    return LatencyTracker(
+        cache,
+        alpha=settings.latency_ewma_alpha,
+        min_samples=settings.latency_min_samples,
+        stats_ttl=settings.latency_stats_ttl,
+    )
+
+
+@lru_cache
+def get_missing_filter() -> BloomFilter | None:
+    """Get the process-wide Bloom filter of queries known to fail, if enabled."""
+    if settings.negative_cache_bloom_capacity <= 0:
+        return None
+    return BloomFilter(
+        settings.negative_cache_bloom_capacity, settings.negative_cache_bloom_error_rate
+    )
+
+
+def get_negative_cache(cache: RedisCache = Depends(get_cache)) -> NegativeCache:
+    """Get the cache of permanent bgpq4 failures."""
+    return NegativeCache(
+        cache,
+        ttl=settings.negative_cache_ttl,
+        bloom=get_missing_filter(),
+        bloom_sync_seconds=settings.negative_cache_bloom_sync_seconds,
+    )
+
+
+@lru_cache
+def get_hit_buffer() -> HitBuffer:
+    """Get the process-wide buffer of request counts awaiting a flush to Redis."""
+    return HitBuffer()
+
+
+def get_hot_key_tracker(cache: RedisCache = Depends(get_cache)) -> HotKeyTracker:
+    """Get the query popularity tracker backed by the cache's Redis."""
+    return HotKeyTracker(
+        cache,
+        top_k=settings.hot_key_top_k,
+        window_seconds=settings.hot_key_window_seconds,
+        min_hits=settings.hot_key_min_hits,
+        buffer=get_hit_buffer(),
+        flush_seconds=settings.hot_key_flush_seconds,
+    )
+
+
+def get_adaptive_ttl(cache: RedisCache = Depends(get_cache)) -> AdaptiveTTL:
+    """Get the churn-adaptive TTL policy backed by the cache."""
+    return AdaptiveTTL(
+        cache,
+        default_ttl=settings.default_cache_ttl,
+        min_ttl=settings.min_cache_ttl,
+        max_ttl=settings.max_cache_ttl,
+        growth=settings.cache_ttl_growth,
+        shrink=settings.cache_ttl_shrink,
+        state_ttl=settings.cache_ttl_state_ttl,
+        enabled=settings.adaptive_cache_ttl_enabled,
+    )
+
+
+def get_cache_tags(cache: RedisCache = Depends(get_cache)) -> CacheTags:
+    """Get the tag index of cached results, kept as long as entries and stale copies live."""
+    return CacheTags(
+        cache,
+        ttl=max(settings.max_cache_ttl, settings.stale_cache_ttl),
+        batch_size=settings.cache_invalidation_batch_size,
+        enabled=settings.cache_tags_enabled,
+    )
+
+
+@lru_cache
+def get_job_events() -> JobEvents:
+    """Get the job status subscription shared by this process's waiting clients."""
+    return JobEvents(get_cache())
+
+
+def get_job_store(
+    cache: RedisCache = Depends(get_cache), events: JobEvents = Depends(get_job_events)
+) -> JobStore:
+    """Get the store of background job records."""
+    return JobStore(
+        cache,
+        ttl=settings.job_result_ttl,
+        dedup_window=settings.job_dedup_window,
+        events=events,
+    )
+
+
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    """Guard for admin endpoints: a valid X-Admin-Token header."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Admin API is disabled")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+class QueryServices:
+    """Services shared by the expand endpoints."""
+
+    def __init__(
+        self,
+        cache: RedisCache = Depends(get_cache),
+        client: BGPq4Client = Depends(get_bgpq4_client),
+        broker=Depends(get_broker),
+        vrps: VRPHolder = Depends(get_vrp_holder),
+        prefix_index: PrefixIndexHolder = Depends(get_prefix_index),
+        latency: LatencyTracker = Depends(get_latency_tracker),
+        negative: NegativeCache = Depends(get_negative_cache),
+        hotkeys: HotKeyTracker = Depends(get_hot_key_tracker),
+        ttls: AdaptiveTTL = Depends(get_adaptive_ttl),
+        tags: CacheTags = Depends(get_cache_tags),
+        jobs: JobStore = Depends(get_job_store),
+    ):
+        self.cache = cache
+        self.client = client
+        self.broker = broker
+        self.vrps = vrps
+        self.prefix_index = prefix_index
+        self.latency = latency
+        self.negative = negative
+        self.hotkeys = hotkeys
+        self.ttls = ttls
+        self.tags = tags
+        self.jobs = jobs
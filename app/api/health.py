@@ -1,16 +1,34 @@
 from datetime import datetime
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from fastapi.responses import PlainTextResponse
 from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
+from app.api.dependencies import get_cache, get_circuit_breakers, get_mirror_pool
+from app.cache import RedisCache
+from app.circuit_breaker import CLOSED
+
 router = APIRouter()
 
 
 @router.get("/health")
-async def health_check():
+async def health_check(cache: RedisCache = Depends(get_cache)):
     """Health check endpoint."""
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    breakers = get_circuit_breakers()
+    circuits = breakers.snapshot() if breakers is not None else {}
+    if cache.breaker is not None:
+        circuits[cache.breaker.name] = cache.breaker.snapshot()
+    mirrors = get_mirror_pool()
+    mirror_states = mirrors.snapshot() if mirrors is not None else {}
+    degraded = any(circuit["state"] != CLOSED for circuit in circuits.values()) or any(
+        mirror["ejected"] for mirror in mirror_states.values()
+    )
+    return {
+        "status": "degraded" if degraded else "healthy",
+        "timestamp": datetime.utcnow().isoformat(),
+        "circuit_breakers": circuits,
+        "irr_mirrors": mirror_states,
+    }
 
 
 @router.get("/metrics")
@@ -0,0 +1,116 @@
+import asyncio
+import zlib
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies import (
+    get_broker,
+    get_cache,
+    get_cache_tags,
+    get_hot_key_tracker,
+    get_prefix_index,
+    require_admin,
+)
+from app.cache import RedisCache
+from app.cache_tags import CacheTags
+from app.config import settings
+from app.exceptions import CacheError
+from app.hotkeys import HotKeyTracker
+from app.models.query import CanonicalQuery
+from app.models.requests import InvalidationRequest
+from app.prefix_index import PrefixIndexHolder
+from app.snapshot import gunzip_lines, gzip_stream, iter_snapshot, restore_snapshot
+
+router = APIRouter(prefix="/api/v1/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/snapshot")
+async def export_snapshot(
+    cache: RedisCache = Depends(get_cache),
+    hotkeys: HotKeyTracker = Depends(get_hot_key_tracker),
+    tags: CacheTags = Depends(get_cache_tags),
+):
+    """Stream a gzip snapshot of all cached results."""
+    return StreamingResponse(
+        gzip_stream(iter_snapshot(cache, hotkeys, tags)),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="fastbgpq4-cache.jsonl.gz"'},
+    )
+
+
+@router.post("/snapshot")
+async def import_snapshot(
+    request: Request,
+    min_hits: int = Query(0, description="Skip entries requested fewer times"),
+    max_age: int | None = Query(None, description="Skip entries older than this (seconds)"),
+    cache: RedisCache = Depends(get_cache),
+    tags: CacheTags = Depends(get_cache_tags),
+):
+    """Restore cached results from a gzip snapshot in the request body.
+
+    Fails with 503 while Redis is unavailable rather than restoring into
+    this process's local fallback only.
+    """
+    try:
+        return await restore_snapshot(
+            cache,
+            gunzip_lines(request.stream()),
+            min_hits=min_hits,
+            max_age=max_age,
+            state_ttl=settings.cache_ttl_state_ttl,
+            tags=tags,
+        )
+    except (ValueError, KeyError, zlib.error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot: {e}")
+    except CacheError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.post("/invalidate")
+async def invalidate(
+    request: InvalidationRequest,
+    tags: CacheTags = Depends(get_cache_tags),
+    broker=Depends(get_broker),
+):
+    """Invalidate all cached results for some targets, IRR sources or ASNs."""
+    try:
+        tag_keys = [
+            *(CacheTags.key("target", CanonicalQuery.normalize(t).target) for t in request.targets),
+            *(CacheTags.key("source", source.strip()) for source in request.sources),
+            *(CacheTags.key("asn", str(asn)) for asn in request.asns),
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not tag_keys:
+        raise HTTPException(status_code=400, detail="Nothing to invalidate")
+
+    async def refresh(queries: list[dict]) -> None:
+        # Entries stay served until the bulk lane rewrites them
+        await asyncio.gather(
+            *(
+                broker.execute_bgpq4_query.kiq(
+                    job_id=None, cache_ttl=None, priority="bulk", **query
+                )
+                for query in queries
+            )
+        )
+
+    try:
+        count = await tags.invalidate(tag_keys, request.mode, refresh=refresh)
+    except CacheError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"mode": request.mode, "invalidated": count}
+
+
+@router.post("/prefix-index/rebuild")
+async def rebuild_prefix_index(
+    cache: RedisCache = Depends(get_cache),
+    holder: PrefixIndexHolder = Depends(get_prefix_index),
+):
+    """Rebuild the reverse prefix index now instead of when it goes stale."""
+    try:
+        index = await holder.get(cache, force=True)
+    except CacheError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"index_size": len(index), "index_built_at": index.built_at}
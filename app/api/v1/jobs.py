@@ -1,50 +1,215 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+from typing import Any
 
-from app.api.dependencies import get_cache
-from app.cache import RedisCache
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.api.dependencies import (
+    get_cache,
+    get_job_events,
+    get_job_store,
+    get_prefix_index,
+    get_vrp_holder,
+)
+from app.cache import RedisCache, key_target
+from app.config import settings
+from app.exceptions import CacheError, RPKIError
+from app.job_events import JobEvents
+from app.job_store import JobStore
 from app.models.job import JobStatus
 from app.models.responses import JobStatusResponse
+from app.prefix_index import PrefixIndexHolder
+from app.rpki import VRPHolder, apply_rov
 
 router = APIRouter(prefix="/api/v1/jobs", tags=["jobs"])
 
+FINISHED = (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+async def _read(jobs: JobStore, job_id: str) -> dict[str, Any] | None:
+    try:
+        return await jobs.get(job_id)
+    except CacheError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def _wait(
+    jobs: JobStore, updates: asyncio.Queue[str], job_id: str, timeout: float
+) -> dict[str, Any] | None:
+    """Re-read a job once it changes, or after ``timeout`` seconds."""
+    try:
+        await asyncio.wait_for(updates.get(), timeout)
+    except TimeoutError:
+        # Also covers events lost while the subscription was down
+        pass
+    return await _read(jobs, job_id)
+
+
+async def _outcome(
+    job_id: str,
+    job: dict[str, Any],
+    cache: RedisCache,
+    vrps: VRPHolder,
+    prefix_index: PrefixIndexHolder,
+) -> JobStatusResponse:
+    """Response for a finished job, with a completed job's result."""
+    if job["status"] != JobStatus.COMPLETED:
+        return JobStatusResponse(
+            status=job["status"],
+            job_id=job_id,
+            error=job.get("error"),
+            execution_time_ms=job.get("execution_time_ms"),
+        )
+
+    # The record only points at the cached result
+    result_key = job["result_key"]
+    try:
+        data = await cache.get(result_key) or await cache.get_stale(result_key)
+    except CacheError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if data is None:
+        raise HTTPException(
+            status_code=410, detail="Job result has expired from the cache, resubmit the query"
+        )
+    rov = job.get("rov")
+    if rov is not None:
+        try:
+            vrp_store = await vrps.get()
+        except RPKIError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        data = apply_rov(data, key_target(result_key), rov, vrp_store, prefix_index)
+    return JobStatusResponse(
+        status=job["status"],
+        job_id=job_id,
+        data=data,
+        execution_time_ms=job.get("execution_time_ms"),
+    )
+
 
 @router.get("/{job_id}")
 async def get_job_status(
     job_id: str,
+    wait: int = Query(0, ge=0, description="Seconds to wait for the job to finish"),
+    jobs: JobStore = Depends(get_job_store),
+    events: JobEvents = Depends(get_job_events),
     cache: RedisCache = Depends(get_cache),
+    vrps: VRPHolder = Depends(get_vrp_holder),
+    prefix_index: PrefixIndexHolder = Depends(get_prefix_index),
 ):
-    """Get status of background job."""
-    # Job results are stored in cache with job ID as key
-    job_key = f"job:{job_id}"
-    job_data = await cache.get(job_key)
+    """Get status of background job.
+
+    With ``wait`` the request is held until the job finishes or that many
+    seconds pass, at most ``job_wait_max_seconds``.
+    """
+    wait = min(wait, settings.job_wait_max_seconds)
+    if wait > 0:
+        async with events.watch(job_id) as updates:
+            deadline = time.monotonic() + wait
+            job = await _read(jobs, job_id)
+            while job is not None and job["status"] not in FINISHED:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                job = await _wait(jobs, updates, job_id, remaining)
+    else:
+        job = await _read(jobs, job_id)
 
-    if job_data is None:
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    status = job_data.get("status")
+    if job["status"] in FINISHED:
+        return await _outcome(job_id, job, cache, vrps, prefix_index)
 
-    if status == JobStatus.COMPLETED:
-        return JobStatusResponse(
-            status=status,
-            job_id=job_id,
-            data=job_data.get("data"),
-            execution_time_ms=job_data.get("execution_time_ms"),
-        )
-    elif status == JobStatus.FAILED:
-        return JobStatusResponse(
-            status=status,
-            job_id=job_id,
-            error=job_data.get("error"),
-            execution_time_ms=job_data.get("execution_time_ms"),
-        )
-    else:
-        # Still processing
-        from fastapi.responses import JSONResponse
-
-        return JSONResponse(
-            status_code=202,
-            content={
-                "status": status,
-                "job_id": job_id,
-            },
-        )
+    # Still queued or processing
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": job["status"],
+            "job_id": job_id,
+        },
+    )
+
+
+@router.delete("/{job_id}")
+async def cancel_job(
+    job_id: str,
+    token: str = Query(..., description="Cancel token returned when the job was submitted"),
+    jobs: JobStore = Depends(get_job_store),
+):
+    """Cancel a queued or running job.
+
+    A queued job is skipped when a worker picks it up; a running one has its
+    bgpq4 process killed. While other clients share the job it keeps running
+    and only the caller's token is withdrawn; the response carries its
+    status. Cancelling again, or with a token the job does not hold, is a
+    no-op, and finished jobs answer 409.
+    """
+    try:
+        status = await jobs.cancel(job_id, token)
+    except CacheError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status in (JobStatus.COMPLETED, JobStatus.FAILED):
+        raise HTTPException(status_code=409, detail=f"Job already {status}")
+    return JobStatusResponse(status=status, job_id=job_id)
+
+
+def _event(name: str, data: dict[str, Any]) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    jobs: JobStore = Depends(get_job_store),
+    events: JobEvents = Depends(get_job_events),
+    cache: RedisCache = Depends(get_cache),
+    vrps: VRPHolder = Depends(get_vrp_holder),
+    prefix_index: PrefixIndexHolder = Depends(get_prefix_index),
+):
+    """Stream a job's status transitions as Server-Sent Events.
+
+    Sends a ``status`` event per transition and ends with a ``result``
+    event, carrying what polling the finished job returns, or an ``error``
+    event. Streams of jobs still unfinished after ``job_stream_max_seconds``
+    end without either, and clients may reconnect.
+    """
+    if await _read(jobs, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream() -> AsyncIterator[str]:
+        deadline = time.monotonic() + settings.job_stream_max_seconds
+        async with events.watch(job_id) as updates:
+            try:
+                job = await _read(jobs, job_id)
+                status = None
+                while job is not None:
+                    if job["status"] != status:
+                        status = job["status"]
+                        yield _event("status", {"job_id": job_id, "status": status})
+                    else:
+                        # Woken without a change; comments keep proxies from closing the stream
+                        yield ": keep-alive\n\n"
+                    if status in FINISHED:
+                        outcome = await _outcome(job_id, job, cache, vrps, prefix_index)
+                        yield _event("result", outcome.model_dump(mode="json"))
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    timeout = min(remaining, settings.job_stream_keepalive_seconds)
+                    job = await _wait(jobs, updates, job_id, timeout)
+                yield _event("error", {"status_code": 404, "detail": "Job not found"})
+            except HTTPException as e:
+                yield _event("error", {"status_code": e.status_code, "detail": e.detail})
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
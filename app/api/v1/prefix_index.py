@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.dependencies import get_cache, get_prefix_index
+from app.cache import RedisCache
+from app.config import settings
+from app.metrics import metrics
+from app.models.requests import PrefixLookupRequest
+from app.models.responses import PrefixLookupResponse
+from app.prefix_index import PrefixIndexHolder
+
+router = APIRouter(prefix="/api/v1/prefix-index", tags=["prefix-index"])
+
+
+@router.post("/lookup")
+async def lookup_prefixes(
+    request: PrefixLookupRequest,
+    cache: RedisCache = Depends(get_cache),
+    holder: PrefixIndexHolder = Depends(get_prefix_index),
+):
+    """Find origin ASNs and cached AS-SETs covering each prefix."""
+    start_time = time.time()
+
+    if len(request.prefixes) > settings.prefix_lookup_max_batch:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.prefix_lookup_max_batch} prefixes per request",
+        )
+
+    index = await holder.get(cache)
+
+    # Large batches are CPU bound; keep the event loop responsive
+    if len(request.prefixes) > 1000:
+        results = await asyncio.to_thread(index.lookup_many, request.prefixes)
+    else:
+        results = index.lookup_many(request.prefixes)
+
+    metrics.track_prefix_lookups(len(results), len(index))
+    metrics.track_request("prefix_index", "lookup", 200)
+
+    return PrefixLookupResponse(
+        results=results,
+        count=len(results),
+        index_size=len(index),
+        index_built_at=index.built_at,
+        execution_time_ms=int((time.time() - start_time) * 1000),
+    )
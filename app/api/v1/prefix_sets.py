@@ -0,0 +1,177 @@
+import asyncio
+import math
+import time
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.adaptive_ttl import AdaptiveTTL
+from app.api.dependencies import (
+    get_adaptive_ttl,
+    get_bgpq4_client,
+    get_cache,
+    get_cache_tags,
+    get_negative_cache,
+)
+from app.bgpq4 import BGPq4Client
+from app.cache import RedisCache
+from app.cache_tags import CacheTags
+from app.config import settings
+from app.exceptions import (
+    BGPq4Error,
+    BGPq4PermanentError,
+    CircuitOpenError,
+    ExecutionPoolFullError,
+)
+from app.metrics import metrics
+from app.models.query import CanonicalQuery
+from app.models.requests import SetOperationRequest
+from app.models.responses import SetOperationResponse
+from app.negative_cache import NegativeCache, describe_failure
+from app.prefix_sets import combine
+
+router = APIRouter(prefix="/api/v1/prefix-sets", tags=["prefix-sets"])
+
+
+async def _expand(
+    query: CanonicalQuery,
+    key: str,
+    ttl: int | None,
+    cache: RedisCache,
+    client: BGPq4Client,
+    negative: NegativeCache,
+    ttls: AdaptiveTTL,
+    tags: CacheTags,
+) -> dict:
+    failure = await negative.get(key)
+    if failure:
+        raise BGPq4PermanentError(
+            message=f"Cached failure for {query.target}",
+            return_code=failure["return_code"],
+            stderr=failure["error"],
+        )
+    try:
+        raw_output = await client.execute_with_retry(
+            target=query.target,
+            sources=list(query.sources),
+            format="json",
+            aggregate=query.aggregate,
+            min_masklen=query.min_masklen,
+            max_masklen=query.max_masklen,
+            timeout_seconds=settings.max_execution_time_ms / 1000,
+        )
+    except BGPq4PermanentError as e:
+        await negative.record(key, e)
+        raise
+    data = client.parse_json_output(raw_output)
+    ttl = await ttls.resolve(key, data, ttl)
+    await cache.set(key, data, ttl, stale_ttl=settings.stale_cache_ttl)
+    await tags.record(key, query)
+    return data
+
+
+@router.post("/combine")
+async def combine_prefix_sets(
+    request: SetOperationRequest,
+    cache: RedisCache = Depends(get_cache),
+    client: BGPq4Client = Depends(get_bgpq4_client),
+    negative: NegativeCache = Depends(get_negative_cache),
+    ttls: AdaptiveTTL = Depends(get_adaptive_ttl),
+    tags: CacheTags = Depends(get_cache_tags),
+):
+    """Compute the union, intersection or difference of several expansions."""
+    start_time = time.time()
+
+    if len(request.queries) > settings.set_operation_max_queries:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.set_operation_max_queries} queries per request",
+        )
+
+    try:
+        queries = [
+            CanonicalQuery.normalize(
+                spec.target,
+                spec.sources,
+                aggregate=spec.aggregate,
+                min_masklen=spec.min_masklen,
+                max_masklen=spec.max_masklen,
+                default_sources=settings.irr_sources,
+                allowed_sources=settings.irr_allowed_sources,
+            )
+            for spec in request.queries
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    keys = [cache.generate_key(query) for query in queries]
+    results = await cache.get_many(keys)
+
+    # Only expand what is not cached: each distinct miss once, all concurrently
+    missing = {keys[i]: i for i, data in enumerate(results) if not data}
+    for data in results:
+        if data:
+            metrics.track_cache_hit("prefix_sets")
+        else:
+            metrics.track_cache_miss("prefix_sets")
+
+    if missing:
+        try:
+            expanded = await asyncio.wait_for(
+                asyncio.gather(
+                    *(
+                        _expand(
+                            queries[i],
+                            key,
+                            request.cache_ttl,
+                            cache,
+                            client,
+                            negative,
+                            ttls,
+                            tags,
+                        )
+                        for key, i in missing.items()
+                    )
+                ),
+                timeout=settings.max_execution_time_ms / 1000,
+            )
+        except TimeoutError:
+            raise HTTPException(status_code=504, detail="Expanding uncached queries timed out")
+        except BGPq4PermanentError as e:
+            raise HTTPException(status_code=404, detail=describe_failure(e))
+        except (CircuitOpenError, ExecutionPoolFullError) as e:
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(math.ceil(e.retry_after))},
+            )
+        except BGPq4Error as e:
+            raise HTTPException(status_code=502, detail=str(e))
+        fetched = dict(zip(missing, expanded, strict=True))
+        for i, key in enumerate(keys):
+            if not results[i]:
+                results[i] = fetched[key]
+
+    try:
+        prefixes = combine(
+            request.operation,
+            [data.get("prefixes", []) for data in results],
+            aggregate=request.aggregate,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    metrics.track_request("prefix_sets", "combine", 200)
+
+    return SetOperationResponse(
+        operation=request.operation,
+        prefixes=prefixes,
+        count=len(prefixes),
+        queries=[
+            {
+                "target": spec.target,
+                "cached": keys[i] not in missing,
+                "count": len(results[i].get("prefixes", [])),
+            }
+            for i, spec in enumerate(request.queries)
+        ],
+        execution_time_ms=int((time.time() - start_time) * 1000),
+    )
@@ -0,0 +1,292 @@
+import math
+import time
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.api.dependencies import QueryServices
+from app.budget import Deadline
+from app.config import settings
+from app.exceptions import (
+    BGPq4ExecutionError,
+    BGPq4ParseError,
+    BGPq4PermanentError,
+    BGPq4TimeoutError,
+    CircuitOpenError,
+    DeadlineExceededError,
+    ExecutionPoolFullError,
+    RPKIError,
+)
+from app.metrics import metrics
+from app.models.query import CanonicalQuery
+from app.models.requests import BGPQueryRequest
+from app.models.responses import AsyncResponse, SyncResponse
+from app.negative_cache import describe_failure
+from app.rpki import apply_rov
+
+
+async def dispatch_job(
+    resource: str,
+    operation: str,
+    query: BGPQueryRequest,
+    canonical: CanonicalQuery,
+    rov: str | None,
+    services: QueryServices,
+    estimated_time_ms: int | None = None,
+) -> JSONResponse:
+    """Hand a query over to a background job and return its polling info.
+
+    An identical query already queued or running is not queued again: the
+    caller gets that job's polling info instead, with a cancel token of its
+    own.
+    """
+    broker = services.broker
+    # Recorded before the job is queued, so a worker's updates always follow
+    token = services.jobs.new_token()
+    job_id, created = await services.jobs.create(
+        services.jobs.new_id(canonical, rov), token, rov=rov
+    )
+    if not created:
+        metrics.track_job_duplicate(resource)
+    # Dispatch to broker (mock-friendly approach)
+    if created and hasattr(broker, "execute_bgpq4_query"):
+        try:
+            await broker.execute_bgpq4_query.kiq(
+                job_id=job_id,
+                target=query.target,
+                sources=query.sources,
+                format=query.format,
+                aggregate=query.aggregate,
+                min_masklen=query.min_masklen,
+                max_masklen=query.max_masklen,
+                # None lets the job pick a churn-adaptive TTL
+                cache_ttl=query.cache_ttl,
+                resource=resource,
+                priority=query.priority,
+            )
+        except Exception as e:
+            # Else identical queries would wait on the record for the whole dedup window
+            await services.jobs.fail(job_id, f"Failed to queue job: {e}", 0)
+            metrics.track_request(resource, operation, 503)
+            raise HTTPException(status_code=503, detail="Job queue unavailable")
+
+    metrics.track_request(resource, operation, 202)
+    if created:
+        metrics.increment_active_jobs()
+
+    response_data = AsyncResponse(
+        status="processing",
+        job_id=job_id,
+        poll_url=f"/api/v1/jobs/{job_id}",
+        cancel_token=token,
+        estimated_time_ms=estimated_time_ms,
+    )
+    return JSONResponse(status_code=202, content=response_data.model_dump())
+
+
+async def run_query(
+    resource: str,
+    operation: str,
+    query: BGPQueryRequest,
+    rov: str | None,
+    services: QueryServices,
+):
+    """Serve an expand query from cache, synchronously, or as a background job.
+
+    Queries whose predicted execution time exceeds the sync timeout go
+    straight to the broker instead of waiting the timeout out first.
+    """
+    start_time = time.time()
+    cache = services.cache
+    client = services.client
+
+    # One spelling per meaning, so equivalent queries share cache entries
+    try:
+        canonical = CanonicalQuery.normalize(
+            query.target,
+            query.sources,
+            aggregate=query.aggregate,
+            min_masklen=query.min_masklen,
+            max_masklen=query.max_masklen,
+            format=query.format,
+            default_sources=settings.irr_sources,
+            allowed_sources=settings.irr_allowed_sources,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = query.model_copy(
+        update={
+            "target": canonical.target,
+            "sources": list(canonical.sources),
+            "format": canonical.format,
+        }
+    )
+
+    # Requested or default TTL; fresh results may get an adaptive one instead
+    ttl = services.ttls.requested(query.cache_ttl)
+
+    # Load VRPs up front so a misconfiguration fails before any bgpq4 run
+    if rov is not None:
+        if query.format != "json":
+            raise HTTPException(status_code=400, detail="RPKI validation requires JSON format")
+        try:
+            vrp_store = await services.vrps.get()
+        except RPKIError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+    # Check cache
+    if not query.skip_cache:
+        cache_key = cache.generate_key(canonical)
+        cached_data = await cache.get(cache_key)
+        # Popularity drives the proactive refresh of hot entries
+        refresh_query = {
+            "target": query.target,
+            "sources": query.sources,
+            "format": query.format,
+            "aggregate": query.aggregate,
+            "min_masklen": query.min_masklen,
+            "max_masklen": query.max_masklen,
+            "cache_ttl": query.cache_ttl,
+            "resource": resource,
+        }
+        services.hotkeys.record(cache_key, refresh_query, hit=bool(cached_data))
+        if cached_data:
+            metrics.track_cache_hit(resource)
+            if rov is not None:
+                cached_data = apply_rov(
+                    cached_data, query.target, rov, vrp_store, services.prefix_index
+                )
+                metrics.track_rov(cached_data["rov"]["summary"], vrp_store.count)
+            execution_time_ms = int((time.time() - start_time) * 1000)
+            return SyncResponse(
+                status="completed",
+                data=cached_data,
+                cache_ttl=ttl,
+                execution_time_ms=execution_time_ms,
+            )
+        metrics.track_cache_miss(resource)
+
+        # Known-bad queries fail fast until their negative entry expires
+        failure = await services.negative.get(cache_key)
+        if failure:
+            metrics.track_negative_cache_hit(resource)
+            metrics.track_request(resource, operation, 404)
+            raise HTTPException(status_code=404, detail=failure["error"])
+
+    # Skip the sync attempt for targets known to be slow
+    predicted_ms = None
+    if settings.latency_prediction_enabled:
+        predicted_ms = await services.latency.predict(resource, query.target)
+    if predicted_ms is not None and predicted_ms > settings.sync_timeout_ms:
+        metrics.track_routing(resource, "predicted_async")
+        return await dispatch_job(
+            resource, operation, query, canonical, rov, services, estimated_time_ms=predicted_ms
+        )
+
+    # Execute within the sync deadline; retries and backoff only use what is left
+    try:
+        deadline = Deadline.after(settings.sync_timeout_ms / 1000)
+        execution_start = time.time()
+        raw_output = await client.execute_with_retry(
+            target=query.target,
+            sources=query.sources,
+            format=query.format,
+            aggregate=query.aggregate,
+            min_masklen=query.min_masklen,
+            max_masklen=query.max_masklen,
+            timeout_seconds=settings.max_execution_time_ms / 1000,
+            deadline=deadline,
+        )
+        await services.latency.record(
+            resource, query.target, (time.time() - execution_start) * 1000
+        )
+
+        # Parse and cache result
+        if query.format == "json":
+            data = client.parse_json_output(raw_output)
+        else:
+            data = {"output": raw_output}
+
+        if not query.skip_cache:
+            ttl = await services.ttls.resolve(cache_key, data, query.cache_ttl)
+            await cache.set(cache_key, data, ttl, stale_ttl=settings.stale_cache_ttl)
+            await services.tags.record(cache_key, canonical, resource)
+
+        if rov is not None:
+            data = apply_rov(data, query.target, rov, vrp_store, services.prefix_index)
+            metrics.track_rov(data["rov"]["summary"], vrp_store.count)
+
+        execution_time_ms = int((time.time() - start_time) * 1000)
+        metrics.track_request(resource, operation, 200)
+        metrics.track_routing(resource, "sync")
+
+        return SyncResponse(
+            status="completed",
+            data=data,
+            cache_ttl=ttl,
+            execution_time_ms=execution_time_ms,
+        )
+
+    except BGPq4PermanentError as e:
+        if not query.skip_cache:
+            await services.negative.record(cache_key, e)
+        metrics.track_request(resource, operation, 404)
+        raise HTTPException(status_code=404, detail=describe_failure(e))
+
+    except CircuitOpenError as e:
+        # Serve the last known answer while the IRR is unhealthy, else fail fast
+        if not query.skip_cache and settings.stale_cache_ttl > 0:
+            stale_data = await cache.get_stale(cache_key)
+            if stale_data:
+                metrics.track_routing(resource, "stale")
+                if rov is not None:
+                    stale_data = apply_rov(
+                        stale_data, query.target, rov, vrp_store, services.prefix_index
+                    )
+                    metrics.track_rov(stale_data["rov"]["summary"], vrp_store.count)
+                return SyncResponse(
+                    status="stale",
+                    data=stale_data,
+                    cache_ttl=ttl,
+                    execution_time_ms=int((time.time() - start_time) * 1000),
+                )
+        metrics.track_request(resource, operation, 503)
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+
+    except ExecutionPoolFullError as e:
+        # Shed load: hand the query to the workers, or reject it outright
+        if settings.execution_pool_overflow == "job":
+            metrics.track_routing(resource, "shed_async")
+            return await dispatch_job(
+                resource, operation, query, canonical, rov, services, estimated_time_ms=predicted_ms
+            )
+        metrics.track_request(resource, operation, 503)
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+
+    except BGPq4ParseError as e:
+        # bgpq4 answered, but with output a rerun would not make sense of either
+        metrics.track_request(resource, operation, 502)
+        raise HTTPException(status_code=502, detail=str(e))
+
+    except (TimeoutError, DeadlineExceededError):
+        # Switch to async mode; the job reruns the query from scratch
+        metrics.track_routing(resource, "timeout_async")
+        return await dispatch_job(
+            resource, operation, query, canonical, rov, services, estimated_time_ms=predicted_ms
+        )
+
+    except (BGPq4ExecutionError, BGPq4TimeoutError):
+        # Transient failures left over once retries stop, e.g. out of deadline
+        # or retry budget: the job retries them on its own time
+        metrics.track_routing(resource, "error_async")
+        return await dispatch_job(
+            resource, operation, query, canonical, rov, services, estimated_time_ms=predicted_ms
+        )
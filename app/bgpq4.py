@@ -1,15 +1,74 @@
 import asyncio
+import contextlib
 import json
+import time
 from typing import Any
 
 from tenacity import (
+    RetryCallState,
     retry,
     retry_if_exception_type,
+    retry_if_not_exception_type,
     stop_after_attempt,
     wait_exponential,
 )
 
-from app.exceptions import BGPq4ExecutionError, BGPq4ParseError, BGPq4TimeoutError
+from app.budget import Deadline, RetryBudget
+from app.circuit_breaker import CircuitBreakerRegistry
+from app.exceptions import (
+    BGPq4ExecutionError,
+    BGPq4ParseError,
+    BGPq4PermanentError,
+    BGPq4TimeoutError,
+    DeadlineExceededError,
+)
+from app.execution_pool import ExecutionPool
+from app.hedging import HedgePolicy
+from app.irr_mirrors import IRRMirror, MirrorPool
+from app.metrics import metrics
+
+# stderr fragments of failures that a retry may fix (network, IRR server load)
+TRANSIENT_MARKERS = (
+    "connect",
+    "timed out",
+    "timeout",
+    "resolve",
+    "getaddrinfo",
+    "refused",
+    "reset by peer",
+    "broken pipe",
+    "unreachable",
+    "temporar",
+    "eof",
+    "try again",
+)
+
+# stderr fragments of failures caused by the query itself
+PERMANENT_MARKERS = (
+    "no such",
+    "not found",
+    "no entries found",
+    "invalid",
+    "unknown",
+    "usage",
+    "syntax",
+    "unsupported",
+)
+
+
+def is_permanent_failure(return_code: int, stderr: str) -> bool:
+    """Classify a failed bgpq4 run as permanent (not worth retrying).
+
+    Processes killed by a signal and anything that looks like a network
+    problem are transient. Otherwise the failure is permanent only when
+    stderr points at the query itself; unrecognised failures are retried.
+    """
+    if return_code < 0:
+        return False
+    message = stderr.lower()
+    if any(marker in message for marker in TRANSIENT_MARKERS):
+        return False
+    return any(marker in message for marker in PERMANENT_MARKERS)
 
 
 class BGPq4Client:
@@ -21,11 +80,34 @@ class BGPq4Client:
         default_sources: list[str],
         max_retries: int = 3,
         retry_backoff: float = 2.0,
+        retry_budget: RetryBudget | None = None,
+        breakers: CircuitBreakerRegistry | None = None,
+        pool: ExecutionPool | None = None,
+        host: str | None = None,
+        hedge: HedgePolicy | None = None,
+        mirrors: MirrorPool | None = None,
     ):
         self.binary_path = binary_path
         self.default_sources = default_sources
         self.max_retries = max_retries
         self.retry_backoff = retry_backoff
+        self.retry_budget = retry_budget
+        self.breakers = breakers
+        self.pool = pool
+        self.host = host
+        self.hedge = hedge
+        self.mirrors = mirrors
+
+    def breaker_key(self, sources: list[str] | None) -> str:
+        """Circuit breaker name for a query: the IRR server and its source set.
+
+        Sources are normalized and sorted, so orderings of one set share a
+        breaker. Queries spread over mirrors share one per source set, as
+        the mirror pool ejects failing mirrors itself.
+        """
+        names = sorted({source.strip().upper() for source in sources or self.default_sources})
+        server = "mirrors" if self.mirrors else self.host
+        return "bgpq4:" + (f"{server}/" if server else "") + ",".join(names)
 
     def _build_command(
         self,
@@ -35,10 +117,15 @@ class BGPq4Client:
         aggregate: bool = False,
         min_masklen: int | None = None,
         max_masklen: int | None = None,
+        host: str | None = None,
     ) -> list[str]:
         """Build bgpq4 command."""
         cmd = [self.binary_path]
 
+        # IRR server, bgpq4's default when unset
+        if host:
+            cmd.extend(["-h", host])
+
         # JSON output flag
         if format == "json":
             cmd.append("-j")
@@ -71,38 +158,219 @@ class BGPq4Client:
         min_masklen: int | None = None,
         max_masklen: int | None = None,
         timeout_seconds: float = 30.0,
+        deadline: Deadline | None = None,
     ) -> str:
         """Execute bgpq4 command and return raw output."""
-        cmd = self._build_command(
-            target=target,
-            sources=sources,
-            format=format,
-            aggregate=aggregate,
-            min_masklen=min_masklen,
-            max_masklen=max_masklen,
+        options = {
+            "target": target,
+            "sources": sources,
+            "format": format,
+            "aggregate": aggregate,
+            "min_masklen": min_masklen,
+            "max_masklen": max_masklen,
+        }
+        if self.pool is None:
+            return await self._execute_guarded(options, timeout_seconds, deadline)
+        # Queueing for a slot spends the caller's deadline too
+        async with self.pool.slot(deadline):
+            return await self._execute_guarded(options, timeout_seconds, deadline)
+
+    async def _execute_guarded(
+        self,
+        options: dict[str, Any],
+        timeout_seconds: float,
+        deadline: Deadline | None,
+    ) -> str:
+        """Run bgpq4 within the deadline, behind the source set's circuit breaker."""
+        # The caller's deadline caps the per-attempt timeout
+        effective_timeout = deadline.cap(timeout_seconds) if deadline else timeout_seconds
+        if effective_timeout <= 0:
+            raise DeadlineExceededError(
+                message="Deadline exceeded before bgpq4 could start", timeout_seconds=0
+            )
+
+        # Fail fast while the IRR behind this source set is unhealthy
+        breaker = None
+        if self.breakers is not None:
+            breaker = self.breakers.get(self.breaker_key(options["sources"]))
+            breaker.allow()
+
+        # Pick the mirror once admitted, so in-flight counts only running queries
+        mirror = self.mirrors.acquire() if self.mirrors else None
+        cmd = self._build_command(**options, host=mirror.address if mirror else self.host)
+        hedge_cmd = self._build_command(**options, host=self.hedge.host) if self.hedge else None
+
+        if breaker is None:
+            return await self._run_hedged(
+                cmd, hedge_cmd, effective_timeout, timeout_seconds, mirror
+            )
+
+        started = time.monotonic()
+        try:
+            output = await self._run_hedged(
+                cmd, hedge_cmd, effective_timeout, timeout_seconds, mirror
+            )
+        except BGPq4PermanentError:
+            # The IRR answered: not its fault
+            breaker.record(False, time.monotonic() - started)
+            raise
+        except DeadlineExceededError:
+            # Cut off by the caller's deadline: says nothing about the IRR
+            breaker.release()
+            raise
+        except (BGPq4ExecutionError, BGPq4TimeoutError):
+            breaker.record(True, time.monotonic() - started)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record(False, time.monotonic() - started)
+        return output
+
+    async def _run_hedged(
+        self,
+        cmd: list[str],
+        hedge_cmd: list[str] | None,
+        effective_timeout: float,
+        timeout_seconds: float,
+        mirror: IRRMirror | None = None,
+    ) -> str:
+        """Run bgpq4, racing a second run on the alternate host if it stalls.
+
+        The hedge starts once the primary outlives the hedge delay and the
+        hedge budget allows it. The first successful result wins and the
+        other process is killed and reaped.
+        """
+        if hedge_cmd is None:
+            return await self._run_on_mirror(mirror, cmd, effective_timeout, timeout_seconds)
+
+        delay = self.hedge.delay()
+        if delay >= effective_timeout:
+            return await self._run_on_mirror(mirror, cmd, effective_timeout, timeout_seconds)
+
+        started = time.monotonic()
+        primary = asyncio.create_task(
+            self._run_on_mirror(mirror, cmd, effective_timeout, timeout_seconds)
         )
+        hedged = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                output = await primary
+                self.hedge.observe(time.monotonic() - started)
+                return output
+            if not self.hedge.try_acquire():
+                metrics.track_hedge("budget_exhausted")
+                output = await primary
+                self.hedge.observe(time.monotonic() - started)
+                return output
+
+            metrics.track_hedge("started")
+            hedged = asyncio.create_task(
+                self._run(hedge_cmd, effective_timeout - delay, timeout_seconds - delay)
+            )
+            pending = {primary, hedged}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        metrics.track_hedge("won" if task is hedged else "lost")
+                        if task is primary:
+                            self.hedge.observe(time.monotonic() - started)
+                        return task.result()
+            # Both failed: report the primary's error
+            return primary.result()
+        finally:
+            for task in (primary, hedged):
+                if task is not None and not task.done():
+                    task.cancel()
+            # Wait for cancelled runs so their processes are reaped
+            await asyncio.gather(
+                *(task for task in (primary, hedged) if task is not None),
+                return_exceptions=True,
+            )
+
+    async def _run_on_mirror(
+        self,
+        mirror: IRRMirror | None,
+        cmd: list[str],
+        effective_timeout: float,
+        timeout_seconds: float,
+    ) -> str:
+        """Run bgpq4 against a pool mirror, reporting the outcome to the pool."""
+        if mirror is None:
+            return await self._run(cmd, effective_timeout, timeout_seconds)
+
+        started = time.monotonic()
+        failed = None
+        try:
+            output = await self._run(cmd, effective_timeout, timeout_seconds)
+            failed = False
+            return output
+        except BGPq4PermanentError:
+            # The mirror answered; the query itself is bad
+            failed = False
+            raise
+        except DeadlineExceededError:
+            # Cut off by the caller's deadline: no verdict on the mirror
+            raise
+        except (BGPq4ExecutionError, BGPq4TimeoutError):
+            failed = True
+            raise
+        finally:
+            self.mirrors.release(mirror, time.monotonic() - started, failed)
 
+    async def _run(self, cmd: list[str], effective_timeout: float, timeout_seconds: float) -> str:
+        """Run one bgpq4 process, killing it if it outlives its timeout."""
+        process = None
         try:
             process = await asyncio.create_subprocess_exec(
                 *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
             )
 
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout_seconds)
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(), timeout=effective_timeout
+            )
 
             if process.returncode != 0:
-                raise BGPq4ExecutionError(
+                error_output = stderr.decode()
+                error_class = (
+                    BGPq4PermanentError
+                    if is_permanent_failure(process.returncode, error_output)
+                    else BGPq4ExecutionError
+                )
+                raise error_class(
                     message=f"bgpq4 failed with return code {process.returncode}",
                     return_code=process.returncode,
-                    stderr=stderr.decode(),
+                    stderr=error_output,
                 )
 
             return stdout.decode()
 
         except TimeoutError:
+            await self._terminate(process)
+            if effective_timeout < timeout_seconds:
+                raise DeadlineExceededError(
+                    message=f"bgpq4 execution cut off by deadline after {effective_timeout:.3f}s",
+                    timeout_seconds=effective_timeout,
+                )
             raise BGPq4TimeoutError(
                 message=f"bgpq4 execution timed out after {timeout_seconds}s",
                 timeout_seconds=timeout_seconds,
             )
+        except asyncio.CancelledError:
+            await self._terminate(process)
+            raise
+
+    @staticmethod
+    async def _terminate(process: asyncio.subprocess.Process | None) -> None:
+        """Kill and reap a bgpq4 process that is no longer wanted."""
+        if process is None or process.returncode is not None:
+            return
+        with contextlib.suppress(ProcessLookupError):
+            process.kill()
+        with contextlib.suppress(Exception):
+            await asyncio.wait_for(process.wait(), timeout=1.0)
 
     def parse_json_output(self, raw_output: str) -> dict[str, Any]:
         """Parse bgpq4 JSON output into standardized format."""
@@ -128,13 +396,39 @@ class BGPq4Client:
         min_masklen: int | None = None,
         max_masklen: int | None = None,
         timeout_seconds: float = 30.0,
+        deadline: Deadline | None = None,
     ) -> str:
-        """Execute bgpq4 with retry logic for transient failures."""
+        """Execute bgpq4 with retry logic for transient failures.
+
+        Permanent failures are raised immediately. Retries stop early when
+        the next backoff would not fit in the deadline, or when the
+        process-wide retry budget is exhausted.
+        """
+        backoff = wait_exponential(multiplier=self.retry_backoff)
+
+        def _wait(retry_state: RetryCallState) -> float:
+            delay = backoff(retry_state)
+            return deadline.cap(delay) if deadline else delay
+
+        def _stop_on_deadline(retry_state: RetryCallState) -> bool:
+            if deadline is None or backoff(retry_state) < deadline.remaining():
+                return False
+            metrics.track_retry("deadline")
+            return True
+
+        def _stop_on_budget(retry_state: RetryCallState) -> bool:
+            if self.retry_budget is None or self.retry_budget.try_acquire():
+                metrics.track_retry("attempted")
+                return False
+            metrics.track_retry("budget_exhausted")
+            return True
 
         @retry(
-            stop=stop_after_attempt(self.max_retries + 1),
-            wait=wait_exponential(multiplier=self.retry_backoff),
-            retry=retry_if_exception_type((BGPq4ExecutionError, BGPq4TimeoutError)),
+            # Evaluated in order; the budget is only charged for real retries
+            stop=stop_after_attempt(self.max_retries + 1) | _stop_on_deadline | _stop_on_budget,
+            wait=_wait,
+            retry=retry_if_exception_type((BGPq4ExecutionError, BGPq4TimeoutError))
+            & retry_if_not_exception_type((BGPq4PermanentError, DeadlineExceededError)),
             reraise=True,
         )
         async def _execute_with_retry() -> str:
@@ -146,6 +440,7 @@ class BGPq4Client:
                 min_masklen=min_masklen,
                 max_masklen=max_masklen,
                 timeout_seconds=timeout_seconds,
+                deadline=deadline,
             )
 
         return await _execute_with_retry()
@@ -0,0 +1,70 @@
+import math
+import threading
+import time
+
+
+class Deadline:
+    """Absolute point in time by which an operation has to finish.
+
+    Created once per request and passed down the call chain, so every layer
+    (retries, backoff sleeps, subprocess timeouts) spends only what is left.
+    """
+
+    def __init__(self, expires_at: float | None = None):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        """Deadline ``seconds`` from now."""
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        """Seconds left, never negative; infinite without an expiry."""
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cap(self, timeout_seconds: float) -> float:
+        """Clamp a timeout to the remaining budget."""
+        return min(timeout_seconds, self.remaining())
+
+
+class RetryBudget:
+    """Process-wide token bucket limiting how many retries may run.
+
+    Each retry takes one token; tokens refill at ``rate`` per second up to
+    ``burst``. When the IRR is degraded the bucket drains and requests fail
+    after their first attempt instead of multiplying the load.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        # Shared by the sync path and tenacity callbacks
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self) -> bool:
+        """Take a token for one retry, returning False when exhausted."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
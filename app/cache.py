@@ -1,74 +1,677 @@
+import asyncio
 import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable
 from typing import Any
 
 import redis.asyncio as redis
 
+from app.circuit_breaker import CircuitBreaker
 from app.exceptions import CacheError
+from app.hashring import HashRing
+from app.metrics import metrics
+from app.models.query import CanonicalQuery
+from app.shared_cache import SharedMemoryCache
+
+logger = logging.getLogger("fastbgpq4")
+
+STALE_PREFIX = "stale:"
+# Bump when cached values change shape: new entries land in a fresh
+# namespace and old ones simply expire, so Redis never needs flushing
+CACHE_KEY_VERSION = 2
+
+
+def key_target(key: str) -> str:
+    """The query target of a result cache key."""
+    return key.split(":", 4)[4]
+
+
+async def _get_with_ttl(client, keys: list[str]) -> list[tuple[bytes | None, int]]:
+    """Values of keys with their remaining TTLs, in one pipeline."""
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.get(key)
+        pipe.ttl(key)
+    results = await pipe.execute()
+    return list(zip(results[::2], results[1::2], strict=True))
+
+
+class LocalCache:
+    """Bounded in-process LRU of serialized entries, used while Redis is down.
+
+    Entries written while Redis was unreachable are marked dirty so they can
+    be replayed to Redis once it recovers.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._dirty: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def has_dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, serialized = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return json.loads(serialized)
+
+    def set(self, key: str, serialized: str, ttl: int, dirty: bool = False) -> None:
+        self._entries[key] = (time.monotonic() + ttl, serialized)
+        self._entries.move_to_end(key)
+        if dirty:
+            self._dirty.add(key)
+        else:
+            self._dirty.discard(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._dirty.discard(evicted)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._dirty.discard(key)
+
+    def take_dirty(self) -> list[tuple[str, str, int]]:
+        """Return unexpired dirty entries with their remaining TTL, clearing the marks."""
+        now = time.monotonic()
+        entries = []
+        for key in self._dirty:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] - now >= 1:
+                entries.append((key, entry[1], int(entry[0] - now)))
+        self._dirty.clear()
+        return entries
+
+    def mark_dirty(self, keys: list[str]) -> None:
+        self._dirty.update(key for key in keys if key in self._entries)
+
+
+class WriteBehindQueue:
+    """Buffers cache writes and flushes them to Redis in pipelined batches.
+
+    Writes are acknowledged as soon as they are queued; a background task
+    flushes them ``batch_size`` at a time. Rewrites of a pending key replace
+    it. Memory is bounded by ``max_pending``: once it is reached, the caller
+    flushes a batch itself before queueing. Pending writes are readable, so
+    a process always sees its own writes.
+    """
+
+    def __init__(
+        self,
+        cache: "RedisCache",
+        max_pending: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 0.02,
+    ):
+        self.cache = cache
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._flusher: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def get(self, key: str) -> str | None:
+        """Serialized value of a write not flushed yet."""
+        entry = self._pending.get(key)
+        return entry[0] if entry is not None else None
+
+    def discard(self, key: str) -> None:
+        self._pending.pop(key, None)
+
+    async def put(self, key: str, serialized: str, ttl: int) -> None:
+        """Queue one write."""
+        if key not in self._pending and len(self._pending) >= self.max_pending:
+            # Backpressure: the writer pays for a flush instead of growing the queue
+            metrics.track_write_behind("backpressure")
+            await self._flush_batch()
+        self._pending[key] = (serialized, ttl)
+        self._pending.move_to_end(key)
+        metrics.track_write_behind_pending(len(self._pending))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._pending:
+            # Let concurrent writers fill the batch
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_batch()
+
+    async def _flush_batch(self) -> None:
+        count = min(self.batch_size, len(self._pending))
+        entries = []
+        for _ in range(count):
+            key, (serialized, ttl) = self._pending.popitem(last=False)
+            entries.append((key, serialized, ttl))
+        metrics.track_write_behind_pending(len(self._pending))
+        if not entries:
+            return
+        try:
+            await self.cache.write_many(entries)
+            metrics.track_write_behind("flushed", len(entries))
+        except CacheError as e:
+            metrics.track_write_behind("failed", len(entries))
+            logger.warning(f"Failed to flush {len(entries)} cache writes: {e}")
+
+    async def flush(self) -> None:
+        """Write everything still pending, e.g. on shutdown."""
+        while self._pending:
+            await self._flush_batch()
+        if self._flusher is not None and not self._flusher.done():
+            # Its batch in flight is already out of the queue
+            await self._flusher
 
 
 class RedisCache:
-    """Redis cache wrapper with JSON serialization."""
+    """Redis cache wrapper with JSON serialization.
+
+    Optionally bounds each Redis command with ``operation_timeout`` seconds,
+    stops calling Redis while ``breaker`` is open, and keeps a ``fallback``
+    local copy of writes. With a fallback, reads and writes degrade to the
+    local cache instead of raising CacheError, and writes made during an
+    outage are replayed when Redis answers again. A ``shared`` memory cache
+    is read before Redis and keeps what was read or written for the other
+    worker processes on the host.
 
-    def __init__(self, redis_url: str):
+    With ``cluster`` the URL points at a Redis Cluster. With ``shard_urls``
+    keys are spread over independent Redis nodes by consistent hashing;
+    batch operations are split per node and run concurrently. Either way,
+    keys used together by a script must share a ``{hash tag}``.
+    """
+
+    def __init__(
+        self,
+        redis_url: str,
+        operation_timeout: float | None = None,
+        breaker: CircuitBreaker | None = None,
+        fallback: LocalCache | None = None,
+        write_behind_max_pending: int = 0,
+        write_behind_batch_size: int = 200,
+        shared: SharedMemoryCache | None = None,
+        cluster: bool = False,
+        shard_urls: list[str] | None = None,
+    ):
         self.redis_url = redis_url
+        self.cluster = cluster
+        self.ring = HashRing(shard_urls) if shard_urls else None
+        self.operation_timeout = operation_timeout
+        self.breaker = breaker
+        self.fallback = fallback
+        self.shared = shared
+        self.write_behind = (
+            WriteBehindQueue(
+                self, max_pending=write_behind_max_pending, batch_size=write_behind_batch_size
+            )
+            if write_behind_max_pending > 0
+            else None
+        )
         self._client = None
+        self._shards: dict[str, Any] = {}
+        self._replay_task: asyncio.Task | None = None
 
-    async def get_client(self):
-        """Get or create Redis client."""
+    async def get_client(self, node: str | None = None):
+        """Get or create the Redis client, or the client of one shard node."""
+        options = {}
+        if self.operation_timeout is not None:
+            options = {
+                "socket_timeout": self.operation_timeout,
+                "socket_connect_timeout": self.operation_timeout,
+            }
+        if node is not None:
+            if node not in self._shards:
+                self._shards[node] = redis.from_url(node, decode_responses=False, **options)
+            return self._shards[node]
         if self._client is None:
-            self._client = redis.from_url(self.redis_url, decode_responses=False)
+            if self.cluster:
+                self._client = redis.RedisCluster.from_url(
+                    self.redis_url, decode_responses=False, **options
+                )
+            else:
+                self._client = redis.from_url(self.redis_url, decode_responses=False, **options)
         return self._client
 
+    def _node(self, key: str) -> str | None:
+        """The shard node owning a key, if keys are sharded client-side."""
+        return self.ring.node_for(key) if self.ring is not None else None
+
+    async def _redis(
+        self, operation: Callable[[Any], Awaitable[Any]], node: str | None = None
+    ) -> Any:
+        """Run one operation against Redis behind the circuit breaker."""
+        if self.breaker is not None:
+            self.breaker.allow()
+        started = time.monotonic()
+        try:
+            client = await self.get_client(node)
+            result = await operation(client)
+        except asyncio.CancelledError:
+            if self.breaker is not None:
+                self.breaker.release()
+            raise
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record(True, time.monotonic() - started)
+            raise
+        if self.breaker is not None:
+            self.breaker.record(False, time.monotonic() - started)
+        if (
+            self.fallback is not None
+            and self.fallback.has_dirty
+            and (self._replay_task is None or self._replay_task.done())
+        ):
+            self._replay_task = asyncio.create_task(self._replay())
+        return result
+
+    async def _redis_many(
+        self, keys: list[str], operation: Callable[[Any, list[int]], Awaitable[list[Any]]]
+    ) -> list[Any]:
+        """Run a batch operation over keys, split per shard node when sharded.
+
+        ``operation`` gets a client and the positions of the keys it should
+        handle, and returns one result per position.
+        """
+        if self.ring is None:
+            return await self._redis(lambda client: operation(client, list(range(len(keys)))))
+
+        async def run(node: str, positions: list[int]) -> tuple[list[int], list[Any]]:
+            return positions, await self._redis(
+                lambda client: operation(client, positions), node=node
+            )
+
+        results: list[Any] = [None] * len(keys)
+        groups = self.ring.partition(keys)
+        for positions, values in await asyncio.gather(*(run(*group) for group in groups.items())):
+            for i, value in zip(positions, values, strict=True):
+                results[i] = value
+        return results
+
+    async def _write(self, entries: list[tuple[str, str, int]], nx: bool = False) -> None:
+        """Pipeline serialized (key, value, ttl) writes; errors are left to the caller."""
+
+        async def write(client, positions):
+            pipe = client.pipeline(transaction=False)
+            for i in positions:
+                key, serialized, ttl = entries[i]
+                if nx:
+                    pipe.set(key, serialized, ex=ttl, nx=True)
+                else:
+                    pipe.setex(key, ttl, serialized)
+            return await pipe.execute()
+
+        await self._redis_many([key for key, _, _ in entries], write)
+
+    async def _replay(self) -> None:
+        """Write entries cached locally during an outage back to Redis."""
+        entries = self.fallback.take_dirty()
+        if not entries:
+            return
+        try:
+            await self._write(entries)
+            logger.info(f"Replayed {len(entries)} locally cached entries to Redis")
+        except Exception as e:
+            self.fallback.mark_dirty([key for key, _, _ in entries])
+            logger.warning(f"Failed to replay local cache to Redis: {e}")
+
+    def _pending(self, key: str) -> dict[str, Any] | None:
+        """A queued write not flushed to Redis yet."""
+        if self.write_behind is None:
+            return None
+        serialized = self.write_behind.get(key)
+        return json.loads(serialized) if serialized is not None else None
+
     async def get(self, key: str) -> dict[str, Any] | None:
         """Get value from cache."""
+        pending = self._pending(key)
+        if pending is not None:
+            return pending
+        if self.shared is not None:
+            shared = await self.shared.aget(key)
+            if shared is not None:
+                return shared
         try:
-            client = await self.get_client()
-            value = await client.get(key)
+            if self.shared is None:
+                value = await self._redis(lambda client: client.get(key), self._node(key))
+            else:
+                [(value, ttl)] = await self._redis(
+                    lambda client: _get_with_ttl(client, [key]), self._node(key)
+                )
             if value is None:
                 return None
+            if self.shared is not None:
+                await self._share(key, value, ttl)
             return json.loads(value)
         except Exception as e:
-            raise CacheError(f"Failed to get from cache: {e}")
+            if self.fallback is None:
+                raise CacheError(f"Failed to get from cache: {e}")
+            metrics.track_cache_fallback("get")
+            return self.fallback.get(key)
+
+    async def set(self, key: str, value: dict[str, Any], ttl: int, stale_ttl: int = 0):
+        """Set value in cache with TTL.
+
+        With ``stale_ttl`` a shadow copy is kept that long, to be served when
+        the IRR cannot be reached after the entry itself expired. With a
+        write-behind queue the write is only queued.
+        """
+        serialized = json.dumps(value)
+        if self.shared is not None:
+            await self.shared.aset(key, serialized, ttl)
+        if self.write_behind is not None:
+            await self.write_behind.put(key, serialized, ttl)
+            if stale_ttl > 0:
+                await self.write_behind.put(STALE_PREFIX + key, serialized, stale_ttl)
+            return
+
+        try:
+            if stale_ttl > 0:
+                await self._write(
+                    [(key, serialized, ttl), (STALE_PREFIX + key, serialized, stale_ttl)]
+                )
+            else:
+                await self._redis(
+                    lambda client: client.setex(key, ttl, serialized), self._node(key)
+                )
+            dirty = False
+        except Exception as e:
+            if self.fallback is None:
+                raise CacheError(f"Failed to set in cache: {e}")
+            metrics.track_cache_fallback("set")
+            dirty = True
+        if self.fallback is not None:
+            self.fallback.set(key, serialized, ttl, dirty=dirty)
+            if stale_ttl > 0:
+                self.fallback.set(STALE_PREFIX + key, serialized, stale_ttl, dirty=dirty)
 
-    async def set(self, key: str, value: dict[str, Any], ttl: int):
-        """Set value in cache with TTL."""
+    async def write_many(
+        self, entries: list[tuple[str, str, int]], nx: bool = False, fallback: bool = True
+    ) -> None:
+        """Write serialized (key, value, ttl) entries in one pipeline.
+
+        With ``nx`` existing keys are left alone. Without ``fallback`` a
+        failed write raises instead of only reaching the local fallback.
+        """
         try:
-            client = await self.get_client()
-            serialized = json.dumps(value)
-            await client.setex(key, ttl, serialized)
+            await self._write(entries, nx=nx)
+            dirty = False
         except Exception as e:
-            raise CacheError(f"Failed to set in cache: {e}")
+            if self.fallback is None or not fallback:
+                raise CacheError(f"Failed to write batch to cache: {e}")
+            metrics.track_cache_fallback("set")
+            dirty = True
+        if self.fallback is not None:
+            for key, serialized, ttl in entries:
+                self.fallback.set(key, serialized, ttl, dirty=dirty)
+
+    async def get_stale(self, key: str) -> dict[str, Any] | None:
+        """Get the stale shadow copy of an entry."""
+        return await self.get(STALE_PREFIX + key)
+
+    async def get_many(self, keys: list[str]) -> list[dict[str, Any] | None]:
+        """Get several values from cache in one round trip."""
+        if not keys:
+            return []
+        results = [self._pending(key) for key in keys]
+        if self.shared is not None:
+            for i, key in enumerate(keys):
+                if results[i] is None:
+                    results[i] = await self.shared.aget(key)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        async def read(client, positions):
+            batch = [keys[missing[i]] for i in positions]
+            if self.shared is not None:
+                return await _get_with_ttl(client, batch)
+            # A cluster only serves MGET within one slot
+            return await (client.mget_nonatomic(batch) if self.cluster else client.mget(batch))
+
+        try:
+            values = await self._redis_many([keys[i] for i in missing], read)
+        except Exception as e:
+            if self.fallback is None:
+                raise CacheError(f"Failed to get many from cache: {e}")
+            metrics.track_cache_fallback("get_many")
+            for i in missing:
+                results[i] = self.fallback.get(keys[i])
+            return results
+        for i, value in zip(missing, values, strict=True):
+            if self.shared is not None:
+                value, ttl = value
+                if value is not None:
+                    await self._share(keys[i], value, ttl)
+            if value is not None:
+                results[i] = json.loads(value)
+        return results
+
+    async def _share(self, key: str, value: bytes, ttl: int) -> None:
+        """Keep a value read from Redis in the shared tier, never past its Redis expiry."""
+        # -1: no expiry in Redis, so only the tier's own cap applies
+        ttl = self.shared.max_ttl if ttl < 0 else min(ttl, self.shared.max_ttl)
+        await self.shared.aset(key, value.decode(), ttl)
+
+    async def scan_keys(self, pattern: str, count: int = 1000) -> AsyncIterator[str]:
+        """Iterate over keys matching a pattern without blocking Redis."""
+        try:
+            nodes = self.ring.nodes if self.ring is not None else [None]
+            for node in nodes:
+                client = await self.get_client(node)
+                async for key in client.scan_iter(match=pattern, count=count):
+                    yield key.decode() if isinstance(key, bytes) else key
+        except Exception as e:
+            raise CacheError(f"Failed to scan cache: {e}")
+
+    async def eval(self, script: str, keys: list[str], args: list[Any]) -> Any:
+        """Run a Lua script atomically on the server."""
+        try:
+            return await self._redis(
+                lambda client: client.eval(script, len(keys), *keys, *args),
+                self._node(keys[0]) if keys else None,
+            )
+        except Exception as e:
+            raise CacheError(f"Failed to run cache script: {e}")
+
+    async def eval_many(self, script: str, calls: list[tuple[list[str], list[Any]]]) -> list[Any]:
+        """Run a Lua script once per (keys, args) call, in one pipeline per node."""
+
+        async def run(client, positions):
+            pipe = client.pipeline(transaction=False)
+            for i in positions:
+                keys, args = calls[i]
+                pipe.eval(script, len(keys), *keys, *args)
+            return await pipe.execute()
+
+        try:
+            return await self._redis_many([keys[0] for keys, _ in calls], run)
+        except Exception as e:
+            raise CacheError(f"Failed to run cache script: {e}")
+
+    async def hmget_many(self, keys: list[str], fields: list[str]) -> list[list[Any]]:
+        """Read the same hash fields from several keys in one round trip."""
+
+        async def read(client, positions):
+            pipe = client.pipeline(transaction=False)
+            for i in positions:
+                pipe.hmget(keys[i], *fields)
+            return await pipe.execute()
+
+        try:
+            return await self._redis_many(keys, read)
+        except Exception as e:
+            raise CacheError(f"Failed to read hashes from cache: {e}")
+
+    async def hget_many(self, keys: list[str], fields: list[str]) -> list[str | None]:
+        """Read one field from each of several hashes in one round trip."""
+
+        async def read(client, positions):
+            pipe = client.pipeline(transaction=False)
+            for i in positions:
+                pipe.hget(keys[i], fields[i])
+            return await pipe.execute()
+
+        try:
+            values = await self._redis_many(keys, read)
+        except Exception as e:
+            raise CacheError(f"Failed to read hashes from cache: {e}")
+        return [value.decode() if isinstance(value, bytes) else value for value in values]
+
+    async def top_scores(self, keys: list[str], count: int) -> list[list[tuple[str, float]]]:
+        """Read the highest scored members of several sorted sets in one round trip."""
+
+        async def read(client, positions):
+            pipe = client.pipeline(transaction=False)
+            for i in positions:
+                pipe.zrevrange(keys[i], 0, count - 1, withscores=True)
+            return await pipe.execute()
+
+        try:
+            results = await self._redis_many(keys, read)
+        except Exception as e:
+            raise CacheError(f"Failed to read sorted sets from cache: {e}")
+        return [
+            [
+                (member.decode() if isinstance(member, bytes) else member, score)
+                for member, score in entries
+            ]
+            for entries in results
+        ]
+
+    async def dump_many(self, keys: list[str]) -> list[tuple[bytes | None, int]]:
+        """Serialized value and remaining TTL of several keys in one round trip."""
+
+        async def read(client, positions):
+            return await _get_with_ttl(client, [keys[i] for i in positions])
+
+        try:
+            return await self._redis_many(keys, read)
+        except Exception as e:
+            raise CacheError(f"Failed to dump entries from cache: {e}")
+
+    async def ttl_many(self, keys: list[str]) -> list[int]:
+        """Remaining TTL of several keys in seconds (-2 when missing)."""
+
+        async def read(client, positions):
+            pipe = client.pipeline(transaction=False)
+            for i in positions:
+                pipe.ttl(keys[i])
+            return await pipe.execute()
+
+        try:
+            return await self._redis_many(keys, read)
+        except Exception as e:
+            raise CacheError(f"Failed to read TTLs from cache: {e}")
 
     async def delete(self, key: str):
         """Delete key from cache."""
+        if self.write_behind is not None:
+            self.write_behind.discard(key)
+        if self.shared is not None:
+            await self.shared.adelete(key)
+        if self.fallback is not None:
+            self.fallback.delete(key)
         try:
-            client = await self.get_client()
-            await client.delete(key)
+            await self._redis(lambda client: client.delete(key), self._node(key))
         except Exception as e:
             raise CacheError(f"Failed to delete from cache: {e}")
 
-    def generate_key(
-        self,
-        target: str,
-        sources: list[str] | None = None,
-        aggregate: bool = False,
-        min_masklen: int | None = None,
-        max_masklen: int | None = None,
-        format: str = "json",
-    ) -> str:
-        """Generate cache key from query parameters."""
-        key_parts = [
-            "bgpq4",
-            target,
-            ",".join(sorted(sources)) if sources else "default",
-            str(aggregate),
-            str(min_masklen) if min_masklen else "none",
-            str(max_masklen) if max_masklen else "none",
-            format,
-        ]
-        return ":".join(key_parts)
+    async def delete_many(self, keys: list[str]) -> None:
+        """Delete several keys in one pipeline per node."""
+        for key in keys:
+            if self.write_behind is not None:
+                self.write_behind.discard(key)
+            if self.fallback is not None:
+                self.fallback.delete(key)
+        if self.shared is not None:
+            await self.shared.adelete(*keys)
+
+        async def delete(client, positions):
+            pipe = client.pipeline(transaction=False)
+            for i in positions:
+                pipe.delete(keys[i])
+            return await pipe.execute()
+
+        try:
+            await self._redis_many(keys, delete)
+        except Exception as e:
+            raise CacheError(f"Failed to delete from cache: {e}")
+
+    async def hset(self, key: str, mapping: dict[str, str], ttl: int) -> None:
+        """Set fields of one hash, (re)arming its expiry."""
+
+        async def write(client):
+            pipe = client.pipeline(transaction=False)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, ttl)
+            return await pipe.execute()
+
+        try:
+            await self._redis(write, self._node(key))
+        except Exception as e:
+            raise CacheError(f"Failed to write hash to cache: {e}")
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        """Read every field of one hash; empty if it does not exist."""
+        try:
+            fields = await self._redis(lambda client: client.hgetall(key), self._node(key))
+        except Exception as e:
+            raise CacheError(f"Failed to read hash from cache: {e}")
+        return {
+            (field.decode() if isinstance(field, bytes) else field): (
+                value.decode() if isinstance(value, bytes) else value
+            )
+            for field, value in fields.items()
+        }
+
+    async def scan_hash(self, key: str, count: int = 1000) -> AsyncIterator[tuple[str, str]]:
+        """Iterate over the fields and values of a hash without blocking Redis."""
+        try:
+            client = await self.get_client(self._node(key))
+            async for field, value in client.hscan_iter(key, count=count):
+                yield (
+                    field.decode() if isinstance(field, bytes) else field,
+                    value.decode() if isinstance(value, bytes) else value,
+                )
+        except Exception as e:
+            raise CacheError(f"Failed to scan hash in cache: {e}")
+
+    async def publish(self, channel: str, message: str) -> None:
+        """Publish a message on a pub/sub channel."""
+        try:
+            await self._redis(lambda client: client.publish(channel, message), self._node(channel))
+        except Exception as e:
+            raise CacheError(f"Failed to publish to cache: {e}")
+
+    async def pubsub(self, channel: str):
+        """A pub/sub connection on the node serving a channel, not yet subscribed."""
+        client = await self.get_client(self._node(channel))
+        return client.pubsub()
+
+    def generate_key(self, query: CanonicalQuery) -> str:
+        """Generate cache key from a canonical query.
+
+        Layout: ``bgpq4:v<version>:<format>:<options digest>:<target>``.
+        """
+        return f"bgpq4:v{CACHE_KEY_VERSION}:{query.format}:{query.digest()}:{query.target}"
 
     async def close(self):
-        """Close Redis connection."""
+        """Flush queued writes and close the Redis connection."""
+        if self.write_behind is not None:
+            await self.write_behind.flush()
         if self._client:
             await self._client.close()
+        for client in self._shards.values():
+            await client.close()
@@ -0,0 +1,146 @@
+import json
+import logging
+import re
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any, Literal
+
+from app.cache import STALE_PREFIX, RedisCache, key_target
+from app.exceptions import CacheError
+from app.metrics import metrics
+from app.models.query import CanonicalQuery
+from app.negative_cache import NegativeCache
+
+logger = logging.getLogger("fastbgpq4")
+
+ASN_TARGET = re.compile(r"^AS(\d+)$")
+
+InvalidationMode = Literal["delete", "stale", "refresh"]
+
+# KEYS[1] tag hash, KEYS[2] its expiry index; ARGV: cache key, query, now,
+# ttl, trim limit. Each field expires on its own, scored by expiry in the
+# index; up to the limit of expired fields are dropped on every write. The
+# keys themselves expire with their newest field.
+TAG_SCRIPT = """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[2], tonumber(ARGV[3]) + tonumber(ARGV[4]), ARGV[1])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[3], 'LIMIT', 0, ARGV[5])
+if #expired > 0 then
+    redis.call('HDEL', KEYS[1], unpack(expired))
+    redis.call('ZREM', KEYS[2], unpack(expired))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return #expired
+"""
+
+
+class CacheTags:
+    """Tag index of cached results, for bulk invalidation.
+
+    Each result written is added to one hash per tag: its target, each of
+    its IRR sources and, for AS targets, the ASN. Hash fields are cache
+    keys and values the query that produced them, so tagged entries can
+    be re-run as well as dropped. Each field expires ``ttl`` seconds after
+    it was last written, which should outlive the entry it indexes, so tags
+    written to all the time still only hold live entries.
+    """
+
+    def __init__(
+        self, cache: RedisCache, ttl: int = 3600, batch_size: int = 500, enabled: bool = True
+    ):
+        self.cache = cache
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.enabled = enabled
+
+    @staticmethod
+    def key(kind: str, value: str) -> str:
+        return f"tag:{kind}:{value.upper()}"
+
+    @staticmethod
+    def expiry_key(tag: str) -> str:
+        """Expiry index of a tag's fields, on the same node as the tag."""
+        return f"{{{tag}}}:expiry"
+
+    def tags(self, query: CanonicalQuery) -> list[str]:
+        """Tag keys of the result of a query."""
+        tags = [self.key("target", query.target)]
+        tags.extend(self.key("source", source) for source in query.sources)
+        match = ASN_TARGET.match(query.target)
+        if match:
+            tags.append(self.key("asn", match.group(1)))
+        return tags
+
+    async def record(
+        self, cache_key: str, query: CanonicalQuery, resource: str | None = None
+    ) -> None:
+        """Index a freshly written result under its tags."""
+        if not self.enabled:
+            return
+        spec = {**query.model_dump(), "sources": list(query.sources), "resource": resource}
+        args = [cache_key, json.dumps(spec), int(time.time()), self.ttl, self.batch_size]
+        calls = [([tag, self.expiry_key(tag)], args) for tag in self.tags(query)]
+        try:
+            await self.cache.eval_many(TAG_SCRIPT, calls)
+        except CacheError as e:
+            # An untagged entry still expires on its own
+            logger.warning(f"Failed to tag {cache_key}: {e}")
+
+    async def queries(self, cache_keys: list[str]) -> list[dict[str, Any] | None]:
+        """The recorded query of each cached result, None where it is untagged."""
+        if not self.enabled or not cache_keys:
+            return [None] * len(cache_keys)
+        tags = [self.key("target", key_target(cache_key)) for cache_key in cache_keys]
+        specs = await self.cache.hget_many(tags, cache_keys)
+        return [json.loads(spec) if spec else None for spec in specs]
+
+    async def restore(self, cache_key: str, spec: dict[str, Any]) -> None:
+        """Index a result under its tags again from its recorded query."""
+        fields = {name: spec[name] for name in CanonicalQuery.model_fields if name in spec}
+        await self.record(cache_key, CanonicalQuery(**fields), spec.get("resource"))
+
+    async def tagged(self, tags: list[str]) -> AsyncIterator[list[tuple[str, dict[str, Any]]]]:
+        """Yield batches of (cache key, query) indexed under any of the tags."""
+        seen: set[str] = set()
+        batch: list[tuple[str, dict[str, Any]]] = []
+        for tag in tags:
+            async for cache_key, spec in self.cache.scan_hash(tag, count=self.batch_size):
+                if cache_key in seen:
+                    continue
+                seen.add(cache_key)
+                batch.append((cache_key, json.loads(spec)))
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    async def invalidate(
+        self,
+        tags: list[str],
+        mode: InvalidationMode = "delete",
+        refresh: Callable[[list[dict[str, Any]]], Awaitable[None]] | None = None,
+    ) -> int:
+        """Invalidate every entry under the tags; returns how many were found.
+
+        ``delete`` drops entries with their stale copies. ``stale`` drops
+        only the fresh entries, so stale copies can still be served while
+        the IRR is unreachable. ``refresh`` leaves entries in place and hands
+        their queries to ``refresh`` to be re-run.
+        """
+        count = 0
+        async for batch in self.tagged(tags):
+            keys = [cache_key for cache_key, _ in batch]
+            if mode == "refresh":
+                await refresh([spec for _, spec in batch])
+            else:
+                doomed = keys + [NegativeCache.key(key) for key in keys]
+                if mode == "delete":
+                    doomed += [STALE_PREFIX + key for key in keys]
+                await self.cache.delete_many(doomed)
+            count += len(batch)
+        if mode == "delete":
+            await self.cache.delete_many(tags + [self.expiry_key(tag) for tag in tags])
+        metrics.track_cache_invalidation(mode, count)
+        return count
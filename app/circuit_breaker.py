@@ -0,0 +1,147 @@
+import time
+from collections import OrderedDict, deque
+from typing import Any
+
+from app.exceptions import CircuitOpenError
+from app.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """Error-rate and latency driven circuit breaker for one dependency.
+
+    Outcomes are kept over a sliding time window. Once it holds ``min_calls``
+    calls and the share of failed or slow calls reaches ``failure_rate``, the
+    circuit opens and calls fail fast for ``open_seconds``. It then lets
+    ``half_open_calls`` probes through: a healthy probe closes it, a failed
+    one opens it again. Used per IRR source set around bgpq4 and for Redis.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window_seconds: float = 60.0,
+        slow_call_seconds: float = 10.0,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.opened_at: float | None = None
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._probes = 0
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        metrics.track_circuit_state(self.name, state)
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    @property
+    def error_rate(self) -> float:
+        self._prune(time.monotonic())
+        if not self._calls:
+            return 0.0
+        return sum(failed for _, failed in self._calls) / len(self._calls)
+
+    def allow(self) -> None:
+        """Admit a call or raise CircuitOpenError."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            elapsed = now - self.opened_at
+            if elapsed < self.open_seconds:
+                metrics.track_circuit_rejection(self.name)
+                raise CircuitOpenError(self.name, retry_after=self.open_seconds - elapsed)
+            self._transition(HALF_OPEN)
+            self._probes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                metrics.track_circuit_rejection(self.name)
+                raise CircuitOpenError(self.name, retry_after=1.0)
+            self._probes += 1
+
+    def record(self, failed: bool, duration_seconds: float) -> None:
+        """Record the outcome of an admitted call; slow calls count as failures."""
+        failed = failed or duration_seconds >= self.slow_call_seconds
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._probes -= 1
+            if failed:
+                self._open(now)
+            else:
+                self._calls.clear()
+                self._transition(CLOSED)
+            return
+
+        self._calls.append((now, failed))
+        self._prune(now)
+        if self.state == CLOSED and len(self._calls) >= self.min_calls:
+            if self.error_rate >= self.failure_rate:
+                self._open(now)
+
+    def release(self) -> None:
+        """Give back an admitted call that ended without an outcome (cancelled)."""
+        if self.state == HALF_OPEN:
+            self._probes -= 1
+
+    def _open(self, now: float) -> None:
+        self.opened_at = now
+        self._transition(OPEN)
+
+    def snapshot(self) -> dict[str, Any]:
+        retry_after = None
+        if self.state == OPEN:
+            retry_after = max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate, 3),
+            "calls": len(self._calls),
+            "retry_after_seconds": retry_after,
+        }
+
+
+class CircuitBreakerRegistry:
+    """Lazily created breakers sharing one configuration, keyed by name.
+
+    At most ``max_breakers`` are kept: past that, the least recently used
+    closed breaker is dropped, along with its state metric.
+    """
+
+    def __init__(self, max_breakers: int = 1000, **config: Any):
+        self.max_breakers = max_breakers
+        self.config = config
+        self._breakers: OrderedDict[str, CircuitBreaker] = OrderedDict()
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is not None:
+            self._breakers.move_to_end(name)
+            return breaker
+        if len(self._breakers) >= self.max_breakers:
+            self._evict()
+        breaker = self._breakers[name] = CircuitBreaker(name, **self.config)
+        return breaker
+
+    def _evict(self) -> None:
+        # Open and half-open breakers are kept, they are still protecting an IRR
+        for name, breaker in self._breakers.items():
+            if breaker.state == CLOSED:
+                del self._breakers[name]
+                metrics.forget_circuit(name)
+                return
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        return {name: breaker.snapshot() for name, breaker in sorted(self._breakers.items())}
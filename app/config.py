@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -8,35 +10,169 @@ class Settings(BaseSettings):
     # BGPq4
     bgpq4_binary: str = "/usr/bin/bgpq4"
     irr_sources: list[str] | str = ["RIPE", "RADB", "ARIN"]
+    # Sources requests may name besides IRR_SOURCES; empty allows any
+    irr_allowed_sources: list[str] | str = []
+
+    # IRR servers; hedging is enabled by setting an alternate host
+    irr_host: str | None = None
+    irr_hedge_host: str | None = None
+    hedge_percentile: float = 0.95
+    hedge_min_delay_ms: int = 200
+    hedge_default_delay_ms: int = 2000
+    hedge_budget_rate: float = 0.5
+    hedge_budget_burst: int = 5
+
+    # IRR mirror pool ("host[:port]" each); takes precedence over irr_host
+    irr_mirrors: list[str] | str = []
+    mirror_ewma_alpha: float = 0.3
+    mirror_eject_failures: int = 3
+    mirror_eject_seconds: int = 30
+    mirror_max_ejected_fraction: float = 0.5
+
+    # Execution pool
+    bgpq4_max_concurrency: int = 32
+    bgpq4_max_queue: int = 64
+    execution_pool_overflow: Literal["job", "reject"] = "job"
 
     # Timing
     sync_timeout_ms: int = 1000
     max_execution_time_ms: int = 30000
 
+    # Latency prediction
+    latency_prediction_enabled: bool = True
+    latency_ewma_alpha: float = 0.3
+    latency_min_samples: int = 3
+    latency_stats_ttl: int = 604800
+
     # Retry
     max_retries: int = 3
     retry_backoff_factor: float = 2.0
+    retry_budget_rate: float = 1.0
+    retry_budget_burst: int = 10
+
+    # Circuit breakers
+    circuit_breaker_enabled: bool = True
+    circuit_breaker_failure_rate: float = 0.5
+    circuit_breaker_min_calls: int = 10
+    circuit_breaker_window_seconds: int = 60
+    circuit_breaker_slow_call_ms: int = 10000
+    circuit_breaker_open_seconds: int = 30
 
     # Cache
     default_cache_ttl: int = 300
     max_cache_ttl: int = 3600
+    adaptive_cache_ttl_enabled: bool = True
+    min_cache_ttl: int = 60
+    cache_ttl_growth: float = 2.0
+    cache_ttl_shrink: float = 0.5
+    cache_ttl_state_ttl: int = 604800
+    negative_cache_ttl: int = 60
+    # Shared through Redis: failures recorded by other replicas and workers
+    # are found once this process next merges the filter's bits
+    negative_cache_bloom_capacity: int = 0
+    negative_cache_bloom_error_rate: float = 0.01
+    negative_cache_bloom_sync_seconds: float = 10.0
+    stale_cache_ttl: int = 0
+    cache_tags_enabled: bool = True
+    cache_invalidation_batch_size: int = 500
+
+    # Hot keys: popularity tracking and proactive refresh; top_k 0 disables
+    hot_key_top_k: int = 100
+    hot_key_window_seconds: int = 3600
+    hot_key_min_hits: int = 5
+    # Requests are counted per process and added to Redis this often
+    hot_key_flush_seconds: float = 5.0
+    hot_key_refresh_ahead_seconds: int = 120
+    hot_key_refresh_concurrency: int = 4
+    hot_key_refresh_schedule: str = "* * * * *"
 
     # Redis
     redis_url: str = "redis://localhost:6379/0"
+    # Cache backends other than REDIS_URL, which always holds the job queue:
+    # a Redis Cluster node, or independent nodes the cache is hashed over
+    redis_cluster_url: str | None = None
+    redis_shard_urls: list[str] | str = []
     job_result_ttl: int = 3600
+    job_lane_weights: dict[str, int] | str = {"interactive": 8, "bulk": 1}
+    # Identical queries share a queued or running job younger than this; 0 disables
+    job_dedup_window: int = 300
+    # Waiting for jobs: longest long-poll, longest event stream, keep-alive interval
+    job_wait_max_seconds: int = 30
+    job_stream_max_seconds: int = 600
+    job_stream_keepalive_seconds: int = 15
+    # How often a worker checks whether its running job was cancelled
+    job_cancel_poll_seconds: float = 1.0
+    # Worker runtime (python -m app.tasks.worker): processes, jobs run and
+    # prefetched per process, drain time on shutdown, metrics port (0 disables)
+    worker_processes: int = 1
+    worker_concurrency: int = 10
+    worker_prefetch: int = 0
+    worker_drain_timeout: float = 30.0
+    worker_metrics_port: int = 0
+    redis_operation_timeout_ms: int = 250
+    redis_circuit_min_calls: int = 5
+    redis_circuit_window_seconds: int = 10
+    redis_circuit_open_seconds: int = 5
+    local_cache_max_entries: int = 10000
+    write_behind_max_pending: int = 10000
+    write_behind_batch_size: int = 200
+    # Host-local cache shared by worker processes, e.g. /dev/shm/fastbgpq4; off when unset
+    shared_cache_path: str | None = None
+    shared_cache_size_mb: int = 64
+    shared_cache_slots: int = 65536
+    shared_cache_ttl: int = 30
+
+    # Prefix index
+    prefix_index_refresh_interval: int = 300
+    prefix_index_rpsl_file: str | None = None
+    prefix_lookup_max_batch: int = 10000
+    set_operation_max_queries: int = 10
+
+    # RPKI
+    rpki_vrp_file: str | None = None
+    rpki_reload_interval: int = 60
+
+    # Snapshots; preloaded at startup when the file exists
+    snapshot_preload_path: str | None = None
+    snapshot_preload_min_hits: int = 0
 
     # API
     api_title: str = "FastBGPQ4"
     api_version: str = "v1"
     log_level: str = "INFO"
+    # Token for /api/v1/admin, sent as X-Admin-Token; the admin API is off when unset
+    admin_token: str | None = None
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
-    @field_validator("irr_sources", mode="before")
+    @field_validator("irr_sources", "irr_allowed_sources", mode="before")
     @classmethod
     def parse_irr_sources(cls, v):
         if isinstance(v, str):
-            return [s.strip() for s in v.split(",")]
+            return [s.strip() for s in v.split(",") if s.strip()]
+        return v
+
+    @field_validator("irr_mirrors", mode="before")
+    @classmethod
+    def parse_irr_mirrors(cls, v):
+        if isinstance(v, str):
+            return [s.strip() for s in v.split(",") if s.strip()]
+        return v
+
+    @field_validator("redis_shard_urls", mode="before")
+    @classmethod
+    def parse_redis_shard_urls(cls, v):
+        if isinstance(v, str):
+            return [s.strip() for s in v.split(",") if s.strip()]
+        return v
+
+    @field_validator("job_lane_weights", mode="before")
+    @classmethod
+    def parse_job_lane_weights(cls, v):
+        # "interactive=8,bulk=1"
+        if isinstance(v, str):
+            pairs = (item.split("=", 1) for item in v.split(",") if item.strip())
+            return {lane.strip(): int(weight) for lane, weight in pairs}
         return v
 
 
@@ -13,6 +13,12 @@ class BGPq4ExecutionError(BGPq4Error):
         self.stderr = stderr
 
 
+class BGPq4PermanentError(BGPq4ExecutionError):
+    """BGPq4 failed for a reason retrying cannot fix, e.g. an unknown object."""
+
+    pass
+
+
 class BGPq4TimeoutError(BGPq4Error):
     """BGPq4 process timed out."""
 
@@ -21,6 +27,29 @@ class BGPq4TimeoutError(BGPq4Error):
         self.timeout_seconds = timeout_seconds
 
 
+class DeadlineExceededError(BGPq4TimeoutError):
+    """The caller's deadline ran out before bgpq4 finished."""
+
+    pass
+
+
+class CircuitOpenError(BGPq4Error):
+    """The circuit breaker for an IRR source set is open."""
+
+    def __init__(self, breaker: str, retry_after: float):
+        super().__init__(f"Circuit breaker {breaker} is open, retry in {retry_after:.0f}s")
+        self.breaker = breaker
+        self.retry_after = retry_after
+
+
+class ExecutionPoolFullError(BGPq4Error):
+    """Too many bgpq4 executions are running and queued to admit another."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("bgpq4 execution pool is full")
+        self.retry_after = retry_after
+
+
 class BGPq4ParseError(BGPq4Error):
     """Failed to parse BGPq4 output."""
 
@@ -33,3 +62,9 @@ class CacheError(Exception):
     """Cache operation failed."""
 
     pass
+
+
+class RPKIError(Exception):
+    """RPKI validation data unavailable or invalid."""
+
+    pass
@@ -0,0 +1,67 @@
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterator
+
+from app.budget import Deadline
+from app.exceptions import DeadlineExceededError, ExecutionPoolFullError
+from app.metrics import metrics
+
+
+class ExecutionPool:
+    """Admission control for bgpq4 processes: a semaphore with a bounded queue.
+
+    At most ``max_concurrency`` processes run at once and at most
+    ``max_queue`` callers wait for a slot; anyone beyond that is rejected
+    immediately with an estimate of when to retry.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, ewma_alpha: float = 0.2):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.ewma_alpha = ewma_alpha
+        self.active = 0
+        self.waiting = 0
+        # Average time a slot is held, used to estimate Retry-After
+        self.hold_seconds = 1.0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def retry_after(self) -> float:
+        """Rough time until a queued caller would get a slot."""
+        return self.hold_seconds * (self.waiting + 1) / self.max_concurrency
+
+    @contextlib.asynccontextmanager
+    async def slot(self, deadline: Deadline | None = None) -> AsyncIterator[None]:
+        """Hold one execution slot, waiting no longer than the deadline allows."""
+        if self.active >= self.max_concurrency and self.waiting >= self.max_queue:
+            metrics.track_pool_rejection()
+            raise ExecutionPoolFullError(retry_after=self.retry_after())
+
+        self.waiting += 1
+        metrics.track_pool_state(self.active, self.waiting)
+        started = time.monotonic()
+        try:
+            if deadline is None or deadline.expires_at is None:
+                await self._semaphore.acquire()
+            else:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=deadline.remaining())
+        except TimeoutError:
+            raise DeadlineExceededError(
+                message="Deadline exceeded waiting for a bgpq4 execution slot",
+                timeout_seconds=time.monotonic() - started,
+            )
+        finally:
+            self.waiting -= 1
+
+        acquired = time.monotonic()
+        metrics.track_pool_wait(acquired - started)
+        self.active += 1
+        metrics.track_pool_state(self.active, self.waiting)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            held = time.monotonic() - acquired
+            self.hold_seconds += self.ewma_alpha * (held - self.hold_seconds)
+            metrics.track_pool_state(self.active, self.waiting)
@@ -0,0 +1,48 @@
+import math
+from collections import deque
+
+from app.budget import RetryBudget
+
+
+class HedgePolicy:
+    """When to hedge a slow bgpq4 execution against an alternate IRR host.
+
+    The hedge delay is a percentile of recent successful execution times,
+    so only the slowest tail gets a second execution. Until enough samples
+    exist ``default_delay`` is used. Every hedge takes a token from
+    ``budget``, which caps the extra load while the IRR is struggling.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        percentile: float = 0.95,
+        min_delay: float = 0.2,
+        default_delay: float = 2.0,
+        min_samples: int = 20,
+        window: int = 200,
+        budget: RetryBudget | None = None,
+    ):
+        self.host = host
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.budget = budget
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def observe(self, duration_seconds: float) -> None:
+        """Record the duration of a successful execution."""
+        self._samples.append(duration_seconds)
+
+    def delay(self) -> float:
+        """Seconds to wait for the primary execution before hedging."""
+        if len(self._samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)
+        return max(self.min_delay, ordered[index])
+
+    def try_acquire(self) -> bool:
+        """Take a hedge token, returning False when the budget is exhausted."""
+        return self.budget is None or self.budget.try_acquire()
@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any
+
+from app.cache import RedisCache
+from app.exceptions import CacheError
+from app.metrics import metrics
+
+logger = logging.getLogger("fastbgpq4")
+
+# Add a batch of request counts to the count-min sketch and keep the top-K
+# sorted set up to date with the new estimates. KEYS: sketch, top-K, then
+# the refresh markers of hit keys. ARGV: ttl, top K, sketch depth, then per
+# cache key: key, count, its marker's position in KEYS (0 unless hit) and
+# one column per row. Returns the keys that entered the top-K, whose queries
+# should be stored, and the hit keys that were written by a refresh. All its
+# keys share the {hotkeys} hash tag so they live on one cluster node or shard.
+FLUSH_SCRIPT = """
+local ttl, top_k, depth = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3])
+local entered, refreshed = {}, {}
+for base = 4, #ARGV, depth + 3 do
+    local key, count = ARGV[base], tonumber(ARGV[base + 1])
+    local estimate = nil
+    for row = 1, depth do
+        local column = row .. ':' .. ARGV[base + 2 + row]
+        local value = redis.call('HINCRBY', KEYS[1], column, count)
+        if estimate == nil or value < estimate then
+            estimate = value
+        end
+    end
+
+    if redis.call('ZSCORE', KEYS[2], key) then
+        redis.call('ZADD', KEYS[2], estimate, key)
+    elseif redis.call('ZCARD', KEYS[2]) < top_k then
+        redis.call('ZADD', KEYS[2], estimate, key)
+        table.insert(entered, key)
+    else
+        local lowest = redis.call('ZRANGE', KEYS[2], 0, 0, 'WITHSCORES')
+        if tonumber(lowest[2]) < estimate then
+            redis.call('ZREM', KEYS[2], lowest[1])
+            redis.call('ZADD', KEYS[2], estimate, key)
+            table.insert(entered, key)
+        end
+    end
+
+    local marker = tonumber(ARGV[base + 2])
+    if marker > 0 and redis.call('DEL', KEYS[marker]) == 1 then
+        table.insert(refreshed, key)
+    end
+end
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+return {entered, refreshed}
+"""
+
+
+def _decode(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class HitBuffer:
+    """Requests counted in this process, not yet flushed to Redis."""
+
+    def __init__(self):
+        self.counts: dict[str, int] = {}
+        self.hits: set[str] = set()
+        self.queries: dict[str, dict[str, Any]] = {}
+        self.flushed_at = time.monotonic()
+        self.flusher: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, cache_key: str, query: dict[str, Any], hit: bool) -> None:
+        self.counts[cache_key] = self.counts.get(cache_key, 0) + 1
+        self.queries[cache_key] = query
+        if hit:
+            self.hits.add(cache_key)
+
+    def take(self) -> tuple[dict[str, int], set[str], dict[str, dict[str, Any]]]:
+        """Hand over the buffered counts and start a new batch."""
+        taken = self.counts, self.hits, self.queries
+        self.counts, self.hits, self.queries = {}, set(), {}
+        self.flushed_at = time.monotonic()
+        return taken
+
+
+class HotKeyTracker:
+    """Query popularity from a count-min sketch and top-K set shared in Redis.
+
+    Counts are kept per window of ``window_seconds``; the hottest keys are
+    ranked over the current and previous window, so popularity fades out
+    within two windows once requests stop.
+
+    Requests are counted in a process-wide ``buffer`` and flushed every
+    ``flush_seconds``, or once ``max_pending`` keys are waiting, so the
+    shard holding the sketch sees one script call per process and interval
+    rather than one per request.
+    """
+
+    def __init__(
+        self,
+        cache: RedisCache,
+        top_k: int = 100,
+        window_seconds: int = 3600,
+        min_hits: int = 5,
+        width: int = 2048,
+        depth: int = 4,
+        buffer: HitBuffer | None = None,
+        flush_seconds: float = 5.0,
+        max_pending: int = 1000,
+    ):
+        self.cache = cache
+        self.top_k = top_k
+        self.window_seconds = window_seconds
+        self.min_hits = min_hits
+        self.width = width
+        self.depth = depth
+        self.buffer = buffer if buffer is not None else HitBuffer()
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+
+    def _window(self, offset: int = 0) -> int:
+        return int(time.time() // self.window_seconds) - offset
+
+    def _columns(self, cache_key: str) -> list[int]:
+        # Double hashing: one sketch column per row from a single digest
+        digest = hashlib.blake2b(cache_key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    @staticmethod
+    def query_key(cache_key: str) -> str:
+        return f"{{hotkeys}}:query:{cache_key}"
+
+    @staticmethod
+    def refreshed_key(cache_key: str) -> str:
+        return f"{{hotkeys}}:refreshed:{cache_key}"
+
+    def record(self, cache_key: str, query: dict[str, Any], hit: bool) -> None:
+        """Count one request for a cache key in this process's buffer.
+
+        ``query`` holds the arguments needed to rerun it; it only reaches
+        Redis if the key enters the top-K. A due buffer is flushed by a
+        background task, so requests never wait on it.
+        """
+        if self.top_k <= 0:
+            return
+        self.buffer.add(cache_key, query, hit)
+        if self.due and (self.buffer.flusher is None or self.buffer.flusher.done()):
+            self.buffer.flusher = asyncio.create_task(self.flush())
+
+    @property
+    def due(self) -> bool:
+        """Whether the buffer should be flushed."""
+        return len(self.buffer) >= self.max_pending or (
+            len(self.buffer) > 0 and time.monotonic() - self.buffer.flushed_at >= self.flush_seconds
+        )
+
+    async def flush(self) -> None:
+        """Add the buffered counts to Redis in one script call."""
+        counts, hits, queries = self.buffer.take()
+        if not counts:
+            return
+        window = self._window()
+        keys = [f"{{hotkeys}}:cms:{window}", f"{{hotkeys}}:top:{window}"]
+        args: list[Any] = [self.window_seconds * 2, self.top_k, self.depth]
+        for cache_key, count in counts.items():
+            marker = 0
+            if cache_key in hits:
+                keys.append(self.refreshed_key(cache_key))
+                marker = len(keys)
+            args += [cache_key, count, marker, *self._columns(cache_key)]
+        try:
+            entered, refreshed = await self.cache.eval(FLUSH_SCRIPT, keys, args)
+            entered = [_decode(key) for key in entered]
+            if entered:
+                await self.cache.write_many(
+                    [
+                        (self.query_key(key), json.dumps(queries[key]), self.window_seconds * 2)
+                        for key in entered
+                    ]
+                )
+        except Exception as e:
+            # Popularity is best effort: a failed flush only loses these counts
+            logger.warning(f"Failed to record popularity of {len(counts)} keys: {e}")
+            return
+        for key in refreshed:
+            metrics.track_hot_key_refresh_hit(queries[_decode(key)].get("resource") or "unknown")
+
+    async def counts(self) -> dict[str, int]:
+        """Request counts of the top-K keys over the current and previous window."""
+        windows = [f"{{hotkeys}}:top:{self._window(offset)}" for offset in (0, 1)]
+        ranked = await self.cache.top_scores(windows, self.top_k)
+
+        counts: dict[str, int] = {}
+        for entries in ranked:
+            for member, score in entries:
+                counts[member] = counts.get(member, 0) + int(score)
+        return counts
+
+    async def hottest(self) -> list[tuple[str, int, dict[str, Any]]]:
+        """Return (cache key, request count, query) for the hottest keys."""
+        counts = await self.counts()
+        hottest = sorted(
+            (item for item in counts.items() if item[1] >= self.min_hits),
+            key=lambda item: item[1],
+            reverse=True,
+        )[: self.top_k]
+
+        queries = await self.cache.get_many([self.query_key(key) for key, _ in hottest])
+        return [
+            (key, count, query)
+            for (key, count), query in zip(hottest, queries, strict=True)
+            if query is not None
+        ]
+
+    async def mark_refreshed(self, cache_key: str, ttl: int) -> None:
+        """Flag an entry as written by a refresh until it is hit or expires."""
+        try:
+            await self.cache.set(self.refreshed_key(cache_key), {"at": time.time()}, ttl)
+        except CacheError as e:
+            logger.warning(f"Failed to mark {cache_key} as refreshed: {e}")
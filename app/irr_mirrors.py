@@ -0,0 +1,113 @@
+import random
+import time
+from typing import Any
+
+from app.metrics import metrics
+
+
+class IRRMirror:
+    """One IRR server bgpq4 can query, with its observed health."""
+
+    def __init__(self, address: str):
+        # "host" or "host:port", passed to bgpq4 as -h
+        self.address = address
+        self.latency: float | None = None
+        self.in_flight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def score(self, fallback_latency: float) -> float:
+        """Expected cost of sending one more query: latency times queue length."""
+        latency = self.latency if self.latency is not None else fallback_latency
+        return latency * (self.in_flight + 1)
+
+
+class MirrorPool:
+    """Picks an IRR mirror per bgpq4 run by power of two choices.
+
+    Two mirrors are sampled at random and the one with the lower EWMA
+    latency times in-flight count wins, which spreads load evenly while
+    steering it away from slow mirrors. A mirror failing
+    ``eject_failures`` runs in a row is ejected for ``eject_seconds``, but
+    never more than ``max_ejected_fraction`` of the pool at once.
+    """
+
+    def __init__(
+        self,
+        addresses: list[str],
+        ewma_alpha: float = 0.3,
+        eject_failures: int = 3,
+        eject_seconds: float = 30.0,
+        max_ejected_fraction: float = 0.5,
+    ):
+        if not addresses:
+            raise ValueError("MirrorPool needs at least one IRR mirror")
+        self.mirrors = [IRRMirror(address) for address in addresses]
+        self.ewma_alpha = ewma_alpha
+        self.eject_failures = eject_failures
+        self.eject_seconds = eject_seconds
+        self.max_ejected_fraction = max_ejected_fraction
+
+    def _fallback_latency(self) -> float:
+        # Unmeasured mirrors look average, so they get traffic without a stampede
+        known = [mirror.latency for mirror in self.mirrors if mirror.latency is not None]
+        return sum(known) / len(known) if known else 1.0
+
+    def acquire(self) -> IRRMirror:
+        """Choose a mirror for one run and count it as in flight."""
+        now = time.monotonic()
+        candidates = [mirror for mirror in self.mirrors if not mirror.ejected(now)]
+        if not candidates:
+            candidates = self.mirrors
+        if len(candidates) == 1:
+            mirror = candidates[0]
+        else:
+            fallback = self._fallback_latency()
+            first, second = random.sample(candidates, 2)
+            mirror = first if first.score(fallback) <= second.score(fallback) else second
+        mirror.in_flight += 1
+        metrics.track_mirror_selection(mirror.address)
+        metrics.track_mirror_state(mirror.address, mirror.latency, mirror.in_flight)
+        return mirror
+
+    def release(self, mirror: IRRMirror, duration_seconds: float, failed: bool | None) -> None:
+        """Record a finished run; ``failed=None`` means it ended without an outcome."""
+        mirror.in_flight -= 1
+        if mirror.latency is None:
+            mirror.latency = duration_seconds
+        elif failed is not None or duration_seconds > mirror.latency:
+            # A run cut short still took at least this long
+            mirror.latency += self.ewma_alpha * (duration_seconds - mirror.latency)
+
+        if failed:
+            mirror.failures += 1
+            if mirror.failures >= self.eject_failures:
+                self._eject(mirror)
+        elif failed is not None:
+            mirror.failures = 0
+        metrics.track_mirror_state(mirror.address, mirror.latency, mirror.in_flight)
+
+    def _eject(self, mirror: IRRMirror) -> None:
+        now = time.monotonic()
+        if mirror.ejected(now):
+            return
+        ejected = sum(other.ejected(now) for other in self.mirrors)
+        if ejected + 1 > self.max_ejected_fraction * len(self.mirrors):
+            return
+        mirror.ejected_until = now + self.eject_seconds
+        mirror.failures = 0
+        metrics.track_mirror_ejection(mirror.address)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            mirror.address: {
+                "latency_ms": round(mirror.latency * 1000) if mirror.latency is not None else None,
+                "in_flight": mirror.in_flight,
+                "ejected": mirror.ejected(now),
+            }
+            for mirror in self.mirrors
+        }
@@ -0,0 +1,104 @@
+import asyncio
+import contextlib
+import json
+import logging
+from collections.abc import AsyncIterator
+
+from app.cache import RedisCache
+from app.exceptions import CacheError
+
+logger = logging.getLogger("fastbgpq4")
+
+# How long a new watcher waits for the subscription before reading anyway
+SUBSCRIBE_TIMEOUT = 1.0
+
+
+class JobEvents:
+    """Job status transitions over Redis pub/sub.
+
+    Workers publish each transition on one channel. A replica holds a
+    single subscription to it, opened by its first watcher, and hands
+    events to the local watchers of that job, so any number of waiting
+    clients costs one connection and no reads until their job changes.
+    Events are hints: watchers re-read the job record when woken, and
+    should re-read it on timeout too, since events sent while the
+    subscription was down are lost.
+    """
+
+    def __init__(
+        self, cache: RedisCache, channel: str = "jobs:events", reconnect_seconds: float = 1.0
+    ):
+        self.cache = cache
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self._watchers: dict[str, set[asyncio.Queue[str]]] = {}
+        self._listener: asyncio.Task | None = None
+        self._subscribed = asyncio.Event()
+
+    async def publish(self, job_id: str, status: str) -> None:
+        try:
+            await self.cache.publish(self.channel, json.dumps({"job_id": job_id, "status": status}))
+        except CacheError as e:
+            # Watchers fall back to their timeouts
+            logger.warning(f"Failed to publish status of job {job_id}: {e}")
+
+    @contextlib.asynccontextmanager
+    async def watch(self, job_id: str) -> AsyncIterator[asyncio.Queue[str]]:
+        """Queue of the statuses published for a job while the context is open.
+
+        Open it before reading the job record, so no transition is missed
+        between the read and the wait.
+        """
+        queue: asyncio.Queue[str] = asyncio.Queue()
+        self._watchers.setdefault(job_id, set()).add(queue)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        try:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._subscribed.wait(), SUBSCRIBE_TIMEOUT)
+            yield queue
+        finally:
+            watchers = self._watchers.get(job_id, set())
+            watchers.discard(queue)
+            if not watchers:
+                self._watchers.pop(job_id, None)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = await self.cache.pubsub(self.channel)
+                try:
+                    await pubsub.subscribe(self.channel)
+                    self._subscribed.set()
+                    while True:
+                        # Bounded reads, so short socket timeouts don't end the subscription
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=1.0
+                        )
+                        if message is not None:
+                            self._dispatch(message["data"])
+                finally:
+                    self._subscribed.clear()
+                    await pubsub.reset()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job event subscription failed: {e}")
+                await asyncio.sleep(self.reconnect_seconds)
+
+    def _dispatch(self, data: bytes | str) -> None:
+        try:
+            event = json.loads(data)
+            job_id, status = event["job_id"], event["status"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed job event: {data!r}")
+            return
+        for queue in self._watchers.get(job_id, ()):
+            queue.put_nowait(status)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
@@ -0,0 +1,229 @@
+import hashlib
+import logging
+import secrets
+import time
+import uuid
+from typing import Any
+
+from app.cache import RedisCache
+from app.exceptions import CacheError
+from app.job_events import JobEvents
+from app.models.job import JobStatus
+from app.models.query import CanonicalQuery
+
+logger = logging.getLogger("fastbgpq4")
+
+# Fields read back as numbers
+TIMESTAMPS = ("created_at", "started_at", "finished_at", "cancelled_at", "stopped_at")
+
+# KEYS[1] dedup index of a query; ARGV: ttl, dedup window, nonce, client
+# token, then field/value pairs. The index names the nonce of the query's
+# latest job for the window. If that job is still queued or running and
+# not cancelled, the client and its token are added to it and it returns
+# {0, nonce}. Otherwise it records a new job under the given nonce and
+# returns {1, nonce}. Job records share the index's hash tag, so the
+# script only touches keys in its slot.
+CREATE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local record = KEYS[1] .. ':' .. current
+    local status = redis.call('HGET', record, 'status')
+    if (status == 'pending' or status == 'processing')
+        and redis.call('HEXISTS', record, 'cancelled_at') == 0 then
+        redis.call('HSET', record, 'client:' .. ARGV[4], 1)
+        redis.call('HINCRBY', record, 'clients', 1)
+        return {0, current}
+    end
+end
+local record = KEYS[1] .. ':' .. ARGV[3]
+redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[2])
+redis.call('HSET', record, 'client:' .. ARGV[4], 1, unpack(ARGV, 5))
+redis.call('EXPIRE', record, ARGV[1])
+return {1, ARGV[3]}
+"""
+
+# KEYS[1] job record; ARGV: ttl, now, client token. Withdraws the client
+# holding the token from a queued or running job, cancelling it when none
+# are left; unknown tokens, including ones already withdrawn, change
+# nothing. Returns the status the job had and the one it has now, false
+# for unknown jobs. ``cancelled_at`` is what workers look for: a late
+# start may still overwrite the status.
+CANCEL_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], 'status')
+if not status then
+    return false
+end
+if redis.call('HEXISTS', KEYS[1], 'cancelled_at') == 1 then
+    return {'cancelled', 'cancelled'}
+end
+if status ~= 'pending' and status ~= 'processing' then
+    return {status, status}
+end
+if redis.call('HDEL', KEYS[1], 'client:' .. ARGV[3]) == 0 then
+    return {status, status}
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if redis.call('HINCRBY', KEYS[1], 'clients', -1) > 0 then
+    return {status, status}
+end
+redis.call('HSET', KEYS[1], 'status', 'cancelled',
+    'finished_at', ARGV[2], 'cancelled_at', ARGV[2])
+return {status, 'cancelled'}
+"""
+
+
+class JobStore:
+    """Compact records of background jobs, for polling.
+
+    Each job is a small hash ``job:<id>`` holding its status, timestamps,
+    error and the cache key of its result, never the result itself: the
+    expansion is stored once, in the result cache, and a poll reads a few
+    short fields. Every write re-arms the record's ``ttl``.
+
+    With a ``dedup_window`` job IDs are derived from the query plus a nonce
+    per job, and an index names the query's latest job for the window, so
+    identical submissions share that job while it is queued or running.
+    A later job gets a new nonce and never overwrites a finished record
+    that clients may still be polling. Each submission gets a token of its own, kept
+    in the record, and cancelling withdraws only the token presented, so
+    the job is only cancelled once every client has cancelled. Past the
+    window a job is presumed lost and the next submission starts another.
+
+    With ``events`` each status written is also published, for clients
+    waiting on the job.
+    """
+
+    def __init__(
+        self,
+        cache: RedisCache,
+        ttl: int = 3600,
+        dedup_window: int = 0,
+        events: JobEvents | None = None,
+    ):
+        self.cache = cache
+        self.ttl = ttl
+        self.dedup_window = dedup_window
+        self.events = events
+
+    @staticmethod
+    def key(job_id: str) -> str:
+        # Jobs of one query share its dedup index's slot: <digest>.<nonce>
+        digest, sep, nonce = job_id.rpartition(".")
+        return f"{JobStore.dedup_key(digest)}:{nonce}" if sep else f"job:{job_id}"
+
+    @staticmethod
+    def dedup_key(digest: str) -> str:
+        return f"job:{{{digest}}}"
+
+    async def _write(self, job_id: str, **fields: Any) -> None:
+        mapping = {name: str(value) for name, value in fields.items() if value is not None}
+        try:
+            await self.cache.hset(self.key(job_id), mapping, self.ttl)
+        except CacheError as e:
+            # The job still runs and caches its result; only polling misses it
+            logger.warning(f"Failed to record job {job_id}: {e}")
+        if self.events is not None:
+            await self.events.publish(job_id, fields["status"])
+
+    def new_id(self, query: CanonicalQuery, rov: str | None = None) -> str:
+        """ID for a job running a query: its digest when deduplicating."""
+        if self.dedup_window <= 0:
+            return str(uuid.uuid4())
+        identity = f"{query.model_dump_json()}|{rov or ''}"
+        return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def new_token() -> str:
+        """Token a client cancels its submission with."""
+        return secrets.token_urlsafe(16)
+
+    async def create(self, job_id: str, token: str, rov: str | None = None) -> tuple[str, bool]:
+        """Record a job as queued; ``rov`` is applied to its result when polled.
+
+        ``token`` is the submitting client's, to cancel with. Returns the ID
+        to poll and whether a job was recorded for it: False if an identical
+        job within the dedup window is still queued or running, in which
+        case the client is only added to it.
+        """
+        now = time.time()
+        fields = {"status": JobStatus.PENDING.value, "created_at": now, "clients": 1, "rov": rov}
+        if self.dedup_window <= 0:
+            await self._write(job_id, **fields, **{f"client:{token}": 1})
+            return job_id, True
+        pairs = [str(part) for item in fields.items() if item[1] is not None for part in item]
+        try:
+            created, nonce = await self.cache.eval(
+                CREATE_SCRIPT,
+                [self.dedup_key(job_id)],
+                [self.ttl, self.dedup_window, uuid.uuid4().hex[:12], token, *pairs],
+            )
+        except CacheError as e:
+            # Without the record the job still runs, just without sharing
+            logger.warning(f"Failed to record job {job_id}: {e}")
+            return job_id, True
+        nonce = nonce.decode() if isinstance(nonce, bytes) else nonce
+        return f"{job_id}.{nonce}", created == 1
+
+    async def start(self, job_id: str) -> None:
+        await self._write(job_id, status=JobStatus.PROCESSING.value, started_at=time.time())
+
+    async def complete(self, job_id: str, result_key: str, execution_time_ms: int) -> None:
+        await self._write(
+            job_id,
+            status=JobStatus.COMPLETED.value,
+            finished_at=time.time(),
+            result_key=result_key,
+            execution_time_ms=execution_time_ms,
+        )
+
+    async def fail(self, job_id: str, error: str, execution_time_ms: int) -> None:
+        await self._write(
+            job_id,
+            status=JobStatus.FAILED.value,
+            finished_at=time.time(),
+            error=error,
+            execution_time_ms=execution_time_ms,
+        )
+
+    async def cancel(self, job_id: str, token: str) -> str | None:
+        """Withdraw the client holding ``token`` from a queued or running job.
+
+        The last client to withdraw cancels the job, and its worker notices
+        when it next checks. Returns the job's status afterwards, None if it
+        is unknown: still queued or running while other clients share it.
+        Finished jobs, and tokens the job does not hold, change nothing.
+        """
+        result = await self.cache.eval(
+            CANCEL_SCRIPT, [self.key(job_id)], [self.ttl, time.time(), token]
+        )
+        if not result:
+            return None
+        previous, status = (
+            value.decode() if isinstance(value, bytes) else value for value in result
+        )
+        if status != previous and self.events is not None:
+            await self.events.publish(job_id, status)
+        return status
+
+    async def record_cancelled(self, job_id: str, execution_time_ms: int) -> None:
+        """Record that a worker gave up a cancelled job."""
+        now = time.time()
+        await self._write(
+            job_id,
+            status=JobStatus.CANCELLED.value,
+            finished_at=now,
+            stopped_at=now,
+            execution_time_ms=execution_time_ms,
+        )
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        """Read a job record; None if unknown or expired."""
+        record: dict[str, Any] = await self.cache.hgetall(self.key(job_id))
+        if not record:
+            return None
+        for name in TIMESTAMPS:
+            if name in record:
+                record[name] = float(record[name])
+        if "execution_time_ms" in record:
+            record["execution_time_ms"] = int(record["execution_time_ms"])
+        return record
@@ -0,0 +1,81 @@
+import logging
+
+from app.cache import RedisCache
+from app.exceptions import CacheError
+
+logger = logging.getLogger("fastbgpq4")
+
+# Atomically fold one observation into an EWMA of the mean and of the absolute
+# deviation, so concurrent API replicas and workers share one estimate.
+EWMA_UPDATE_SCRIPT = """
+local alpha = tonumber(ARGV[2])
+local sample = tonumber(ARGV[1])
+for i, key in ipairs(KEYS) do
+    local stats = redis.call('HMGET', key, 'ewma', 'dev')
+    local ewma = tonumber(stats[1])
+    local dev = tonumber(stats[2])
+    if ewma == nil then
+        ewma = sample
+        dev = 0
+    else
+        dev = alpha * math.abs(sample - ewma) + (1 - alpha) * dev
+        ewma = alpha * sample + (1 - alpha) * ewma
+    end
+    redis.call('HSET', key, 'ewma', tostring(ewma), 'dev', tostring(dev))
+    redis.call('HINCRBY', key, 'count', 1)
+    redis.call('EXPIRE', key, tonumber(ARGV[3]))
+end
+return 1
+"""
+
+
+class LatencyTracker:
+    """Per-target and per-resource bgpq4 execution time statistics in Redis."""
+
+    def __init__(
+        self,
+        cache: RedisCache,
+        alpha: float = 0.3,
+        min_samples: int = 3,
+        stats_ttl: int = 604800,
+    ):
+        self.cache = cache
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.stats_ttl = stats_ttl
+
+    def _keys(self, resource: str, target: str) -> tuple[str, str]:
+        # Hash-tagged by resource so the update script's keys share a node
+        return f"latency:{{{resource}}}:{target.upper()}", f"latency:{{{resource}}}"
+
+    async def record(self, resource: str, target: str, duration_ms: float):
+        """Record an execution time for a target and its resource."""
+        try:
+            await self.cache.eval(
+                EWMA_UPDATE_SCRIPT,
+                list(self._keys(resource, target)),
+                [duration_ms, self.alpha, self.stats_ttl],
+            )
+        except CacheError as e:
+            # Statistics are best effort and must never fail a query
+            logger.warning(f"Failed to record latency for {target}: {e}")
+
+    async def predict(self, resource: str, target: str) -> int | None:
+        """Predict the execution time in milliseconds.
+
+        Uses the target's own history once it has enough samples, else the
+        resource-wide average. Returns None when neither is known yet.
+        """
+        try:
+            stats = await self.cache.hmget_many(
+                list(self._keys(resource, target)), ["ewma", "dev", "count"]
+            )
+        except CacheError as e:
+            logger.warning(f"Failed to read latency for {target}: {e}")
+            return None
+
+        for ewma, dev, count in stats:
+            if ewma is not None and int(count or 0) >= self.min_samples:
+                # Lean towards the slow side so borderline targets go async
+                return int(float(ewma) + float(dev or 0))
+        return None
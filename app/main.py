@@ -1,19 +1,65 @@
+import logging
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from app.api.dependencies import (
+    get_cache,
+    get_cache_tags,
+    get_hot_key_tracker,
+    get_job_events,
+)
 from app.api.health import router as health_router
+from app.api.v1.admin import router as admin_router
 from app.api.v1.as_set import router as as_set_router
 from app.api.v1.autonomous_system import router as autonomous_system_router
 from app.api.v1.jobs import router as jobs_router
+from app.api.v1.prefix_index import router as prefix_index_router
+from app.api.v1.prefix_sets import router as prefix_sets_router
 from app.api.v1.route_set import router as route_set_router
 from app.config import settings
+from app.exceptions import CacheError
+from app.snapshot import restore_file
+
+logger = logging.getLogger("fastbgpq4")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the cache from a snapshot before serving
+    path = settings.snapshot_preload_path
+    if path and os.path.exists(path):
+        try:
+            result = await restore_file(
+                get_cache(),
+                path,
+                min_hits=settings.snapshot_preload_min_hits,
+                state_ttl=settings.cache_ttl_state_ttl,
+                tags=get_cache_tags(get_cache()),
+            )
+            logger.info(f"Preloaded {result['restored']} cache entries from {path}")
+        except (CacheError, OSError, ValueError) as e:
+            logger.warning(f"Failed to preload cache snapshot {path}: {e}")
+    yield
+    # Counts still buffered would otherwise be lost
+    await get_hot_key_tracker(get_cache()).flush()
+    await get_job_events().close()
+    # Flush write-behind cache writes so no results are lost
+    await get_cache().close()
+
 
 app = FastAPI(
     title=settings.api_title,
     version=settings.api_version,
+    lifespan=lifespan,
 )
 
 app.include_router(health_router)
+app.include_router(admin_router)
 app.include_router(as_set_router)
 app.include_router(autonomous_system_router)
 app.include_router(jobs_router)
+app.include_router(prefix_index_router)
+app.include_router(prefix_sets_router)
 app.include_router(route_set_router)
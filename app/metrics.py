@@ -1,5 +1,7 @@
 from prometheus_client import Counter, Gauge, Histogram
 
+CIRCUIT_STATES = {"closed": 0, "half-open": 1, "open": 2}
+
 
 class Metrics:
     """Prometheus metrics for the application."""
@@ -23,13 +25,213 @@ class Metrics:
             "fastbgpq4_cache_misses_total", "Total cache misses", ["resource"]
         )
 
+        self.cache_fallbacks = Counter(
+            "fastbgpq4_cache_fallbacks_total",
+            "Cache operations served by the local fallback while Redis was unavailable",
+            ["operation"],
+        )
+
+        self.negative_cache_hits = Counter(
+            "fastbgpq4_negative_cache_hits_total",
+            "Requests answered from a cached permanent bgpq4 failure",
+            ["resource"],
+        )
+
+        self.write_behind_pending = Gauge(
+            "fastbgpq4_cache_write_behind_pending", "Cache writes queued but not yet in Redis"
+        )
+
+        self.write_behind_writes = Counter(
+            "fastbgpq4_cache_write_behind_writes_total",
+            "Write-behind cache writes: flushed, failed or backpressure",
+            ["outcome"],
+        )
+
+        self.cache_invalidations = Counter(
+            "fastbgpq4_cache_invalidations_total",
+            "Cache entries invalidated through their tags, by mode",
+            ["mode"],
+        )
+
+        self.shared_cache_lookups = Counter(
+            "fastbgpq4_shared_cache_lookups_total",
+            "Lookups in the host-local shared memory cache tier",
+            ["outcome"],
+        )
+
+        self.shared_cache_evictions = Counter(
+            "fastbgpq4_shared_cache_evictions_total",
+            "Live entries evicted by shared memory cache compactions",
+        )
+
+        self.shared_cache_compactions = Counter(
+            "fastbgpq4_shared_cache_compactions_total",
+            "Compactions of the shared memory cache arena",
+        )
+
+        self.cache_ttl = Histogram(
+            "fastbgpq4_cache_ttl_seconds",
+            "Effective TTL of cache entries when written",
+            buckets=(30, 60, 120, 300, 600, 1800, 3600, 7200, 14400, 43200, 86400, 172800, 604800),
+        )
+
+        self.cache_content_changes = Counter(
+            "fastbgpq4_cache_content_changes_total",
+            "Cache writes by whether the result changed: new, changed, unchanged or unknown",
+            ["outcome"],
+        )
+
+        self.hot_key_refreshes = Counter(
+            "fastbgpq4_hot_key_refreshes_total",
+            "Proactive refreshes of popular cache entries: refreshed or failed",
+            ["outcome"],
+        )
+
+        self.hot_key_refresh_hits = Counter(
+            "fastbgpq4_hot_key_refresh_hits_total",
+            "Refreshed cache entries hit at least once before expiring",
+            ["resource"],
+        )
+
         self.bgpq4_execution_duration = Histogram(
             "fastbgpq4_bgpq4_execution_duration_seconds",
             "BGPq4 execution duration in seconds",
         )
 
+        self.retries = Counter(
+            "fastbgpq4_bgpq4_retries_total",
+            "BGPq4 retry decisions: attempted, deadline or budget_exhausted",
+            ["outcome"],
+        )
+
+        self.pool_active = Gauge(
+            "fastbgpq4_execution_pool_active", "bgpq4 processes currently running"
+        )
+
+        self.pool_queue_depth = Gauge(
+            "fastbgpq4_execution_pool_queue_depth", "Callers waiting for a bgpq4 execution slot"
+        )
+
+        self.pool_wait_duration = Histogram(
+            "fastbgpq4_execution_pool_wait_seconds",
+            "Time spent waiting for a bgpq4 execution slot",
+        )
+
+        self.pool_rejections = Counter(
+            "fastbgpq4_execution_pool_rejections_total",
+            "bgpq4 executions shed because the wait queue was full",
+        )
+
+        self.circuit_state = Gauge(
+            "fastbgpq4_circuit_breaker_state",
+            "Circuit breaker state: 0 closed, 1 half-open, 2 open",
+            ["breaker"],
+        )
+
+        self.circuit_rejections = Counter(
+            "fastbgpq4_circuit_breaker_rejections_total",
+            "Calls rejected by an open circuit breaker",
+            ["breaker"],
+        )
+
+        self.hedges = Counter(
+            "fastbgpq4_bgpq4_hedges_total",
+            "Hedged executions: started, won, lost or budget_exhausted",
+            ["outcome"],
+        )
+
+        self.mirror_selections = Counter(
+            "fastbgpq4_irr_mirror_selections_total",
+            "bgpq4 runs sent to each IRR mirror",
+            ["mirror"],
+        )
+
+        self.mirror_latency = Gauge(
+            "fastbgpq4_irr_mirror_latency_seconds", "EWMA bgpq4 run time per IRR mirror", ["mirror"]
+        )
+
+        self.mirror_in_flight = Gauge(
+            "fastbgpq4_irr_mirror_in_flight", "bgpq4 runs in flight per IRR mirror", ["mirror"]
+        )
+
+        self.mirror_ejections = Counter(
+            "fastbgpq4_irr_mirror_ejections_total",
+            "IRR mirrors ejected after consecutive failures",
+            ["mirror"],
+        )
+
         self.active_jobs = Gauge("fastbgpq4_active_jobs", "Number of active background jobs")
 
+        self.lane_depth = Gauge(
+            "fastbgpq4_job_lane_depth", "Jobs queued per priority lane", ["lane"]
+        )
+
+        self.lane_wait_duration = Histogram(
+            "fastbgpq4_job_lane_wait_seconds",
+            "Time jobs spent queued before a worker picked them up",
+            ["lane"],
+            buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+        )
+
+        self.job_duplicates = Counter(
+            "fastbgpq4_job_duplicates_total",
+            "Async submissions answered with an identical job already queued or running",
+            ["resource"],
+        )
+
+        self.worker_tasks = Counter(
+            "fastbgpq4_worker_tasks_total",
+            "Tasks run per worker process, by task and whether they raised",
+            ["worker", "task", "outcome"],
+        )
+
+        self.worker_queue_latency = Histogram(
+            "fastbgpq4_worker_queue_latency_seconds",
+            "Time jobs spent queued before each worker process picked them up",
+            ["worker"],
+            buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+        )
+
+        self.worker_in_flight = Gauge(
+            "fastbgpq4_worker_in_flight", "Jobs running per worker process", ["worker"]
+        )
+
+        self.worker_capacity = Gauge(
+            "fastbgpq4_worker_capacity", "Jobs each worker process runs at once", ["worker"]
+        )
+
+        self.jobs_cancelled = Counter(
+            "fastbgpq4_jobs_cancelled_total",
+            "Cancelled jobs, by whether a worker found them queued or running",
+            ["stage"],
+        )
+
+        self.job_cancel_reclaimed = Counter(
+            "fastbgpq4_job_cancel_reclaimed_seconds_total",
+            "Predicted worker seconds that cancelled jobs did not spend",
+            ["stage"],
+        )
+
+        self.routing_decisions = Counter(
+            "fastbgpq4_routing_decisions_total",
+            "How uncached queries were served (sync, stale or one of the async routes)",
+            ["resource", "decision"],
+        )
+
+        self.prefix_index_size = Gauge(
+            "fastbgpq4_prefix_index_size", "Number of prefixes in the reverse lookup index"
+        )
+
+        self.prefix_lookups = Counter(
+            "fastbgpq4_prefix_lookups_total", "Total prefixes looked up in the reverse index"
+        )
+
+        self.rov_validations = Counter(
+            "fastbgpq4_rov_validations_total", "Route origin validation results", ["state"]
+        )
+
+        self.vrp_count = Gauge("fastbgpq4_vrp_count", "Number of loaded RPKI VRPs")
+
     def track_request(self, resource: str, operation: str, status_code: int):
         """Track a request."""
         self.request_count.labels(
@@ -44,10 +246,154 @@ class Metrics:
         """Track a cache miss."""
         self.cache_misses.labels(resource=resource).inc()
 
+    def track_cache_fallback(self, operation: str):
+        """Track a cache operation served by the local fallback."""
+        self.cache_fallbacks.labels(operation=operation).inc()
+
+    def track_negative_cache_hit(self, resource: str):
+        """Track a request answered from the negative cache."""
+        self.negative_cache_hits.labels(resource=resource).inc()
+
     def track_bgpq4_execution(self, duration_seconds: float):
         """Track bgpq4 execution duration."""
         self.bgpq4_execution_duration.observe(duration_seconds)
 
+    def track_routing(self, resource: str, decision: str):
+        """Track a sync/async routing decision."""
+        self.routing_decisions.labels(resource=resource, decision=decision).inc()
+
+    def track_prefix_lookups(self, count: int, index_size: int):
+        """Track a batch of reverse prefix lookups."""
+        self.prefix_lookups.inc(count)
+        self.prefix_index_size.set(index_size)
+
+    def track_rov(self, summary: dict[str, int], vrp_count: int):
+        """Track route origin validation results."""
+        for state, count in summary.items():
+            if count:
+                self.rov_validations.labels(state=state).inc(count)
+        self.vrp_count.set(vrp_count)
+
+    def track_retry(self, outcome: str):
+        """Track a bgpq4 retry decision."""
+        self.retries.labels(outcome=outcome).inc()
+
+    def track_write_behind_pending(self, pending: int):
+        """Track the write-behind queue length."""
+        self.write_behind_pending.set(pending)
+
+    def track_write_behind(self, outcome: str, count: int = 1):
+        """Track write-behind cache writes."""
+        self.write_behind_writes.labels(outcome=outcome).inc(count)
+
+    def track_cache_invalidation(self, mode: str, count: int):
+        """Track cache entries invalidated by tag."""
+        self.cache_invalidations.labels(mode=mode).inc(count)
+
+    def track_shared_cache(self, outcome: str):
+        """Track a shared memory cache lookup."""
+        self.shared_cache_lookups.labels(outcome=outcome).inc()
+
+    def track_shared_cache_compaction(self, evicted: int):
+        """Track a shared memory cache compaction and the entries it evicted."""
+        self.shared_cache_compactions.inc()
+        self.shared_cache_evictions.inc(evicted)
+
+    def track_cache_ttl(self, ttl_seconds: int):
+        """Track the TTL a cache entry was written with."""
+        self.cache_ttl.observe(ttl_seconds)
+
+    def track_cache_content(self, outcome: str):
+        """Track whether a rewritten cache entry changed."""
+        self.cache_content_changes.labels(outcome=outcome).inc()
+
+    def track_hot_key_refresh(self, outcome: str):
+        """Track a proactive refresh of a popular cache entry."""
+        self.hot_key_refreshes.labels(outcome=outcome).inc()
+
+    def track_hot_key_refresh_hit(self, resource: str):
+        """Track the first hit on a proactively refreshed entry."""
+        self.hot_key_refresh_hits.labels(resource=resource).inc()
+
+    def track_hedge(self, outcome: str):
+        """Track a hedging decision or result."""
+        self.hedges.labels(outcome=outcome).inc()
+
+    def track_mirror_selection(self, mirror: str):
+        """Track a bgpq4 run sent to an IRR mirror."""
+        self.mirror_selections.labels(mirror=mirror).inc()
+
+    def track_mirror_state(self, mirror: str, latency_seconds: float | None, in_flight: int):
+        """Track an IRR mirror's latency estimate and in-flight runs."""
+        if latency_seconds is not None:
+            self.mirror_latency.labels(mirror=mirror).set(latency_seconds)
+        self.mirror_in_flight.labels(mirror=mirror).set(in_flight)
+
+    def track_mirror_ejection(self, mirror: str):
+        """Track an IRR mirror ejected from selection."""
+        self.mirror_ejections.labels(mirror=mirror).inc()
+
+    def track_pool_state(self, active: int, waiting: int):
+        """Track execution pool occupancy."""
+        self.pool_active.set(active)
+        self.pool_queue_depth.set(waiting)
+
+    def track_pool_wait(self, duration_seconds: float):
+        """Track time spent waiting for an execution slot."""
+        self.pool_wait_duration.observe(duration_seconds)
+
+    def track_pool_rejection(self):
+        """Track an execution shed by the pool."""
+        self.pool_rejections.inc()
+
+    def track_circuit_state(self, breaker: str, state: str):
+        """Track a circuit breaker state change."""
+        self.circuit_state.labels(breaker=breaker).set(CIRCUIT_STATES[state])
+
+    def forget_circuit(self, breaker: str):
+        """Drop the state of a circuit breaker that is no longer tracked."""
+        try:
+            self.circuit_state.remove(breaker)
+        except KeyError:
+            pass
+
+    def track_circuit_rejection(self, breaker: str):
+        """Track a call rejected by an open circuit."""
+        self.circuit_rejections.labels(breaker=breaker).inc()
+
+    def track_lane_depth(self, lane: str, depth: int):
+        """Track the queue depth of a job lane."""
+        self.lane_depth.labels(lane=lane).set(depth)
+
+    def track_lane_wait(self, lane: str, duration_seconds: float):
+        """Track how long a job waited in its lane."""
+        self.lane_wait_duration.labels(lane=lane).observe(duration_seconds)
+
+    def track_job_duplicate(self, resource: str):
+        """Track a submission deduplicated onto an existing job."""
+        self.job_duplicates.labels(resource=resource).inc()
+
+    def track_worker_task(self, worker: str, task: str, outcome: str):
+        """Track a task a worker process finished."""
+        self.worker_tasks.labels(worker=worker, task=task, outcome=outcome).inc()
+
+    def track_worker_queue_latency(self, worker: str, seconds: float):
+        """Track how long a job waited before a worker process picked it up."""
+        self.worker_queue_latency.labels(worker=worker).observe(seconds)
+
+    def track_worker_in_flight(self, worker: str, count: int):
+        """Track the jobs a worker process is running."""
+        self.worker_in_flight.labels(worker=worker).set(count)
+
+    def track_worker_capacity(self, worker: str, concurrency: int):
+        """Track how many jobs a worker process runs at once."""
+        self.worker_capacity.labels(worker=worker).set(concurrency)
+
+    def track_job_cancelled(self, stage: str, reclaimed_seconds: float):
+        """Track a cancelled job and the worker time it gave back."""
+        self.jobs_cancelled.labels(stage=stage).inc()
+        self.job_cancel_reclaimed.labels(stage=stage).inc(reclaimed_seconds)
+
     def increment_active_jobs(self):
         """Increment active job count."""
         self.active_jobs.inc()
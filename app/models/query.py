@@ -0,0 +1,77 @@
+import hashlib
+import json
+
+from pydantic import BaseModel, ConfigDict
+
+# RPSL source-scoped object names, e.g. RADB::AS-HURRICANE
+SOURCE_SEPARATOR = "::"
+
+
+def _normalize_sources(sources: list[str] | tuple[str, ...]) -> tuple[str, ...]:
+    # IRR source names are case-insensitive; order is kept as it sets priority
+    normalized = (source.strip().upper() for source in sources)
+    return tuple(dict.fromkeys(source for source in normalized if source))
+
+
+class CanonicalQuery(BaseModel):
+    """A bgpq4 query in normal form: queries meaning the same are equal.
+
+    Targets are upper-cased and a ``SOURCE::`` prefix becomes the source
+    list. Sources are upper-cased and deduplicated, with the configured
+    defaults spelled out. Masklens keep 0 apart from unset.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    target: str
+    sources: tuple[str, ...]
+    aggregate: bool = False
+    min_masklen: int | None = None
+    max_masklen: int | None = None
+    format: str = "json"
+
+    @classmethod
+    def normalize(
+        cls,
+        target: str,
+        sources: list[str] | None = None,
+        aggregate: bool = False,
+        min_masklen: int | None = None,
+        max_masklen: int | None = None,
+        format: str = "json",
+        default_sources: list[str] | None = None,
+        allowed_sources: list[str] | None = None,
+    ) -> "CanonicalQuery":
+        """Build the canonical form of a query; raises ValueError if it is malformed.
+
+        With ``allowed_sources``, requested sources must be among them or
+        the defaults.
+        """
+        target = target.strip().upper()
+        explicit = _normalize_sources(sources or [])
+        if SOURCE_SEPARATOR in target:
+            source, target = (part.strip() for part in target.split(SOURCE_SEPARATOR, 1))
+            if explicit and source not in explicit:
+                raise ValueError(f"{source}::{target} is not in the requested sources")
+            explicit = (source,)
+        if not target:
+            raise ValueError("Empty query target")
+        if allowed_sources:
+            allowed = _normalize_sources([*allowed_sources, *(default_sources or [])])
+            unknown = [source for source in explicit if source not in allowed]
+            if unknown:
+                raise ValueError(f"Unknown IRR source: {', '.join(unknown)}")
+        return cls(
+            target=target,
+            sources=explicit or _normalize_sources(default_sources or []),
+            aggregate=aggregate,
+            min_masklen=min_masklen,
+            max_masklen=max_masklen,
+            format=format.strip().lower(),
+        )
+
+    def digest(self) -> str:
+        """Short stable digest of the options besides target and format."""
+        options = [list(self.sources), self.aggregate, self.min_masklen, self.max_masklen]
+        serialized = json.dumps(options, separators=(",", ":"))
+        return hashlib.blake2b(serialized.encode(), digest_size=8).hexdigest()
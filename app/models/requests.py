@@ -1,4 +1,6 @@
-from pydantic import BaseModel, field_validator
+from typing import Literal
+
+from pydantic import BaseModel, Field, field_validator
 
 
 class BGPQueryRequest(BaseModel):
@@ -12,6 +14,7 @@ class BGPQueryRequest(BaseModel):
     aggregate: bool = False
     min_masklen: int | None = None
     max_masklen: int | None = None
+    priority: Literal["interactive", "bulk"] = "interactive"
 
     @field_validator("min_masklen", "max_masklen")
     @classmethod
@@ -19,3 +22,44 @@ class BGPQueryRequest(BaseModel):
         if v is not None and (v < 0 or v > 128):
             raise ValueError("Masklen must be between 0 and 128")
         return v
+
+
+class PrefixLookupRequest(BaseModel):
+    """Request model for batch reverse prefix lookups."""
+
+    prefixes: list[str]
+
+
+class PrefixQuerySpec(BaseModel):
+    """A cached JSON expansion referenced by a set operation."""
+
+    target: str
+    sources: list[str] | None = None
+    aggregate: bool = False
+    min_masklen: int | None = None
+    max_masklen: int | None = None
+
+    @field_validator("min_masklen", "max_masklen")
+    @classmethod
+    def validate_masklen(cls, v):
+        if v is not None and (v < 0 or v > 128):
+            raise ValueError("Masklen must be between 0 and 128")
+        return v
+
+
+class SetOperationRequest(BaseModel):
+    """Request model for combining prefix lists."""
+
+    operation: Literal["union", "intersection", "difference"]
+    queries: list[PrefixQuerySpec] = Field(min_length=2)
+    aggregate: bool = False
+    cache_ttl: int | None = None
+
+
+class InvalidationRequest(BaseModel):
+    """Request model for invalidating cached results by tag."""
+
+    targets: list[str] = []
+    sources: list[str] = []
+    asns: list[int] = []
+    mode: Literal["delete", "stale", "refresh"] = "delete"
@@ -18,6 +18,7 @@ class AsyncResponse(BaseModel):
     status: str
     job_id: str
     poll_url: str
+    cancel_token: str
     estimated_time_ms: int | None = None
 
 
@@ -29,3 +30,23 @@ class JobStatusResponse(BaseModel):
     data: dict[str, Any] | None = None
     error: str | None = None
     execution_time_ms: int | None = None
+
+
+class PrefixLookupResponse(BaseModel):
+    """Response for batch reverse prefix lookups."""
+
+    results: list[dict[str, Any]]
+    count: int
+    index_size: int
+    index_built_at: float | None = None
+    execution_time_ms: int
+
+
+class SetOperationResponse(BaseModel):
+    """Response for prefix list set operations."""
+
+    operation: str
+    prefixes: list[str]
+    count: int
+    queries: list[dict[str, Any]]
+    execution_time_ms: int
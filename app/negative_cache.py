@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Any
+
+from app.cache import RedisCache
+from app.exceptions import BGPq4PermanentError, CacheError
+
+logger = logging.getLogger("fastbgpq4")
+
+# Bits of the Bloom filter every process records failures in
+BLOOM_KEY = "negative:bloom"
+
+# KEYS[1] Bloom filter bits; ARGV: bit offsets to set
+SETBITS_SCRIPT = """
+for _, offset in ipairs(ARGV) do
+    redis.call('SETBIT', KEYS[1], offset, 1)
+end
+return #ARGV
+"""
+
+
+class BloomFilter:
+    """Fixed-size in-process Bloom filter over strings.
+
+    Sized for ``capacity`` entries at the given false positive rate; it only
+    ever grows, so a false positive costs one extra lookup, never a wrong
+    answer. Bits are laid out like Redis SETBIT offsets, so a copy of the
+    filter kept in Redis can be merged in as is.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+        self.synced_at = 0.0
+        self.sync_task: asyncio.Task | None = None
+
+    def positions(self, item: str) -> list[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str) -> None:
+        with self._lock:
+            for position in self.positions(item):
+                self._bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def merge(self, bits: bytes) -> None:
+        """Set every bit set in ``bits``, a filter of the same size."""
+        with self._lock:
+            for i, byte in enumerate(bits[: len(self._bits)]):
+                self._bits[i] |= byte
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[p >> 3] & (0x80 >> (p & 7)) for p in self.positions(item))
+
+
+class NegativeCache:
+    """Short-TTL cache of permanent bgpq4 failures, keyed like the result cache.
+
+    An optional Bloom filter of keys known to have failed fronts the Redis
+    lookup, so queries for names never seen missing skip it. Failures are
+    set in the filter's bits in Redis as well, by every process recording
+    them, and each process merges those bits into its own filter every
+    ``bloom_sync_seconds`` in the background. A failure recorded by another
+    replica or a worker is therefore found here within that long.
+    """
+
+    def __init__(
+        self,
+        cache: RedisCache,
+        ttl: int = 60,
+        bloom: BloomFilter | None = None,
+        bloom_sync_seconds: float = 10.0,
+    ):
+        self.cache = cache
+        self.ttl = ttl
+        self.bloom = bloom
+        self.bloom_sync_seconds = bloom_sync_seconds
+
+    @staticmethod
+    def key(cache_key: str) -> str:
+        return f"negative:{cache_key}"
+
+    async def get(self, cache_key: str) -> dict[str, Any] | None:
+        """Return the cached failure for a query, if any."""
+        if self.ttl <= 0:
+            return None
+        if self.bloom is not None:
+            self._sync_bloom()
+            if cache_key not in self.bloom:
+                return None
+        try:
+            return await self.cache.get(self.key(cache_key))
+        except CacheError as e:
+            logger.warning(f"Failed to read negative cache: {e}")
+            return None
+
+    async def record(self, cache_key: str, error: BGPq4PermanentError) -> None:
+        """Remember a permanent failure for ``ttl`` seconds."""
+        if self.ttl <= 0:
+            return
+        if self.bloom is not None:
+            self.bloom.add(cache_key)
+        try:
+            await self.cache.set(
+                self.key(cache_key),
+                {"error": describe_failure(error), "return_code": error.return_code},
+                self.ttl,
+            )
+            if self.bloom is not None:
+                await self.cache.eval(SETBITS_SCRIPT, [BLOOM_KEY], self.bloom.positions(cache_key))
+        except CacheError as e:
+            logger.warning(f"Failed to write negative cache: {e}")
+
+    def _sync_bloom(self) -> None:
+        """Schedule merging the shared filter bits into this process's filter."""
+        now = time.monotonic()
+        task = self.bloom.sync_task
+        if now - self.bloom.synced_at >= self.bloom_sync_seconds and (task is None or task.done()):
+            self.bloom.synced_at = now
+            self.bloom.sync_task = asyncio.create_task(self._pull_bloom())
+
+    async def _pull_bloom(self) -> None:
+        try:
+            [(bits, _)] = await self.cache.dump_many([BLOOM_KEY])
+        except CacheError as e:
+            # Lookups go on with what this process knows
+            logger.warning(f"Failed to read negative cache filter: {e}")
+            return
+        if bits:
+            self.bloom.merge(bits)
+
+
+def describe_failure(error: BGPq4PermanentError) -> str:
+    """Human-readable reason for a permanent failure."""
+    return error.stderr.strip() or str(error)
@@ -0,0 +1,358 @@
+import asyncio
+import gzip
+import logging
+import re
+import socket
+import time
+from collections.abc import Hashable, Iterator
+from typing import Any
+
+from app.cache import CACHE_KEY_VERSION, RedisCache, key_target
+
+logger = logging.getLogger("fastbgpq4")
+
+ASN_PATTERN = re.compile(r"^AS(\d+)$", re.IGNORECASE)
+
+ADDRESS_WIDTHS = {4: 32, 6: 128}
+ADDRESS_FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+
+def parse_prefix(prefix: str) -> tuple[int, int, int]:
+    """Parse a prefix string into (version, network, length).
+
+    Uses inet_pton rather than ``ipaddress`` since batch lookups and index
+    builds parse hundreds of thousands of prefixes.
+    """
+    address, _, length_str = prefix.strip().partition("/")
+    version = 6 if ":" in address else 4
+    width = ADDRESS_WIDTHS[version]
+    try:
+        packed = socket.inet_pton(ADDRESS_FAMILIES[version], address)
+        length = int(length_str) if length_str else width
+    except (OSError, ValueError):
+        raise ValueError(f"Invalid prefix: {prefix!r}")
+    if not 0 <= length <= width:
+        raise ValueError(f"Invalid prefix length: {prefix!r}")
+    shift = width - length
+    network = (int.from_bytes(packed, "big") >> shift) << shift
+    return version, network, length
+
+
+def format_prefix(version: int, network: int, length: int) -> str:
+    """Format (version, network, length) back into a prefix string."""
+    packed = network.to_bytes(ADDRESS_WIDTHS[version] // 8, "big")
+    return f"{socket.inet_ntop(ADDRESS_FAMILIES[version], packed)}/{length}"
+
+
+def parse_asn(value: str | int) -> int | None:
+    """Parse an ASN given as ``AS64500``, ``"64500"`` or ``64500``."""
+    if isinstance(value, int):
+        return value
+    value = value.strip()
+    match = ASN_PATTERN.match(value)
+    if match:
+        return int(match.group(1))
+    if value.isdigit():
+        return int(value)
+    return None
+
+
+class _Node:
+    """Patricia trie node."""
+
+    __slots__ = ("key", "length", "left", "right", "values")
+
+    def __init__(self, key: int, length: int, values: tuple = ()):
+        self.key = key
+        self.length = length
+        self.left: _Node | None = None
+        self.right: _Node | None = None
+        self.values = values
+
+
+class PrefixTrie:
+    """Path-compressed binary (Patricia) trie for a single address family.
+
+    Every stored prefix carries a tuple of hashable values. Lookups walk the
+    trie once and return every stored prefix covering the query, most specific
+    first, which gives longest-prefix match as the first result.
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+        self.width = ADDRESS_WIDTHS[version]
+        self._root = _Node(0, 0)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _bit(self, key: int, position: int) -> int:
+        return (key >> (self.width - 1 - position)) & 1
+
+    def _common_length(self, a: int, b: int, limit: int) -> int:
+        diff = a ^ b
+        common = self.width if diff == 0 else self.width - diff.bit_length()
+        return min(common, limit)
+
+    def insert(self, network: int, length: int, value: Hashable) -> None:
+        """Attach ``value`` to ``network/length``, creating the node if needed."""
+        node = self._root
+        while True:
+            if node.length == length:
+                if not node.values:
+                    self._size += 1
+                if value not in node.values:
+                    node.values = node.values + (value,)
+                return
+
+            bit = self._bit(network, node.length)
+            child = node.right if bit else node.left
+            if child is None:
+                self._attach(node, bit, _Node(network, length, (value,)))
+                self._size += 1
+                return
+
+            common = self._common_length(network, child.key, min(length, child.length))
+            if common == child.length:
+                node = child
+                continue
+
+            if common == length:
+                # The new prefix sits between node and child
+                new = _Node(network, length, (value,))
+                self._attach(new, self._bit(child.key, length), child)
+                self._attach(node, bit, new)
+                self._size += 1
+                return
+
+            # Prefixes diverge below both: add a value-less branching node
+            shift = self.width - common
+            branch = _Node((network >> shift) << shift, common)
+            self._attach(branch, self._bit(child.key, common), child)
+            self._attach(branch, self._bit(network, common), _Node(network, length, (value,)))
+            self._attach(node, bit, branch)
+            self._size += 1
+            return
+
+    @staticmethod
+    def _attach(parent: _Node, bit: int, child: _Node) -> None:
+        if bit:
+            parent.right = child
+        else:
+            parent.left = child
+
+    def covering(self, network: int, length: int) -> list[tuple[int, int, tuple]]:
+        """Return all stored prefixes covering ``network/length``, most specific first."""
+        matches = []
+        width = self.width
+        node: _Node | None = self._root
+        while node is not None and node.length <= length:
+            node_length = node.length
+            if node_length and (network ^ node.key) >> (width - node_length):
+                break
+            if node.values:
+                matches.append((node.key, node_length, node.values))
+            if node_length == length:
+                break
+            node = node.right if (network >> (width - 1 - node_length)) & 1 else node.left
+        matches.reverse()
+        return matches
+
+    def __iter__(self) -> Iterator[tuple[int, int, tuple]]:
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node.values:
+                yield node.key, node.length, node.values
+            if node.right is not None:
+                stack.append(node.right)
+            if node.left is not None:
+                stack.append(node.left)
+
+
+class PrefixIndex:
+    """Reverse lookup index from prefixes to origin ASNs and containing sets."""
+
+    ORIGIN = "origin"
+    SET = "set"
+
+    def __init__(self):
+        self._tries = {4: PrefixTrie(4), 6: PrefixTrie(6)}
+        self._interned: dict[tuple, tuple] = {}
+        self.built_at: float | None = None
+
+    def __len__(self) -> int:
+        return sum(len(trie) for trie in self._tries.values())
+
+    def add(self, prefix: str, origin: int | None = None, as_set: str | None = None) -> None:
+        """Index ``prefix`` as originated by ``origin`` and/or contained in ``as_set``."""
+        version, network, length = parse_prefix(prefix)
+        trie = self._tries[version]
+        if origin is not None:
+            trie.insert(network, length, self._intern((self.ORIGIN, origin)))
+        if as_set is not None:
+            trie.insert(network, length, self._intern((self.SET, as_set)))
+
+    def _intern(self, value: tuple) -> tuple:
+        # Share value tuples between nodes to keep full-table indexes small
+        return self._interned.setdefault(value, value)
+
+    def lookup(self, prefix: str) -> dict[str, Any]:
+        """Find origins and sets covering ``prefix``."""
+        version, network, length = parse_prefix(prefix)
+        matches = self._tries[version].covering(network, length)
+
+        origins: list[int] = []
+        as_sets: set[str] = set()
+        covering = []
+        for key, match_length, values in matches:
+            match_origins = []
+            match_sets = []
+            for kind, value in values:
+                if kind == self.ORIGIN:
+                    match_origins.append(value)
+                else:
+                    match_sets.append(value)
+            if len(match_origins) > 1:
+                match_origins.sort()
+            if len(match_sets) > 1:
+                match_sets.sort()
+            if match_origins and not origins:
+                origins = match_origins
+            as_sets.update(match_sets)
+            covering.append(
+                {
+                    "prefix": format_prefix(version, key, match_length),
+                    "origins": match_origins,
+                    "as_sets": match_sets,
+                }
+            )
+
+        return {
+            "prefix": prefix,
+            "longest_match": covering[0]["prefix"] if covering else None,
+            "origins": origins,
+            "as_sets": sorted(as_sets),
+            "covering": covering,
+        }
+
+    def lookup_many(self, prefixes: list[str]) -> list[dict[str, Any]]:
+        """Look up a batch of prefixes in one pass."""
+        results = []
+        for prefix in prefixes:
+            try:
+                results.append(self.lookup(prefix))
+            except ValueError:
+                results.append(
+                    {"prefix": prefix, "error": "Invalid prefix", "origins": [], "as_sets": []}
+                )
+        return results
+
+    def add_expansion(self, target: str, prefixes: list[str]) -> None:
+        """Index a cached expansion: ASN targets give origins, sets give membership."""
+        origin = parse_asn(target)
+        for prefix in prefixes:
+            try:
+                if origin is not None:
+                    self.add(prefix, origin=origin)
+                else:
+                    self.add(prefix, as_set=target.upper())
+            except ValueError:
+                logger.warning(f"Skipping invalid prefix {prefix!r} from {target}")
+
+    def load_rpsl(self, path: str) -> int:
+        """Load route/route6 objects from an IRR mirror dump (optionally gzipped)."""
+        opener = gzip.open if path.endswith(".gz") else open
+        loaded = 0
+        prefix = origin = None
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    if prefix and origin is not None:
+                        self.add(prefix, origin=origin)
+                        loaded += 1
+                    prefix = origin = None
+                    continue
+                attribute, _, value = line.partition(":")
+                attribute = attribute.strip().lower()
+                if attribute in ("route", "route6"):
+                    prefix = value.strip()
+                elif attribute == "origin":
+                    origin = parse_asn(value)
+        if prefix and origin is not None:
+            self.add(prefix, origin=origin)
+            loaded += 1
+        return loaded
+
+
+async def build_index_from_cache(
+    cache: RedisCache, rpsl_file: str | None = None, batch_size: int = 500
+) -> PrefixIndex:
+    """Build a fresh index from cached JSON expansions and an optional RPSL dump."""
+    index = PrefixIndex()
+    if rpsl_file:
+        await asyncio.to_thread(index.load_rpsl, rpsl_file)
+
+    batch: list[str] = []
+    async for key in cache.scan_keys(f"bgpq4:v{CACHE_KEY_VERSION}:json:*"):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            # Trie inserts are CPU bound; the index is not served until built
+            await asyncio.to_thread(_index_batch, index, batch, await cache.get_many(batch))
+            batch = []
+    if batch:
+        await asyncio.to_thread(_index_batch, index, batch, await cache.get_many(batch))
+
+    index.built_at = time.time()
+    return index
+
+
+def _index_batch(index: PrefixIndex, keys: list[str], values: list[dict | None]) -> None:
+    for key, value in zip(keys, values, strict=True):
+        if not value or "prefixes" not in value:
+            continue
+        index.add_expansion(key_target(key), value["prefixes"])
+
+
+class PrefixIndexHolder:
+    """Holds the current index and rebuilds it in the background when stale."""
+
+    def __init__(self, max_age_seconds: int, rpsl_file: str | None = None):
+        self.max_age_seconds = max_age_seconds
+        self.rpsl_file = rpsl_file
+        self.index: PrefixIndex | None = None
+        self._lock = asyncio.Lock()
+        self._rebuild_task: asyncio.Task | None = None
+
+    def is_stale(self) -> bool:
+        if self.index is None or self.index.built_at is None:
+            return True
+        return time.time() - self.index.built_at > self.max_age_seconds
+
+    async def rebuild(self, cache: RedisCache) -> PrefixIndex:
+        """Rebuild the index and swap it in once complete."""
+        async with self._lock:
+            if self.index is not None and not self.is_stale():
+                return self.index
+            started = time.time()
+            self.index = await build_index_from_cache(cache, rpsl_file=self.rpsl_file)
+            logger.info(
+                f"Prefix index rebuilt with {len(self.index)} prefixes "
+                f"in {time.time() - started:.2f}s"
+            )
+            return self.index
+
+    async def get(self, cache: RedisCache, force: bool = False) -> PrefixIndex:
+        """Return the current index, building it on first use.
+
+        A stale index keeps serving while the replacement is built in the
+        background, so lookups never wait on a rebuild once warm.
+        """
+        if force and self.index is not None:
+            self.index.built_at = None
+        if self.index is None or force:
+            return await self.rebuild(cache)
+        if self.is_stale() and (self._rebuild_task is None or self._rebuild_task.done()):
+            self._rebuild_task = asyncio.create_task(self.rebuild(cache))
+        return self.index
@@ -0,0 +1,173 @@
+from bisect import bisect_right
+
+from app.prefix_index import ADDRESS_WIDTHS, format_prefix, parse_prefix
+
+OPERATIONS = ("union", "intersection", "difference")
+
+# Per address family: sorted, de-duplicated (network, length) pairs
+PackedPrefixes = dict[int, list[tuple[int, int]]]
+# Per address family: sorted, disjoint, non-adjacent inclusive (start, end) ranges
+Intervals = dict[int, list[tuple[int, int]]]
+
+
+def pack(prefixes: list[str]) -> PackedPrefixes:
+    """Parse prefixes into sorted integer arrays per address family."""
+    packed: dict[int, set[tuple[int, int]]] = {4: set(), 6: set()}
+    for prefix in prefixes:
+        version, network, length = parse_prefix(prefix)
+        packed[version].add((network, length))
+    return {version: sorted(entries) for version, entries in packed.items()}
+
+
+def unpack(packed: PackedPrefixes) -> list[str]:
+    """Format packed prefixes back to strings, IPv4 first."""
+    return [
+        format_prefix(version, network, length)
+        for version in (4, 6)
+        for network, length in packed.get(version, [])
+    ]
+
+
+def _span(version: int, network: int, length: int) -> tuple[int, int]:
+    return network, network + (1 << (ADDRESS_WIDTHS[version] - length)) - 1
+
+
+def to_intervals(packed: PackedPrefixes) -> Intervals:
+    """Merge packed prefixes into the address space they cover."""
+    intervals: Intervals = {}
+    for version, entries in packed.items():
+        merged: list[tuple[int, int]] = []
+        for network, length in entries:
+            start, end = _span(version, network, length)
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        intervals[version] = merged
+    return intervals
+
+
+def _covered(intervals: list[tuple[int, int]], starts: list[int], start: int, end: int) -> bool:
+    i = bisect_right(starts, start) - 1
+    return i >= 0 and intervals[i][1] >= end
+
+
+def _intersect(a: list[tuple[int, int]], b: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start <= end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _subtract(a: list[tuple[int, int]], b: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    result = []
+    j = 0
+    for start, end in a:
+        while j < len(b) and b[j][1] < start:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] <= end:
+            if b[k][0] > start:
+                result.append((start, b[k][0] - 1))
+            start = max(start, b[k][1] + 1)
+            if start > end:
+                break
+            k += 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+
+def _union(a: list[tuple[int, int]], b: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(a + b):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def to_prefixes(version: int, intervals: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Decompose address ranges into the minimal list of CIDR prefixes."""
+    width = ADDRESS_WIDTHS[version]
+    prefixes = []
+    for start, end in intervals:
+        while start <= end:
+            # Largest aligned block starting at ``start`` that fits in the range
+            size = (start & -start).bit_length() - 1 if start else width
+            while start + (1 << size) - 1 > end:
+                size -= 1
+            prefixes.append((start, width - size))
+            start += 1 << size
+    return prefixes
+
+
+def combine(operation: str, prefix_lists: list[list[str]], aggregate: bool = False) -> list[str]:
+    """Combine prefix lists with containment-aware set semantics.
+
+    Without aggregation the result keeps original prefixes: ``intersection``
+    returns prefixes whose address space is covered by every list, and
+    ``difference`` returns prefixes of the first list not covered by any of
+    the others. With aggregation the exact address space of the result is
+    returned as the minimal set of CIDR prefixes.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {operation}")
+    packed_lists = [pack(prefixes) for prefixes in prefix_lists]
+    interval_lists = [to_intervals(packed) for packed in packed_lists]
+
+    if aggregate:
+        result: PackedPrefixes = {}
+        for version in (4, 6):
+            ranges = interval_lists[0][version]
+            for other in interval_lists[1:]:
+                if operation == "union":
+                    ranges = _union(ranges, other[version])
+                elif operation == "intersection":
+                    ranges = _intersect(ranges, other[version])
+                else:
+                    ranges = _subtract(ranges, other[version])
+            result[version] = to_prefixes(version, ranges)
+        return unpack(result)
+
+    result = {}
+    for version in (4, 6):
+        if operation == "union":
+            candidates = sorted({entry for packed in packed_lists for entry in packed[version]})
+        elif operation == "intersection":
+            candidates = sorted({entry for packed in packed_lists for entry in packed[version]})
+            for intervals in interval_lists:
+                candidates = _filter_covered(version, candidates, intervals[version], keep=True)
+        else:
+            candidates = packed_lists[0][version]
+            others: list[tuple[int, int]] = []
+            for intervals in interval_lists[1:]:
+                others = _union(others, intervals[version])
+            candidates = _filter_covered(version, candidates, others, keep=False)
+        result[version] = candidates
+    return unpack(result)
+
+
+def _filter_covered(
+    version: int,
+    candidates: list[tuple[int, int]],
+    intervals: list[tuple[int, int]],
+    keep: bool,
+) -> list[tuple[int, int]]:
+    starts = [start for start, _ in intervals]
+    return [
+        (network, length)
+        for network, length in candidates
+        if _covered(intervals, starts, *_span(version, network, length)) == keep
+    ]
@@ -0,0 +1,222 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any
+
+from app.exceptions import RPKIError
+from app.prefix_index import (
+    PrefixIndexHolder,
+    PrefixTrie,
+    format_prefix,
+    parse_asn,
+    parse_prefix,
+)
+
+logger = logging.getLogger("fastbgpq4")
+
+VALID = "valid"
+INVALID = "invalid"
+NOT_FOUND = "not-found"
+UNKNOWN = "unknown"
+
+
+class VRPStore:
+    """Validated ROA payloads indexed for route origin validation (RFC 6811).
+
+    VRPs live in a per-family Patricia trie keyed by the ROA prefix, so finding
+    the VRPs covering a route is one walk from the root.
+    """
+
+    def __init__(self):
+        self._tries = {4: PrefixTrie(4), 6: PrefixTrie(6)}
+        self.count = 0
+        self.loaded_at: float | None = None
+
+    def add(self, prefix: str, asn: int, max_length: int | None = None) -> None:
+        """Add a single VRP."""
+        version, network, length = parse_prefix(prefix)
+        self._tries[version].insert(
+            network, length, (asn, max_length if max_length is not None else length)
+        )
+        self.count += 1
+
+    def validate(self, prefix: str, origin: int | None) -> str:
+        """Validate a prefix/origin pair.
+
+        With an unknown origin a covered prefix can still be proven invalid when
+        no covering VRP allows its length; otherwise its state is unknown.
+        """
+        version, network, length = parse_prefix(prefix)
+        matches = self._tries[version].covering(network, length)
+        if not matches:
+            return NOT_FOUND
+
+        length_ok = False
+        for _, _, vrps in matches:
+            for asn, max_length in vrps:
+                # AS0 VRPs never validate a route (RFC 7607)
+                if length <= max_length and asn != 0:
+                    if asn == origin:
+                        return VALID
+                    length_ok = True
+        if origin is None and length_ok:
+            return UNKNOWN
+        return INVALID
+
+    def validate_many(self, pairs: list[tuple[str, int | None]]) -> list[str]:
+        """Validate a batch of prefix/origin pairs."""
+        return [self.validate(prefix, origin) for prefix, origin in pairs]
+
+
+def load_vrps(path: str) -> VRPStore:
+    """Load VRPs from an rpki-client or Routinator JSON or CSV export."""
+    store = VRPStore()
+    try:
+        if path.endswith(".csv"):
+            _load_csv(store, path)
+        else:
+            _load_json(store, path)
+    except (OSError, ValueError, KeyError) as e:
+        raise RPKIError(f"Failed to load VRPs from {path}: {e}")
+    store.loaded_at = time.time()
+    return store
+
+
+def _load_json(store: VRPStore, path: str) -> None:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    for roa in data["roas"]:
+        asn = parse_asn(roa["asn"])
+        if asn is None:
+            raise ValueError(f"invalid ASN {roa['asn']!r}")
+        store.add(roa["prefix"], asn, int(roa.get("maxLength") or 0) or None)
+
+
+def _load_csv(store: VRPStore, path: str) -> None:
+    # Columns: ASN, IP Prefix, Max Length, Trust Anchor[, Expires]
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if not row or row[0].strip().upper() == "ASN":
+                continue
+            asn = parse_asn(row[0])
+            if asn is None:
+                raise ValueError(f"invalid ASN {row[0]!r}")
+            max_length = row[2].strip() if len(row) > 2 else ""
+            store.add(row[1], asn, int(max_length) if max_length else None)
+
+
+class VRPHolder:
+    """Holds the current VRP set and hot-reloads it when the file changes.
+
+    Reloads parse the file off the event loop and swap the new store in
+    atomically, so requests keep validating against the previous VRPs.
+    """
+
+    def __init__(self, path: str | None, reload_interval: int = 60):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.store: VRPStore | None = None
+        self._mtime: float | None = None
+        self._last_check = 0.0
+        self._lock = asyncio.Lock()
+        self._reload_task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    async def reload(self) -> VRPStore | None:
+        """Reload the VRP file if it changed since the last load."""
+        async with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if self.store is not None and mtime == self._mtime:
+                    return self.store
+                self.store = await asyncio.to_thread(load_vrps, self.path)
+                self._mtime = mtime
+                logger.info(f"Loaded {self.store.count} VRPs from {self.path}")
+            except (OSError, RPKIError) as e:
+                # Keep serving the previous VRPs
+                logger.error(f"VRP reload failed: {e}")
+            return self.store
+
+    async def get(self) -> VRPStore:
+        """Return the current VRPs, scheduling a background reload check."""
+        if not self.enabled:
+            raise RPKIError("RPKI validation is not configured (set RPKI_VRP_FILE)")
+        if self.store is None:
+            self._last_check = time.time()
+            if await self.reload() is None:
+                raise RPKIError(f"No VRPs available from {self.path}")
+            return self.store
+
+        now = time.time()
+        if now - self._last_check >= self.reload_interval and (
+            self._reload_task is None or self._reload_task.done()
+        ):
+            self._last_check = now
+            self._reload_task = asyncio.create_task(self.reload())
+        return self.store
+
+
+def resolve_origins(
+    target: str, prefixes: list[str], index_holder: PrefixIndexHolder | None
+) -> list[int | None]:
+    """Resolve the origin ASN of each prefix in an expansion.
+
+    ASN targets originate all their prefixes. Set expansions carry no origin,
+    so the reverse prefix index is consulted (when built) for exact matches.
+    """
+    origin = parse_asn(target)
+    if origin is not None:
+        return [origin] * len(prefixes)
+
+    index = index_holder.index if index_holder is not None else None
+    if index is None:
+        return [None] * len(prefixes)
+
+    origins: list[int | None] = []
+    for prefix in prefixes:
+        try:
+            result = index.lookup(prefix)
+            exact = result["longest_match"] == format_prefix(*parse_prefix(prefix))
+        except ValueError:
+            exact = False
+        if exact and len(result["origins"]) == 1:
+            origins.append(result["origins"][0])
+        else:
+            origins.append(None)
+    return origins
+
+
+def apply_rov(
+    data: dict[str, Any],
+    target: str,
+    mode: str,
+    store: VRPStore,
+    index_holder: PrefixIndexHolder | None = None,
+) -> dict[str, Any]:
+    """Validate an expansion against VRPs, annotating or dropping invalids."""
+    prefixes = data.get("prefixes", [])
+    origins = resolve_origins(target, prefixes, index_holder)
+    states = store.validate_many(list(zip(prefixes, origins, strict=True)))
+    summary = Counter(states)
+
+    result = dict(data)
+    rov: dict[str, Any] = {
+        "mode": mode,
+        "summary": {state: summary.get(state, 0) for state in (VALID, INVALID, NOT_FOUND, UNKNOWN)},
+    }
+    if mode == "drop":
+        kept = [p for p, state in zip(prefixes, states, strict=True) if state != INVALID]
+        rov["dropped"] = [p for p, state in zip(prefixes, states, strict=True) if state == INVALID]
+        result["prefixes"] = kept
+        result["count"] = len(kept)
+    else:
+        rov["states"] = dict(zip(prefixes, states, strict=True))
+    result["rov"] = rov
+    return result
@@ -0,0 +1,267 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any
+
+from app.metrics import metrics
+
+logger = logging.getLogger("fastbgpq4")
+
+MAGIC = b"FBQ4SHM1"
+# magic, slots, arena size, arena tail, live entries, used slots (incl. tombstones)
+HEADER = struct.Struct("<8sQQQQQ")
+HEADER_SIZE = 64
+# key hash, record offset, record length, expires at, last access
+SLOT = struct.Struct("<QQIdd")
+# key length, value length
+RECORD = struct.Struct("<HI")
+
+EMPTY = 0
+TOMBSTONE = 1
+
+
+def _key_hash(key: str) -> int:
+    # Stable across processes, unlike hash(); 0 and 1 mark free slots
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return max(int.from_bytes(digest, "big"), 2)
+
+
+class SharedMemoryCache:
+    """Host-local cache tier shared by every worker process through mmap.
+
+    Entries are appended to an arena file and found through an open
+    addressing hash index in a second file; both are mapped by every
+    process, so a hot entry is stored once per host instead of once per
+    worker. Readers hold a shared ``flock`` and writers an exclusive one.
+    Reads copy the value out before parsing it: once the lock is released
+    a compaction may rewrite the arena under a view.
+
+    The async methods keep lock waits and compactions off the event loop:
+    reads run inline when the lock is free and in a thread otherwise,
+    writes and deletes always in a thread.
+
+    When the arena or index fills up it is compacted in place: expired and
+    deleted entries are dropped and the least recently read live entries
+    are evicted until ``compact_fraction`` of the space is in use. Access
+    times are updated without the exclusive lock, so the order is LRU-ish.
+
+    Only keys starting with ``prefix`` are kept, for at most ``max_ttl``
+    seconds since other hosts' writes and deletes never reach this tier.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        arena_bytes: int = 64 * 1024 * 1024,
+        slots: int = 65536,
+        max_ttl: int = 30,
+        prefix: str = "bgpq4:",
+        max_load: float = 0.75,
+        compact_fraction: float = 0.5,
+    ):
+        self.path = path
+        self.arena_bytes = arena_bytes
+        self.slots = slots
+        self.max_ttl = max_ttl
+        self.prefix = prefix
+        self.max_load = max_load
+        self.compact_fraction = compact_fraction
+        # flock is held per open file, so it does not exclude this process's threads
+        self._mutex = threading.Lock()
+
+        self._index_fd = os.open(f"{path}.index", os.O_RDWR | os.O_CREAT, 0o600)
+        self._arena_fd = os.open(f"{path}.arena", os.O_RDWR | os.O_CREAT, 0o600)
+        index_bytes = HEADER_SIZE + slots * SLOT.size
+        with self._lock(fcntl.LOCK_EX):
+            os.ftruncate(self._index_fd, max(os.fstat(self._index_fd).st_size, index_bytes))
+            os.ftruncate(self._arena_fd, max(os.fstat(self._arena_fd).st_size, arena_bytes))
+            self._index = mmap.mmap(self._index_fd, index_bytes)
+            self._arena = mmap.mmap(self._arena_fd, arena_bytes)
+            magic, file_slots, file_arena, *_ = HEADER.unpack_from(self._index, 0)
+            if (magic, file_slots, file_arena) != (MAGIC, slots, arena_bytes):
+                # New file, or one laid out by a differently configured process
+                self._index[:] = bytes(index_bytes)
+                self._write_header(0, 0, 0)
+
+    @contextmanager
+    def _lock(self, operation: int, blocking: bool = True):
+        """Hold the file lock; without ``blocking`` raise BlockingIOError if taken."""
+        if not self._mutex.acquire(blocking=blocking):
+            raise BlockingIOError("Shared cache lock is taken")
+        try:
+            fcntl.flock(self._index_fd, operation if blocking else operation | fcntl.LOCK_NB)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._index_fd, fcntl.LOCK_UN)
+        finally:
+            self._mutex.release()
+
+    def _header(self) -> tuple[int, int, int]:
+        _, _, _, tail, live, used = HEADER.unpack_from(self._index, 0)
+        return tail, live, used
+
+    def _write_header(self, tail: int, live: int, used: int) -> None:
+        HEADER.pack_into(self._index, 0, MAGIC, self.slots, self.arena_bytes, tail, live, used)
+
+    def _slot(self, i: int) -> tuple[int, int, int, float, float]:
+        return SLOT.unpack_from(self._index, HEADER_SIZE + i * SLOT.size)
+
+    def _write_slot(self, i: int, *slot: Any) -> None:
+        SLOT.pack_into(self._index, HEADER_SIZE + i * SLOT.size, *slot)
+
+    def _record(self, offset: int) -> tuple[memoryview, memoryview]:
+        """Key and value of an arena record, as views into the mapping."""
+        key_len, value_len = RECORD.unpack_from(self._arena, offset)
+        start = offset + RECORD.size
+        view = memoryview(self._arena)
+        return view[start : start + key_len], view[start + key_len : start + key_len + value_len]
+
+    def _find(self, key: str, h: int) -> tuple[int | None, int | None]:
+        """Return (slot holding key, first reusable slot) by linear probing."""
+        encoded = key.encode()
+        free = None
+        start = h % self.slots
+        for n in range(self.slots):
+            i = (start + n) % self.slots
+            slot_hash, offset, *_ = self._slot(i)
+            if slot_hash == EMPTY:
+                return None, free if free is not None else i
+            if slot_hash == TOMBSTONE:
+                if free is None:
+                    free = i
+            elif slot_hash == h and self._record(offset)[0] == encoded:
+                return i, free
+        return None, free
+
+    def accepts(self, key: str) -> bool:
+        return key.startswith(self.prefix)
+
+    def get(self, key: str, blocking: bool = True) -> dict[str, Any] | None:
+        if not self.accepts(key):
+            return None
+        h = _key_hash(key)
+        with self._lock(fcntl.LOCK_SH, blocking):
+            i, _ = self._find(key, h)
+            if i is not None:
+                slot_hash, offset, length, expires_at, _ = self._slot(i)
+                now = time.time()
+                if expires_at > now:
+                    self._write_slot(i, slot_hash, offset, length, expires_at, now)
+                    # Copied under the lock; json cannot parse a view anyway
+                    value = json.loads(bytes(self._record(offset)[1]))
+                    metrics.track_shared_cache("hit")
+                    return value
+        metrics.track_shared_cache("miss")
+        return None
+
+    def set(self, key: str, serialized: str, ttl: int) -> None:
+        if not self.accepts(key):
+            return
+        ttl = min(ttl, self.max_ttl)
+        encoded_key, value = key.encode(), serialized.encode()
+        length = RECORD.size + len(encoded_key) + len(value)
+        if ttl <= 0 or length > self.arena_bytes // 4:
+            return
+
+        h = _key_hash(key)
+        with self._lock(fcntl.LOCK_EX):
+            tail, live, used = self._header()
+            if tail + length > self.arena_bytes or used + 1 > self.slots * self.max_load:
+                self._compact()
+                tail, live, used = self._header()
+                if tail + length > self.arena_bytes:
+                    return
+
+            i, free = self._find(key, h)
+            if i is None:
+                if free is None:
+                    return
+                if self._slot(free)[0] == EMPTY:
+                    used += 1
+                i = free
+                live += 1
+            RECORD.pack_into(self._arena, tail, len(encoded_key), len(value))
+            start = tail + RECORD.size
+            self._arena[start : start + len(encoded_key)] = encoded_key
+            self._arena[start + len(encoded_key) : tail + length] = value
+            now = time.time()
+            self._write_slot(i, h, tail, length, now + ttl, now)
+            self._write_header(tail + length, live, used)
+
+    def delete(self, key: str) -> None:
+        if not self.accepts(key):
+            return
+        with self._lock(fcntl.LOCK_EX):
+            i, _ = self._find(key, _key_hash(key))
+            if i is not None:
+                self._write_slot(i, TOMBSTONE, 0, 0, 0.0, 0.0)
+                tail, live, used = self._header()
+                self._write_header(tail, live - 1, used)
+
+    async def aget(self, key: str) -> dict[str, Any] | None:
+        if not self.accepts(key):
+            return None
+        try:
+            return self.get(key, blocking=False)
+        except BlockingIOError:
+            return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, serialized: str, ttl: int) -> None:
+        if self.accepts(key):
+            await asyncio.to_thread(self.set, key, serialized, ttl)
+
+    async def adelete(self, *keys: str) -> None:
+        keys = tuple(key for key in keys if self.accepts(key))
+        if keys:
+            await asyncio.to_thread(self._delete_all, keys)
+
+    def _delete_all(self, keys: tuple[str, ...]) -> None:
+        for key in keys:
+            self.delete(key)
+
+    def _compact(self) -> None:
+        """Rewrite the arena and index with the most recently read live entries."""
+        now = time.time()
+        entries = []
+        for i in range(self.slots):
+            slot_hash, offset, length, expires_at, accessed_at = self._slot(i)
+            if slot_hash > TOMBSTONE and expires_at > now:
+                entries.append((accessed_at, slot_hash, expires_at, offset, length))
+        entries.sort(reverse=True)
+
+        kept = []
+        size = 0
+        budget = self.arena_bytes * self.compact_fraction
+        max_entries = int(self.slots * self.max_load * self.compact_fraction)
+        for accessed_at, slot_hash, expires_at, offset, length in entries:
+            if size + length > budget or len(kept) >= max_entries:
+                break
+            record = bytes(self._arena[offset : offset + length])
+            kept.append((slot_hash, record, expires_at, accessed_at))
+            size += length
+
+        self._index[HEADER_SIZE:] = bytes(self.slots * SLOT.size)
+        tail = 0
+        for slot_hash, record, expires_at, accessed_at in kept:
+            self._arena[tail : tail + len(record)] = record
+            i = slot_hash % self.slots
+            while self._slot(i)[0] != EMPTY:
+                i = (i + 1) % self.slots
+            self._write_slot(i, slot_hash, tail, len(record), expires_at, accessed_at)
+            tail += len(record)
+        self._write_header(tail, len(kept), len(kept))
+        metrics.track_shared_cache_compaction(len(entries) - len(kept))
+        logger.debug(f"Compacted shared cache: kept {len(kept)} of {len(entries)} live entries")
+
+    def __len__(self) -> int:
+        with self._lock(fcntl.LOCK_SH):
+            return self._header()[1]
@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import gzip
+import json
+import time
+import zlib
+from collections.abc import AsyncIterator, Iterable
+from typing import Any
+
+from app.adaptive_ttl import AdaptiveTTL
+from app.cache import CACHE_KEY_VERSION, RedisCache
+from app.cache_tags import CacheTags
+from app.exceptions import CacheError
+from app.hotkeys import HotKeyTracker
+
+SNAPSHOT_VERSION = 1
+
+
+async def iter_snapshot(
+    cache: RedisCache,
+    hotkeys: HotKeyTracker | None = None,
+    tags: CacheTags | None = None,
+    pattern: str = f"bgpq4:v{CACHE_KEY_VERSION}:*",
+    batch_size: int = 500,
+) -> AsyncIterator[str]:
+    """Yield the snapshot of all cached results as JSON lines."""
+    yield json.dumps({"version": SNAPSHOT_VERSION, "created_at": time.time()}) + "\n"
+    popularity = await hotkeys.counts() if hotkeys is not None else {}
+
+    async def dump(keys: list[str]) -> AsyncIterator[str]:
+        entries = await cache.dump_many(keys)
+        states = await cache.get_many([AdaptiveTTL.key(key) for key in keys])
+        queries = await tags.queries(keys) if tags is not None else [None] * len(keys)
+        for key, (serialized, ttl), state, query in zip(
+            keys, entries, states, queries, strict=True
+        ):
+            # Expired since the scan, or without expiry (not written by us)
+            if serialized is None or ttl <= 0:
+                continue
+            entry = {
+                "key": key,
+                "value": json.loads(serialized),
+                "ttl": ttl,
+                "ttl_state": state,
+                "hits": popularity.get(key, 0),
+            }
+            if query is not None:
+                entry["query"] = query
+            yield json.dumps(entry, separators=(",", ":")) + "\n"
+
+    batch: list[str] = []
+    async for key in cache.scan_keys(pattern, count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            async for line in dump(batch):
+                yield line
+            batch = []
+    if batch:
+        async for line in dump(batch):
+            yield line
+
+
+async def gzip_stream(lines: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """Compress a stream of lines into a gzip stream."""
+    compressor = zlib.compressobj(wbits=31)
+    async for line in lines:
+        chunk = compressor.compress(line.encode())
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+async def gunzip_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a gzip stream back into lines."""
+    decompressor = zlib.decompressobj(wbits=31)
+    buffer = b""
+    async for chunk in chunks:
+        buffer += decompressor.decompress(chunk)
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode()
+    buffer += decompressor.flush()
+    if buffer:
+        yield buffer.decode()
+
+
+async def _iterate(lines: Iterable[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line
+
+
+async def restore_snapshot(
+    cache: RedisCache,
+    lines: AsyncIterator[str],
+    min_hits: int = 0,
+    max_age: int | None = None,
+    state_ttl: int = 604800,
+    batch_size: int = 500,
+    tags: CacheTags | None = None,
+) -> dict[str, int]:
+    """Load a snapshot into Redis in pipelined batches.
+
+    Remaining TTLs are reduced by the snapshot's age. Entries requested
+    fewer than ``min_hits`` times, or older than ``max_age`` seconds (when
+    their original TTL is known), are skipped. Keys already in Redis are
+    left alone, so a restore never overwrites fresher results. Entries are
+    tagged again with ``tags`` where the snapshot has their query.
+
+    Raises CacheError when Redis cannot take the writes: a restore into the
+    local fallback alone would be lost on restart.
+    """
+    header = None
+    restored = skipped = 0
+    batch: list[tuple[str, str, int]] = []
+    tagged: list[tuple[str, dict[str, Any]]] = []
+
+    async def flush():
+        nonlocal batch, tagged
+        if batch:
+            await cache.write_many(batch, nx=True, fallback=False)
+            if tags is not None:
+                await asyncio.gather(*(tags.restore(key, spec) for key, spec in tagged))
+            batch, tagged = [], []
+
+    async for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if header is None:
+            if record.get("version") != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported snapshot version {record.get('version')}")
+            header = record
+            elapsed = max(0, int(time.time() - header["created_at"]))
+            continue
+
+        ttl = record["ttl"] - elapsed
+        state = record.get("ttl_state")
+        age = state["ttl"] - ttl if state else None
+        if (
+            ttl < 1
+            or record.get("hits", 0) < min_hits
+            or (max_age is not None and age is not None and age > max_age)
+        ):
+            skipped += 1
+            continue
+
+        batch.append((record["key"], json.dumps(record["value"]), ttl))
+        if state:
+            batch.append((AdaptiveTTL.key(record["key"]), json.dumps(state), state_ttl))
+        if record.get("query"):
+            tagged.append((record["key"], record["query"]))
+        restored += 1
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+
+    if header is None:
+        raise ValueError("Empty snapshot")
+    return {"restored": restored, "skipped": skipped}
+
+
+async def export_file(
+    cache: RedisCache,
+    path: str,
+    hotkeys: HotKeyTracker | None = None,
+    tags: CacheTags | None = None,
+) -> int:
+    """Write a snapshot file; returns the number of entries."""
+    count = -1
+    with gzip.open(path, "wt") as f:
+        async for line in iter_snapshot(cache, hotkeys, tags):
+            f.write(line)
+            count += 1
+    return count
+
+
+async def restore_file(cache: RedisCache, path: str, **options: Any) -> dict[str, int]:
+    """Load a snapshot file."""
+    with gzip.open(path, "rt") as f:
+        return await restore_snapshot(cache, _iterate(f), **options)
+
+
+def main():
+    from app.api.dependencies import cache_topology, get_cache_tags, get_hot_key_tracker
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Export or import a cache snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="dump cached results to a file")
+    export_parser.add_argument("path")
+    import_parser = commands.add_parser("import", help="restore cached results from a file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--min-hits", type=int, default=0)
+    import_parser.add_argument("--max-age", type=int, default=None)
+    args = parser.parse_args()
+
+    async def run():
+        cache = RedisCache(**cache_topology())
+        try:
+            if args.command == "export":
+                count = await export_file(
+                    cache, args.path, get_hot_key_tracker(cache), get_cache_tags(cache)
+                )
+                print(f"Exported {count} entries to {args.path}")
+            else:
+                result = await restore_file(
+                    cache,
+                    args.path,
+                    min_hits=args.min_hits,
+                    max_age=args.max_age,
+                    state_ttl=settings.cache_ttl_state_ttl,
+                    tags=get_cache_tags(cache),
+                )
+                print(f"Restored {result['restored']} entries, skipped {result['skipped']}")
+        except CacheError as e:
+            raise SystemExit(f"Cache unavailable: {e}")
+        finally:
+            await cache.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,161 @@
+import asyncio
+import contextlib
 import logging
 import time
+from collections.abc import AsyncIterator, Coroutine
 from typing import Any
 
+from app.adaptive_ttl import AdaptiveTTL
+from app.api.dependencies import (
+    cache_topology,
+    get_circuit_breakers,
+    get_hedge_policy,
+    get_mirror_pool,
+    get_missing_filter,
+    get_retry_budget,
+)
 from app.bgpq4 import BGPq4Client
 from app.cache import RedisCache
+from app.cache_tags import CacheTags
 from app.config import settings
-from app.exceptions import BGPq4Error
+from app.exceptions import BGPq4Error, BGPq4PermanentError, CacheError
+from app.hotkeys import HotKeyTracker
+from app.job_events import JobEvents
+from app.job_store import JobStore
+from app.latency import LatencyTracker
+from app.metrics import metrics
 from app.models.job import JobStatus
+from app.models.query import CanonicalQuery
+from app.negative_cache import NegativeCache
+from app.tasks.runtime import current_runtime
 
 logger = logging.getLogger("fastbgpq4")
 
 
+def new_result_cache() -> RedisCache:
+    return RedisCache(**cache_topology())
+
+
+def new_bgpq4_client() -> BGPq4Client:
+    return BGPq4Client(
+        binary_path=settings.bgpq4_binary,
+        default_sources=settings.irr_sources,
+        max_retries=settings.max_retries,
+        retry_backoff=settings.retry_backoff_factor,
+        retry_budget=get_retry_budget(),
+        breakers=get_circuit_breakers(),
+        host=settings.irr_host,
+        hedge=get_hedge_policy(),
+        mirrors=get_mirror_pool(),
+    )
+
+
+@contextlib.asynccontextmanager
+async def _clients() -> AsyncIterator[tuple[RedisCache, BGPq4Client]]:
+    """The worker runtime's shared clients, or clients for this call alone."""
+    runtime = current_runtime()
+    if runtime is not None and runtime.started:
+        yield runtime.cache, runtime.client
+        return
+    cache = new_result_cache()
+    try:
+        yield cache, new_bgpq4_client()
+    finally:
+        await cache.close()
+
+
 async def execute_bgpq4_query(
-    job_id: str,
+    job_id: str | None,
     target: str,
     sources: list[str] | None,
     format: str,
     aggregate: bool,
     min_masklen: int | None,
     max_masklen: int | None,
-    cache_ttl: int,
+    cache_ttl: int | None,
+    resource: str | None = None,
 ) -> dict[str, Any]:
-    """Execute bgpq4 query as background task."""
+    """Execute bgpq4 query as background task.
+
+    Without ``cache_ttl`` the result is cached with a churn-adaptive TTL.
+    The result itself is only cached: the job record and the returned
+    summary point at its cache key. Jobs without ``job_id`` are not recorded.
+
+    Recorded jobs can be cancelled: one cancelled while queued is skipped,
+    and one cancelled while running has its bgpq4 process killed.
+    """
     start_time = time.time()
+    async with _clients() as (cache, client):
+        jobs = JobStore(cache, ttl=settings.job_result_ttl, events=JobEvents(cache))
+        run = _execute(
+            cache,
+            client,
+            jobs,
+            job_id,
+            start_time,
+            target,
+            sources,
+            format,
+            aggregate,
+            min_masklen,
+            max_masklen,
+            cache_ttl,
+            resource,
+        )
+        if job_id is None:
+            return await run
+
+        if await _is_cancelled(jobs, job_id):
+            run.close()
+            return await _cancelled(cache, jobs, job_id, resource, target, start_time, "queued")
+
+        await jobs.start(job_id)
+        result = await _unless_cancelled(run, jobs, job_id)
+        if result is None:
+            return await _cancelled(cache, jobs, job_id, resource, target, start_time, "running")
+        return result
 
+
+def _latency_tracker(cache: RedisCache) -> LatencyTracker:
+    return LatencyTracker(
+        cache,
+        alpha=settings.latency_ewma_alpha,
+        min_samples=settings.latency_min_samples,
+        stats_ttl=settings.latency_stats_ttl,
+    )
+
+
+async def _execute(
+    cache: RedisCache,
+    client: BGPq4Client,
+    jobs: JobStore,
+    job_id: str | None,
+    start_time: float,
+    target: str,
+    sources: list[str] | None,
+    format: str,
+    aggregate: bool,
+    min_masklen: int | None,
+    max_masklen: int | None,
+    cache_ttl: int | None,
+    resource: str | None,
+) -> dict[str, Any]:
+    """Run the query and cache its result; failures are recorded, not raised."""
     try:
-        # Initialize clients
-        client = BGPq4Client(
-            binary_path=settings.bgpq4_binary,
+        query = CanonicalQuery.normalize(
+            target,
+            sources,
+            aggregate=aggregate,
+            min_masklen=min_masklen,
+            max_masklen=max_masklen,
+            format=format,
             default_sources=settings.irr_sources,
-            max_retries=settings.max_retries,
-            retry_backoff=settings.retry_backoff_factor,
         )
-
-        cache = RedisCache(settings.redis_url)
+        target, sources, format = query.target, list(query.sources), query.format
+        cache_key = cache.generate_key(query)
 
         # Execute query
+        execution_start = time.time()
         raw_output = await client.execute_with_retry(
             target=target,
             sources=sources,
@@ -45,6 +165,9 @@ async def execute_bgpq4_query(
             max_masklen=max_masklen,
             timeout_seconds=settings.max_execution_time_ms / 1000,
         )
+        if resource is not None:
+            duration_ms = (time.time() - execution_start) * 1000
+            await _latency_tracker(cache).record(resource, target, duration_ms)
 
         # Parse output
         if format == "json":
@@ -53,42 +176,161 @@ async def execute_bgpq4_query(
             data = {"output": raw_output}
 
         # Cache result
-        cache_key = cache.generate_key(
-            target=target,
-            sources=sources,
-            aggregate=aggregate,
-            min_masklen=min_masklen,
-            max_masklen=max_masklen,
-            format=format,
+        ttls = AdaptiveTTL(
+            cache,
+            default_ttl=settings.default_cache_ttl,
+            min_ttl=settings.min_cache_ttl,
+            max_ttl=settings.max_cache_ttl,
+            growth=settings.cache_ttl_growth,
+            shrink=settings.cache_ttl_shrink,
+            state_ttl=settings.cache_ttl_state_ttl,
+            enabled=settings.adaptive_cache_ttl_enabled,
         )
-        await cache.set(cache_key, data, cache_ttl)
-        await cache.close()
+        ttl = await ttls.resolve(cache_key, data, cache_ttl)
+        await cache.set(cache_key, data, ttl, stale_ttl=settings.stale_cache_ttl)
+        await CacheTags(
+            cache,
+            ttl=max(settings.max_cache_ttl, settings.stale_cache_ttl),
+            enabled=settings.cache_tags_enabled,
+        ).record(cache_key, query, resource)
 
         execution_time_ms = int((time.time() - start_time) * 1000)
+        if job_id is not None:
+            await jobs.complete(job_id, cache_key, execution_time_ms)
 
         return {
             "status": JobStatus.COMPLETED,
             "job_id": job_id,
-            "data": data,
+            "result_key": cache_key,
+            "cache_ttl": ttl,
             "execution_time_ms": execution_time_ms,
         }
 
     except BGPq4Error as e:
         logger.error(f"BGPq4 error in job {job_id}: {e}")
-        execution_time_ms = int((time.time() - start_time) * 1000)
-        return {
-            "status": JobStatus.FAILED,
-            "job_id": job_id,
-            "error": str(e),
-            "execution_time_ms": execution_time_ms,
-        }
+        if isinstance(e, BGPq4PermanentError):
+            # Into the shared filter too, for the API to find the failure
+            await NegativeCache(
+                cache, ttl=settings.negative_cache_ttl, bloom=get_missing_filter()
+            ).record(cache_key, e)
+        return await _failed(jobs, job_id, str(e), start_time)
 
     except Exception as e:
         logger.exception(f"Unexpected error in job {job_id}: {e}")
-        execution_time_ms = int((time.time() - start_time) * 1000)
-        return {
-            "status": JobStatus.FAILED,
-            "job_id": job_id,
-            "error": f"Internal error: {str(e)}",
-            "execution_time_ms": execution_time_ms,
-        }
+        return await _failed(jobs, job_id, f"Internal error: {str(e)}", start_time)
+
+
+async def _is_cancelled(jobs: JobStore, job_id: str) -> bool:
+    try:
+        job = await jobs.get(job_id)
+    except CacheError as e:
+        logger.warning(f"Failed to read job {job_id}: {e}")
+        return False
+    return job is not None and "cancelled_at" in job
+
+
+async def _unless_cancelled(
+    run: Coroutine[Any, Any, dict[str, Any]], jobs: JobStore, job_id: str
+) -> dict[str, Any] | None:
+    """Await a job's run, cancelling it if the job is; None once cancelled."""
+
+    async def cancellation() -> None:
+        while True:
+            await asyncio.sleep(settings.job_cancel_poll_seconds)
+            if await _is_cancelled(jobs, job_id):
+                return
+
+    task = asyncio.ensure_future(run)
+    watcher = asyncio.ensure_future(cancellation())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            # Cancellation reaches the bgpq4 run, which kills its process
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+    return None if task.cancelled() else task.result()
+
+
+async def _cancelled(
+    cache: RedisCache,
+    jobs: JobStore,
+    job_id: str,
+    resource: str | None,
+    target: str,
+    start_time: float,
+    stage: str,
+) -> dict[str, Any]:
+    elapsed = time.time() - start_time
+    await jobs.record_cancelled(job_id, int(elapsed * 1000))
+    # Worker time given back, as far as the latency history can tell
+    predicted_ms = None
+    if resource is not None:
+        predicted_ms = await _latency_tracker(cache).predict(resource, target.strip().upper())
+    reclaimed = max(predicted_ms / 1000 - elapsed, 0.0) if predicted_ms is not None else 0.0
+    metrics.track_job_cancelled(stage, reclaimed)
+    logger.info(f"Job {job_id} cancelled while {stage}")
+    return {
+        "status": JobStatus.CANCELLED,
+        "job_id": job_id,
+        "execution_time_ms": int(elapsed * 1000),
+    }
+
+
+async def _failed(
+    jobs: JobStore, job_id: str | None, error: str, start_time: float
+) -> dict[str, Any]:
+    execution_time_ms = int((time.time() - start_time) * 1000)
+    if job_id is not None:
+        await jobs.fail(job_id, error, execution_time_ms)
+    return {
+        "status": JobStatus.FAILED,
+        "job_id": job_id,
+        "error": error,
+        "execution_time_ms": execution_time_ms,
+    }
+
+
+async def refresh_hot_keys() -> dict[str, int]:
+    """Re-run the hottest queries shortly before their cache entries expire.
+
+    Runs on a schedule. Each refresh goes through ``execute_bgpq4_query``
+    without a job record, so nobody polls or cancels it, at most
+    ``hot_key_refresh_concurrency`` at a time.
+    """
+    async with _clients() as (cache, _):
+        tracker = HotKeyTracker(
+            cache,
+            top_k=settings.hot_key_top_k,
+            window_seconds=settings.hot_key_window_seconds,
+            min_hits=settings.hot_key_min_hits,
+        )
+        try:
+            hottest = await tracker.hottest() if settings.hot_key_top_k > 0 else []
+            ttls = await cache.ttl_many([key for key, _, _ in hottest])
+        except CacheError as e:
+            logger.warning(f"Failed to read hot keys: {e}")
+            return {"hot": 0, "due": 0, "refreshed": 0}
+
+        # Only entries about to expire; missing ones are refilled by the next request
+        due = [
+            (key, query)
+            for (key, _, query), ttl in zip(hottest, ttls, strict=True)
+            if 0 <= ttl <= settings.hot_key_refresh_ahead_seconds
+        ]
+        semaphore = asyncio.Semaphore(settings.hot_key_refresh_concurrency)
+
+        async def refresh(cache_key: str, query: dict[str, Any]) -> bool:
+            async with semaphore:
+                result = await execute_bgpq4_query(job_id=None, **query)
+            if result["status"] != JobStatus.COMPLETED:
+                metrics.track_hot_key_refresh("failed")
+                return False
+            await tracker.mark_refreshed(cache_key, result["cache_ttl"])
+            metrics.track_hot_key_refresh("refreshed")
+            return True
+
+        results = await asyncio.gather(*(refresh(key, query) for key, query in due))
+    return {"hot": len(hottest), "due": len(due), "refreshed": sum(results)}
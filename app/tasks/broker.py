@@ -1,14 +1,149 @@
-from taskiq import InMemoryBroker
+import time
+from collections.abc import AsyncGenerator
+from logging import getLogger
+
+from redis.asyncio import Redis
+from taskiq import InMemoryBroker, TaskiqMessage, TaskiqMiddleware
+from taskiq.message import BrokerMessage
 from taskiq_redis import ListQueueBroker, RedisAsyncResultBackend
 
+from app.metrics import metrics
+
+logger = getLogger("fastbgpq4")
+
+# Job lanes, highest priority first
+LANES = ("interactive", "bulk")
+DEFAULT_LANE = LANES[0]
+
+
+class PriorityLaneMiddleware(TaskiqMiddleware):
+    """Moves a job's ``priority`` kwarg into its labels and times lane waits.
+
+    Client side, the lane and enqueue time become labels the broker routes
+    on. Worker side, the time a job spent queued is recorded per lane.
+    """
+
+    def pre_send(self, message: TaskiqMessage) -> TaskiqMessage:
+        # Scheduled tasks carry their lane as a task label instead
+        lane = message.kwargs.pop("priority", None) or message.labels.get("priority")
+        message.labels["priority"] = lane if lane in LANES else DEFAULT_LANE
+        message.labels["enqueued_at"] = time.time()
+        return message
+
+    def pre_execute(self, message: TaskiqMessage) -> TaskiqMessage:
+        # Jobs kicked without the client hook still carry the kwarg
+        message.kwargs.pop("priority", None)
+        enqueued_at = message.labels.get("enqueued_at")
+        if enqueued_at is not None:
+            metrics.track_lane_wait(
+                message.labels.get("priority", DEFAULT_LANE), time.time() - float(enqueued_at)
+            )
+        return message
+
+
+class PriorityListQueueBroker(ListQueueBroker):
+    """List queue broker with one Redis list per priority lane.
+
+    Workers consume lanes by smooth weighted round robin, so with weights
+    ``{"interactive": 8, "bulk": 1}`` bulk jobs get one slot in nine while
+    interactive jobs are queued, and all of them when nothing else is.
+    """
 
-def get_broker(redis_url: str) -> ListQueueBroker | InMemoryBroker:
-    """Get Taskiq broker instance."""
+    def __init__(self, url: str, lane_weights: dict[str, int] | None = None, **kwargs):
+        super().__init__(url, **kwargs)
+        weights = lane_weights or {}
+        self.lane_weights = {lane: max(1, int(weights.get(lane, 1))) for lane in LANES}
+        self._credits = dict.fromkeys(LANES, 0)
+
+    def lane_key(self, lane: str) -> str:
+        return f"{self.queue_name}:{lane}"
+
+    def _lane_order(self) -> list[str]:
+        """Lanes to try next: the weighted pick first, then by priority."""
+        total = sum(self.lane_weights.values())
+        for lane, weight in self.lane_weights.items():
+            self._credits[lane] += weight
+        picked = max(LANES, key=lambda lane: self._credits[lane])
+        self._credits[picked] -= total
+        return [picked] + [lane for lane in LANES if lane != picked]
+
+    async def kick(self, message: BrokerMessage) -> None:
+        """Push a message onto its lane's list."""
+        lane = message.labels.get("priority")
+        if lane not in LANES:
+            lane = DEFAULT_LANE
+        async with Redis(connection_pool=self.connection_pool) as redis_conn:
+            depth = await redis_conn.lpush(self.lane_key(lane), message.message)
+        metrics.track_lane_depth(lane, depth)
+
+    async def listen(self) -> AsyncGenerator[bytes, None]:
+        """Yield messages from the lanes in weighted order.
+
+        Once every lane is empty, messages left in the single list queued
+        to before lanes existed are drained as well.
+        """
+        # BRPOP takes the first non-empty list, so the legacy one comes last
+        keys = [self.lane_key(lane) for lane in LANES] + [self.queue_name]
+        while True:
+            try:
+                async with Redis(connection_pool=self.connection_pool) as redis_conn:
+                    message = None
+                    for lane in self._lane_order():
+                        message = await redis_conn.rpop(self.lane_key(lane))
+                        if message is not None:
+                            break
+                    if message is None:
+                        # All lanes empty: block until any of them gets a job
+                        result = await redis_conn.brpop(keys, timeout=1)
+                        if result is None:
+                            continue
+                        key, message = result
+                        index = keys.index(key.decode() if isinstance(key, bytes) else key)
+                        lane = LANES[index] if index < len(LANES) else None
+                    if lane is not None:
+                        # Sampled on both ends, so the gauge also falls as lanes drain
+                        depth = await redis_conn.llen(self.lane_key(lane))
+                if lane is not None:
+                    metrics.track_lane_depth(lane, depth)
+                yield message
+            except ConnectionError as exc:
+                logger.warning("Redis connection error: %s", exc)
+                continue
+
+
+def get_broker(
+    redis_url: str,
+    lane_weights: dict[str, int] | None = None,
+    refresh_schedule: str | None = None,
+    result_ttl: int | None = None,
+) -> ListQueueBroker | InMemoryBroker:
+    """Get Taskiq broker instance with the bgpq4 tasks registered.
+
+    Task results expire after ``result_ttl`` seconds; job status is served
+    from the job store, so they are only kept for taskiq's own use.
+
+    With ``refresh_schedule`` (a cron expression) the hot key refresh is
+    scheduled on the bulk lane for ``taskiq scheduler``.
+    """
     if redis_url.startswith("redis://"):
         # Production: Redis broker
-        result_backend = RedisAsyncResultBackend(redis_url)
-        broker = ListQueueBroker(redis_url).with_result_backend(result_backend)
-        return broker
+        result_backend = RedisAsyncResultBackend(redis_url, result_ex_time=result_ttl)
+        broker = PriorityListQueueBroker(redis_url, lane_weights=lane_weights).with_result_backend(
+            result_backend
+        )
     else:
         # Testing: In-memory broker
-        return InMemoryBroker()
+        broker = InMemoryBroker()
+    broker.add_middlewares(PriorityLaneMiddleware())
+
+    # Imported here: the task module depends on the API dependencies
+    from app.tasks.bgpq4_tasks import execute_bgpq4_query, refresh_hot_keys
+
+    broker.execute_bgpq4_query = broker.register_task(
+        execute_bgpq4_query, task_name="execute_bgpq4_query"
+    )
+    schedule = {"schedule": [{"cron": refresh_schedule}]} if refresh_schedule else {}
+    broker.refresh_hot_keys = broker.register_task(
+        refresh_hot_keys, task_name="refresh_hot_keys", priority="bulk", **schedule
+    )
+    return broker
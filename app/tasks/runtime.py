@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import time
+
+from prometheus_client import start_http_server
+from taskiq import AsyncBroker, TaskiqEvents, TaskiqMessage, TaskiqMiddleware, TaskiqResult
+
+from app.bgpq4 import BGPq4Client
+from app.cache import RedisCache
+from app.metrics import metrics
+
+logger = logging.getLogger("fastbgpq4")
+
+
+class WorkerRuntime:
+    """Clients shared by every job a worker process runs.
+
+    Started by the worker's startup hook, it holds one result cache, so one
+    Redis connection pool, and one bgpq4 client for the life of the
+    process instead of building them per job. On shutdown it drains: it
+    waits up to ``drain_timeout`` seconds for running jobs before closing
+    the clients, which flushes any queued cache writes.
+
+    With ``metrics_port`` each process serves its metrics on that port
+    plus its index among the worker processes, so processes forked by one
+    ``taskiq worker`` never compete for a port. The index also labels the
+    process's queue latency as ``worker-<index>``, which unlike its name
+    does not change when the process restarts.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 10,
+        drain_timeout: float = 30.0,
+        metrics_port: int = 0,
+        name: str = "",
+    ):
+        self.concurrency = concurrency
+        self.drain_timeout = drain_timeout
+        self.metrics_port = metrics_port
+        self.name = name
+        self.index = 0
+        self.cache: RedisCache | None = None
+        self.client: BGPq4Client | None = None
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def started(self) -> bool:
+        return self.cache is not None
+
+    async def start(self) -> None:
+        # Imported here: the task module imports this one
+        from app.tasks.bgpq4_tasks import new_bgpq4_client, new_result_cache
+
+        # Named on start: worker processes are forked after the runtime is built
+        self.name = self.name or f"{socket.gethostname()}:{os.getpid()}"
+        self.index = _process_index()
+        self.cache = new_result_cache()
+        self.client = new_bgpq4_client()
+        metrics.track_worker_capacity(self.name, self.concurrency)
+        if self.metrics_port:
+            port = self.metrics_port + self.index
+            try:
+                start_http_server(port)
+            except OSError as e:
+                logger.warning(f"Failed to serve worker metrics on port {port}: {e}")
+        _set_current(self)
+        logger.info(f"Worker {self.name} started, running up to {self.concurrency} jobs")
+
+    async def stop(self) -> None:
+        if self.in_flight:
+            logger.info(f"Worker {self.name} draining {self.in_flight} running jobs")
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.drain_timeout)
+            except TimeoutError:
+                logger.warning(f"Worker {self.name} stopped with {self.in_flight} jobs running")
+        _set_current(None)
+        if self.cache is not None:
+            await self.cache.close()
+        self.cache = self.client = None
+
+    def job_started(self) -> None:
+        self.in_flight += 1
+        self._idle.clear()
+        metrics.track_worker_in_flight(self.name, self.in_flight)
+
+    def job_finished(self) -> None:
+        self.in_flight = max(self.in_flight - 1, 0)
+        if not self.in_flight:
+            self._idle.set()
+        metrics.track_worker_in_flight(self.name, self.in_flight)
+
+    def install(self, broker: AsyncBroker) -> None:
+        """Hook the runtime into a broker's worker startup and shutdown."""
+        broker.on_event(TaskiqEvents.WORKER_STARTUP)(lambda state: self.start())
+        broker.on_event(TaskiqEvents.WORKER_SHUTDOWN)(lambda state: self.stop())
+        broker.add_middlewares(WorkerRuntimeMiddleware(self))
+
+
+class WorkerRuntimeMiddleware(TaskiqMiddleware):
+    """Tracks a worker's running jobs, throughput and queue latency."""
+
+    def __init__(self, runtime: WorkerRuntime):
+        super().__init__()
+        self.runtime = runtime
+
+    def pre_execute(self, message: TaskiqMessage) -> TaskiqMessage:
+        self.runtime.job_started()
+        enqueued_at = message.labels.get("enqueued_at")
+        if enqueued_at is not None:
+            metrics.track_worker_queue_latency(
+                f"worker-{self.runtime.index}", time.time() - float(enqueued_at)
+            )
+        return message
+
+    def post_execute(self, message: TaskiqMessage, result: TaskiqResult) -> None:
+        self.runtime.job_finished()
+        outcome = "error" if result.is_err else "ok"
+        metrics.track_worker_task(self.runtime.name, message.task_name, outcome)
+
+
+def _process_index() -> int:
+    """Index of this process among taskiq's worker processes, 0 outside them."""
+    # taskiq names the processes it forks, and their restarts, worker-<index>
+    name = multiprocessing.current_process().name
+    prefix, _, index = name.rpartition("-")
+    return int(index) if prefix == "worker" and index.isdigit() else 0
+
+
+_current: WorkerRuntime | None = None
+
+
+def _set_current(runtime: WorkerRuntime | None) -> None:
+    global _current
+    _current = runtime
+
+
+def current_runtime() -> WorkerRuntime | None:
+    """The started runtime of this worker process; None outside workers."""
+    return _current
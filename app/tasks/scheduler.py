@@ -0,0 +1,7 @@
+from taskiq import TaskiqScheduler
+from taskiq.schedule_sources import LabelScheduleSource
+
+from app.tasks.worker import broker
+
+# Entry point for the scheduler: taskiq scheduler app.tasks.scheduler:scheduler
+scheduler = TaskiqScheduler(broker, sources=[LabelScheduleSource(broker)])
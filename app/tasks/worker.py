@@ -0,0 +1,45 @@
+import sys
+
+from taskiq.cli.worker.args import WorkerArgs
+from taskiq.cli.worker.run import run_worker
+
+from app.config import settings
+from app.tasks.broker import get_broker
+from app.tasks.runtime import WorkerRuntime
+
+# Entry point for workers: python -m app.tasks.worker, which applies the
+# WORKER_* settings, or taskiq worker app.tasks.worker:broker
+broker = get_broker(
+    settings.redis_url,
+    lane_weights=settings.job_lane_weights,
+    result_ttl=settings.job_result_ttl,
+    refresh_schedule=settings.hot_key_refresh_schedule if settings.hot_key_top_k > 0 else None,
+)
+runtime = WorkerRuntime(
+    concurrency=settings.worker_concurrency,
+    drain_timeout=settings.worker_drain_timeout,
+    metrics_port=settings.worker_metrics_port,
+)
+runtime.install(broker)
+
+
+def worker_args() -> WorkerArgs:
+    """Worker options from the settings."""
+    return WorkerArgs(
+        broker="app.tasks.worker:broker",
+        modules=[],
+        workers=settings.worker_processes,
+        max_async_tasks=settings.worker_concurrency,
+        max_prefetch=settings.worker_prefetch,
+        # Running jobs get the drain timeout, the runtime's shutdown a little more
+        wait_tasks_timeout=settings.worker_drain_timeout,
+        shutdown_timeout=settings.worker_drain_timeout + 5,
+    )
+
+
+def main() -> int:
+    return run_worker(worker_args()) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
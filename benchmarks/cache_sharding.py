@@ -0,0 +1,121 @@
+"""Throughput benchmark for a cache consistently hashed over Redis nodes.
+
+Runs concurrent batched reads and writes through ``RedisCache`` with 1..N
+shard nodes and reports operations per second at each size. Pass real
+nodes with ``--nodes``; without them each node is simulated in process as
+a single-threaded server with a fixed per-command service time, which is
+what bounds one Redis.
+
+    python -m benchmarks.cache_sharding --nodes redis://a:6379/0,redis://b:6379/0
+    python -m benchmarks.cache_sharding --simulated 4 --service-us 20
+"""
+
+import argparse
+import asyncio
+import contextlib
+import random
+import time
+from unittest.mock import patch
+
+from app.cache import RedisCache
+
+VALUE = '{"prefixes": ["192.0.2.0/24", "198.51.100.0/24", "203.0.113.0/24"]}'
+
+
+class SimulatedNode:
+    """One Redis: commands are served one at a time."""
+
+    def __init__(self, service_seconds: float):
+        self.service_seconds = service_seconds
+        self.data: dict[str, bytes] = {}
+        self._lock = asyncio.Lock()
+
+    async def _serve(self, commands: int):
+        async with self._lock:
+            await asyncio.sleep(self.service_seconds * commands)
+
+    async def mget(self, keys):
+        await self._serve(len(keys))
+        return [self.data.get(key) for key in keys]
+
+    async def get(self, key):
+        await self._serve(1)
+        return self.data.get(key)
+
+    def pipeline(self, transaction=False):
+        return SimulatedPipeline(self)
+
+    async def close(self):
+        pass
+
+
+class SimulatedPipeline:
+    def __init__(self, node: SimulatedNode):
+        self.node = node
+        self.writes: list[tuple[str, str]] = []
+
+    def setex(self, key, ttl, value):
+        self.writes.append((key, value))
+
+    async def execute(self):
+        await self.node._serve(len(self.writes))
+        for key, value in self.writes:
+            self.node.data[key] = value.encode()
+        return [True] * len(self.writes)
+
+
+async def run(cache: RedisCache, keys: list[str], seconds: float, clients: int, batch: int):
+    rng = random.Random(0)
+    operations = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        nonlocal operations
+        while time.perf_counter() < deadline:
+            sample = rng.sample(keys, batch)
+            if rng.random() < 0.2:
+                await cache.write_many([(key, VALUE, 300) for key in sample])
+            else:
+                await cache.get_many(sample)
+            operations += batch
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return operations / (time.perf_counter() - started)
+
+
+async def benchmark(args):
+    keys = [f"bgpq4:AS{i}:default:False:none:none:json" for i in range(args.keys)]
+    if args.nodes:
+        nodes = args.nodes.split(",")
+        clients = contextlib.nullcontext()
+    else:
+        nodes = [f"sim://{i}" for i in range(args.simulated)]
+        simulated = {node: SimulatedNode(args.service_us / 1_000_000) for node in nodes}
+        clients = patch("app.cache.redis.from_url", side_effect=lambda url, **_: simulated[url])
+
+    baseline = None
+    with clients:
+        for count in range(1, len(nodes) + 1):
+            cache = RedisCache(nodes[0], shard_urls=nodes[:count])
+            await cache.write_many([(key, VALUE, 300) for key in keys])
+            throughput = await run(cache, keys, args.seconds, args.clients, args.batch)
+            await cache.close()
+            baseline = baseline or throughput
+            print(f"{count} node(s): {throughput:>12,.0f} keys/s  ({throughput / baseline:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", help="comma-separated Redis URLs; simulated when omitted")
+    parser.add_argument("--simulated", type=int, default=4)
+    parser.add_argument("--service-us", type=float, default=20.0)
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Memory and throughput benchmark for the reverse prefix index.
+
+Builds a synthetic full-table-sized index (defaults to roughly the size of
+today's IPv4 and IPv6 DFZ) and measures build time, memory and lookup
+throughput for batch queries. Memory is reported as resident set growth;
+``--tracemalloc`` gives exact Python allocations at the cost of a much slower
+build.
+
+    python -m benchmarks.prefix_index --ipv4 1000000 --ipv6 200000
+"""
+
+import argparse
+import random
+import resource
+import time
+import tracemalloc
+
+from app.prefix_index import PrefixIndex, format_prefix
+
+# Rough prefix-length distribution of the IPv4 and IPv6 DFZ
+LENGTH_WEIGHTS = {
+    4: {24: 60, 23: 8, 22: 12, 21: 4, 20: 4, 19: 3, 18: 2, 17: 1, 16: 4, 15: 1, 14: 1},
+    6: {48: 50, 44: 5, 40: 5, 36: 3, 32: 20, 29: 10, 28: 3, 24: 2, 20: 2},
+}
+
+
+def random_prefixes(version: int, count: int, rng: random.Random) -> list[str]:
+    width = 32 if version == 4 else 128
+    weights = LENGTH_WEIGHTS[version]
+    lengths = rng.choices(list(weights), weights=list(weights.values()), k=count)
+    prefixes = []
+    for length in lengths:
+        network = rng.getrandbits(length) << (width - length)
+        prefixes.append(format_prefix(version, network, length))
+    return prefixes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ipv4", type=int, default=1_000_000)
+    parser.add_argument("--ipv6", type=int, default=200_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tracemalloc", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    routes = random_prefixes(4, args.ipv4, rng) + random_prefixes(6, args.ipv6, rng)
+    origins = [rng.randint(1, 400_000) for _ in routes]
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    index = PrefixIndex()
+    for prefix, origin in zip(routes, origins, strict=True):
+        index.add(prefix, origin=origin)
+    build_seconds = time.perf_counter() - started
+    if args.tracemalloc:
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    else:
+        # ru_maxrss is reported in KiB on Linux
+        memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+
+    print(f"prefixes indexed:   {len(index):,}")
+    print(f"build time:         {build_seconds:.2f}s ({len(routes) / build_seconds:,.0f}/s)")
+    print(f"index memory:       {memory / 2**20:,.1f} MiB ({memory / len(index):.0f} B/prefix)")
+
+    # Query with more-specifics of indexed routes so lookups walk deep paths
+    queries = []
+    for prefix in rng.sample(routes, min(args.lookups, len(routes))):
+        address, length = prefix.split("/")
+        queries.append(f"{address}/{min(int(length) + 4, 32 if '.' in address else 128)}")
+
+    started = time.perf_counter()
+    matched = 0
+    for offset in range(0, len(queries), args.batch):
+        for result in index.lookup_many(queries[offset : offset + args.batch]):
+            matched += bool(result["longest_match"])
+    lookup_seconds = time.perf_counter() - started
+
+    print(f"lookups:            {len(queries):,} in batches of {args.batch:,}")
+    print(f"lookup throughput:  {len(queries) / lookup_seconds:,.0f} prefixes/s")
+    print(f"batch latency:      {lookup_seconds / (len(queries) / args.batch) * 1000:.1f} ms")
+    print(f"matched:            {matched:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import gzip
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.dependencies import get_broker, get_cache, get_prefix_index
+from app.exceptions import CacheError
+from app.main import app
+
+
+def _mock_cache():
+    mock_cache = AsyncMock()
+
+    async def scan_keys(pattern, count=1000):
+        yield "bgpq4:v2:json:abc:AS-A"
+
+    mock_cache.scan_keys = MagicMock(side_effect=scan_keys)
+    mock_cache.dump_many.return_value = [(b'{"count": 0}', 300)]
+    mock_cache.get_many.return_value = [None]
+    mock_cache.hget_many.return_value = [json.dumps({"target": "AS-A", "sources": ["RADB"]})]
+    mock_cache.top_scores.return_value = [[("bgpq4:v2:json:abc:AS-A", 3.0)], []]
+    return mock_cache
+
+
+@pytest.mark.asyncio
+async def test_admin_disabled_without_token():
+    with patch("app.api.dependencies.settings.admin_token", None):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/admin/snapshot")
+            assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_admin_rejects_bad_token():
+    with patch("app.api.dependencies.settings.admin_token", "secret"):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(
+                "/api/v1/admin/snapshot", headers={"X-Admin-Token": "wrong"}
+            )
+            assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_admin_snapshot_export_and_import():
+    mock_cache = _mock_cache()
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    headers = {"X-Admin-Token": "secret"}
+
+    try:
+        with patch("app.api.dependencies.settings.admin_token", "secret"):
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                response = await client.get("/api/v1/admin/snapshot", headers=headers)
+                assert response.status_code == 200
+                assert response.headers["content-type"] == "application/gzip"
+                snapshot = response.content
+                lines = gzip.decompress(snapshot).decode().splitlines()
+                entry = json.loads(lines[1])
+                assert entry["key"] == "bgpq4:v2:json:abc:AS-A"
+                assert entry["hits"] == 3
+                assert entry["query"]["sources"] == ["RADB"]
+
+                response = await client.post(
+                    "/api/v1/admin/snapshot?min_hits=1",
+                    headers=headers,
+                    content=snapshot,
+                )
+                assert response.status_code == 200
+                assert response.json() == {"restored": 1, "skipped": 0}
+                mock_cache.write_many.assert_awaited_once()
+                # Restored entries are tagged again for invalidation
+                _, calls = mock_cache.eval_many.call_args.args
+                assert calls[0][1][0] == "bgpq4:v2:json:abc:AS-A"
+
+                response = await client.post(
+                    "/api/v1/admin/snapshot", headers=headers, content=b"not gzip"
+                )
+                assert response.status_code == 400
+
+                # Never restored into the local fallback alone
+                mock_cache.write_many.side_effect = CacheError("Redis circuit open")
+                response = await client.post(
+                    "/api/v1/admin/snapshot", headers=headers, content=snapshot
+                )
+                assert response.status_code == 503
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_admin_invalidate_refresh_queues_bulk_jobs():
+    mock_cache = AsyncMock()
+
+    async def scan_hash(key, count=1000):
+        if key == "tag:target:AS-A":
+            yield "bgpq4:k", json.dumps({"target": "AS-A", "sources": ["RADB"]})
+
+    mock_cache.scan_hash = MagicMock(side_effect=scan_hash)
+    mock_broker = MagicMock()
+    mock_broker.execute_bgpq4_query.kiq = AsyncMock()
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_broker] = lambda: mock_broker
+    headers = {"X-Admin-Token": "secret"}
+
+    try:
+        with patch("app.api.dependencies.settings.admin_token", "secret"):
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                response = await client.post(
+                    "/api/v1/admin/invalidate",
+                    headers=headers,
+                    json={"targets": ["radb::as-a"], "mode": "refresh"},
+                )
+                assert response.status_code == 200
+                assert response.json() == {"mode": "refresh", "invalidated": 1}
+                kwargs = mock_broker.execute_bgpq4_query.kiq.call_args.kwargs
+                assert kwargs["target"] == "AS-A"
+                assert kwargs["priority"] == "bulk"
+                mock_cache.delete_many.assert_not_called()
+
+                response = await client.post(
+                    "/api/v1/admin/invalidate", headers=headers, json={"targets": ["AS-A"]}
+                )
+                assert response.json() == {"mode": "delete", "invalidated": 1}
+                mock_cache.delete_many.assert_awaited()
+
+                response = await client.post("/api/v1/admin/invalidate", headers=headers, json={})
+                assert response.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_admin_rebuilds_prefix_index():
+    from app.prefix_index import PrefixIndex
+
+    index = PrefixIndex()
+    index.add("192.0.2.0/24", origin=64500)
+    index.built_at = 1700000000.0
+    holder = AsyncMock()
+    holder.get.return_value = index
+    app.dependency_overrides[get_cache] = lambda: AsyncMock()
+    app.dependency_overrides[get_prefix_index] = lambda: holder
+
+    try:
+        with patch("app.api.dependencies.settings.admin_token", "secret"):
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                response = await client.post(
+                    "/api/v1/admin/prefix-index/rebuild", headers={"X-Admin-Token": "secret"}
+                )
+                assert response.status_code == 200
+                assert response.json() == {"index_size": 1, "index_built_at": 1700000000.0}
+                assert holder.get.call_args.kwargs == {"force": True}
+
+                response = await client.post("/api/v1/admin/prefix-index/rebuild")
+                assert response.status_code == 401
+    finally:
+        app.dependency_overrides.clear()
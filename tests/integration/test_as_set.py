@@ -1,9 +1,10 @@
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from httpx import ASGITransport, AsyncClient
 
 from app.api.dependencies import get_bgpq4_client, get_broker, get_cache
+from app.job_store import CREATE_SCRIPT
 from app.main import app
 
 
@@ -12,11 +13,9 @@ async def test_as_set_expand_sync_success():
     # Mock cache
     mock_cache = AsyncMock()
     mock_cache.get.return_value = None
-    mock_cache.generate_key.return_value = "test-cache-key"
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
 
     # Mock bgpq4 client - parse_json_output is NOT async, so use MagicMock for it
-    from unittest.mock import MagicMock
-
     mock_client = AsyncMock()
     mock_client.execute_with_retry.return_value = '{"NN": []}'
     # parse_json_output is synchronous, not async
@@ -45,7 +44,7 @@ async def test_as_set_expand_cache_hit():
 
     mock_cache = AsyncMock()
     mock_cache.get.return_value = cached_data
-    mock_cache.generate_key.return_value = "test-cache-key"
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
 
     app.dependency_overrides[get_cache] = lambda: mock_cache
 
@@ -63,11 +62,9 @@ async def test_as_set_expand_cache_hit():
 @pytest.mark.asyncio
 async def test_as_set_expand_non_json_format():
     """Test non-JSON format returns raw output."""
-    from unittest.mock import MagicMock
-
     mock_cache = AsyncMock()
     mock_cache.get.return_value = None
-    mock_cache.generate_key.return_value = "test-cache-key"
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
 
     mock_client = AsyncMock()
     mock_client.execute_with_retry.return_value = "ip prefix-list test permit 192.0.2.0/24"
@@ -93,8 +90,9 @@ async def test_as_set_expand_non_json_format():
 async def test_as_set_expand_async_timeout():
     # Mock cache
     mock_cache = AsyncMock()
+    mock_cache.eval.return_value = [1, "n1"]
     mock_cache.get.return_value = None
-    mock_cache.generate_key.return_value = "test-cache-key"
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
 
     # Mock bgpq4 client that times out
     mock_client = AsyncMock()
@@ -103,7 +101,6 @@ async def test_as_set_expand_async_timeout():
     # Mock broker
     mock_broker = AsyncMock()
     mock_task = AsyncMock()
-    mock_task.task_id = "test-job-id"
     mock_broker.execute_bgpq4_query.kiq.return_value = mock_task
 
     # Override dependencies
@@ -117,7 +114,563 @@ async def test_as_set_expand_async_timeout():
             assert response.status_code == 202
             data = response.json()
             assert data["status"] == "processing"
-            assert data["job_id"] == "test-job-id"
+            assert data["job_id"] == mock_broker.execute_bgpq4_query.kiq.call_args.kwargs["job_id"]
+            # The job is recorded as pending before it is queued
+            creates = [c.args for c in mock_cache.eval.call_args_list if c.args[0] == CREATE_SCRIPT]
+            digest, nonce = data["job_id"].split(".")
+            assert (creates[0][1], nonce) == ([f"job:{{{digest}}}"], "n1")
+            assert "pending" in creates[0][2]
     finally:
         # Clean up dependency overrides
         app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_async_deduplicated():
+    """Test that an identical query with a job in flight shares that job."""
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = None
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.side_effect = TimeoutError()
+    mock_broker = AsyncMock()
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+    app.dependency_overrides[get_broker] = lambda: mock_broker
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            mock_cache.eval.return_value = [1, "n1"]
+            first = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE")
+            # Another spelling of the same query, while the first job runs
+            mock_cache.eval.return_value = [0, "n1"]
+            second = await client.get("/api/v1/as-set/expand?target=as-hurricane")
+
+            assert first.status_code == second.status_code == 202
+            assert second.json()["job_id"] == first.json()["job_id"]
+            assert second.json()["poll_url"] == first.json()["poll_url"]
+            # Each client cancels with a token of its own
+            assert second.json()["cancel_token"] != first.json()["cancel_token"]
+            mock_broker.execute_bgpq4_query.kiq.assert_awaited_once()
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_async_queue_failure_fails_job():
+    """Test that a job the broker never took is not left pending for dedup."""
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = None
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_cache.eval.return_value = [1, "n1"]
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.side_effect = TimeoutError()
+    mock_broker = AsyncMock()
+    mock_broker.execute_bgpq4_query.kiq.side_effect = ConnectionError("broker down")
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+    app.dependency_overrides[get_broker] = lambda: mock_broker
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE")
+            assert response.status_code == 503
+
+            key, mapping, _ = mock_cache.hset.call_args.args
+            assert key.startswith("job:")
+            assert mapping["status"] == "failed"
+            assert "broker down" in mapping["error"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_rov_annotate():
+    """Test that sync results are annotated with RPKI validation states."""
+    from app.api.dependencies import get_vrp_holder
+    from app.rpki import VRPStore
+
+    store = VRPStore()
+    store.add("192.0.2.0/24", 64500)
+    vrps = AsyncMock()
+    vrps.get.return_value = store
+
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = None
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.return_value = "{}"
+    mock_client.parse_json_output = MagicMock(
+        return_value={"prefixes": ["192.0.2.0/24", "192.0.2.0/25"], "count": 2}
+    )
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+    app.dependency_overrides[get_vrp_holder] = lambda: vrps
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-TEST&rov=annotate")
+            assert response.status_code == 200
+            data = response.json()["data"]
+            assert data["count"] == 2
+            assert data["rov"]["states"] == {"192.0.2.0/24": "unknown", "192.0.2.0/25": "invalid"}
+            # The cache keeps the unvalidated expansion
+            cached = mock_cache.set.call_args[0][1]
+            assert "rov" not in cached
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_rov_not_configured():
+    """Test that ROV without a VRP file returns 503."""
+    from app.api.dependencies import get_vrp_holder
+    from app.rpki import VRPHolder
+
+    app.dependency_overrides[get_cache] = lambda: AsyncMock()
+    app.dependency_overrides[get_vrp_holder] = lambda: VRPHolder(None)
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-TEST&rov=drop")
+            assert response.status_code == 503
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_predicted_slow_goes_async():
+    """Test that a target predicted to be slow skips the sync attempt."""
+    from app.api.dependencies import get_latency_tracker
+
+    mock_cache = AsyncMock()
+    mock_cache.eval.return_value = [1, "n1"]
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_cache.get.return_value = None
+
+    mock_client = AsyncMock()
+
+    mock_broker = AsyncMock()
+    mock_task = AsyncMock()
+    mock_broker.execute_bgpq4_query.kiq.return_value = mock_task
+
+    mock_latency = AsyncMock()
+    mock_latency.predict.return_value = 20000
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+    app.dependency_overrides[get_broker] = lambda: mock_broker
+    app.dependency_overrides[get_latency_tracker] = lambda: mock_latency
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE")
+            assert response.status_code == 202
+            data = response.json()
+            assert data["job_id"] == mock_broker.execute_bgpq4_query.kiq.call_args.kwargs["job_id"]
+            assert data["estimated_time_ms"] == 20000
+            mock_client.execute_with_retry.assert_not_called()
+            assert mock_broker.execute_bgpq4_query.kiq.call_args.kwargs["resource"] == "as_set"
+            assert mock_broker.execute_bgpq4_query.kiq.call_args.kwargs["priority"] == "interactive"
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_records_latency():
+    """Test that sync executions feed the latency statistics."""
+    from app.api.dependencies import get_latency_tracker
+
+    mock_cache = AsyncMock()
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_cache.get.return_value = None
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.return_value = '{"NN": []}'
+    mock_client.parse_json_output = MagicMock(return_value={"prefixes": [], "count": 0})
+
+    mock_latency = AsyncMock()
+    mock_latency.predict.return_value = 200
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+    app.dependency_overrides[get_latency_tracker] = lambda: mock_latency
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE")
+            assert response.status_code == 200
+            mock_latency.record.assert_called_once()
+            assert mock_latency.record.call_args[0][:2] == ("as_set", "AS-HURRICANE")
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_unknown_object_is_negatively_cached():
+    """Test that a permanent bgpq4 failure returns 404 and is remembered."""
+    from app.exceptions import BGPq4PermanentError
+
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = None
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.side_effect = BGPq4PermanentError(
+        message="bgpq4 failed with return code 1",
+        return_code=1,
+        stderr="ERROR: AS-TYPO: no such object",
+    )
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-TYPO")
+            assert response.status_code == 404
+            assert response.json()["detail"] == "ERROR: AS-TYPO: no such object"
+            mock_cache.set.assert_awaited_once()
+            assert mock_cache.set.call_args.args[0] == "negative:test-cache-key"
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_negative_cache_hit():
+    """Test that a cached failure is served without running bgpq4."""
+    failure = {"error": "ERROR: AS-TYPO: no such object", "return_code": 1}
+
+    mock_cache = AsyncMock()
+    mock_cache.get.side_effect = lambda key: failure if key.startswith("negative:") else None
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+
+    mock_client = AsyncMock()
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-TYPO")
+            assert response.status_code == 404
+            assert response.json()["detail"] == failure["error"]
+            mock_client.execute_with_retry.assert_not_called()
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_circuit_open_fails_fast():
+    """Test that an open circuit returns 503 with Retry-After."""
+    from app.exceptions import CircuitOpenError
+
+    mock_cache = AsyncMock()
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_cache.get.return_value = None
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.side_effect = CircuitOpenError("bgpq4:RADB", retry_after=12.3)
+
+    mock_broker = AsyncMock()
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+    app.dependency_overrides[get_broker] = lambda: mock_broker
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE")
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "13"
+            mock_broker.execute_bgpq4_query.kiq.assert_not_called()
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_circuit_open_serves_stale():
+    """Test that an open circuit serves the stale copy when one is kept."""
+    from unittest.mock import patch
+
+    from app.exceptions import CircuitOpenError
+
+    stale_data = {"prefixes": ["192.0.2.0/24"], "count": 1}
+
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = None
+    mock_cache.get_stale.return_value = stale_data
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.side_effect = CircuitOpenError("bgpq4:RADB", retry_after=5.0)
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+
+    try:
+        with patch("app.api.v1.query.settings.stale_cache_ttl", 86400):
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                response = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "stale"
+        assert data["data"] == stale_data
+        mock_cache.get_stale.assert_awaited_once_with("test-cache-key")
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_pool_full_diverts_to_job():
+    """Test that a full execution pool hands the query to the workers."""
+    from app.exceptions import ExecutionPoolFullError
+
+    mock_cache = AsyncMock()
+    mock_cache.eval.return_value = [1, "n1"]
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_cache.get.return_value = None
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.side_effect = ExecutionPoolFullError(retry_after=2.0)
+
+    mock_broker = AsyncMock()
+    mock_task = AsyncMock()
+    mock_broker.execute_bgpq4_query.kiq.return_value = mock_task
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+    app.dependency_overrides[get_broker] = lambda: mock_broker
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE")
+            assert response.status_code == 202
+            job_id = mock_broker.execute_bgpq4_query.kiq.call_args.kwargs["job_id"]
+            assert response.json()["job_id"] == job_id
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_pool_full_rejects():
+    """Test that a full execution pool returns 503 when overflow is rejected."""
+    from unittest.mock import patch
+
+    from app.exceptions import ExecutionPoolFullError
+
+    mock_cache = AsyncMock()
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_cache.get.return_value = None
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.side_effect = ExecutionPoolFullError(retry_after=2.4)
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+
+    try:
+        with patch("app.api.v1.query.settings.execution_pool_overflow", "reject"):
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                response = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "3"
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_bulk_priority_passed_to_job():
+    """Test that the requested lane is passed to the job submission."""
+    mock_cache = AsyncMock()
+    mock_cache.eval.return_value = [1, "n1"]
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_cache.get.return_value = None
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.side_effect = TimeoutError()
+
+    mock_broker = AsyncMock()
+    mock_task = AsyncMock()
+    mock_broker.execute_bgpq4_query.kiq.return_value = mock_task
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+    app.dependency_overrides[get_broker] = lambda: mock_broker
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE&priority=bulk")
+            assert response.status_code == 202
+            assert mock_broker.execute_bgpq4_query.kiq.call_args.kwargs["priority"] == "bulk"
+
+            response = await client.get("/api/v1/as-set/expand?target=AS-HURRICANE&priority=x")
+            assert response.status_code == 422
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_adaptive_ttl():
+    """Test that a result that keeps changing is cached for less time."""
+    mock_cache = AsyncMock()
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_cache.get.side_effect = lambda key: (
+        {"hash": "previous", "ttl": 300} if key == "ttlstate:test-cache-key" else None
+    )
+
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.return_value = '{"NN": []}'
+    mock_client.parse_json_output = MagicMock(return_value={"prefixes": [], "count": 0})
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-VOLATILE")
+            assert response.status_code == 200
+            assert response.json()["cache_ttl"] == 150
+            mock_cache.set.assert_any_call(
+                "test-cache-key", {"prefixes": [], "count": 0}, 150, stale_ttl=0
+            )
+
+            response = await client.get("/api/v1/as-set/expand?target=AS-VOLATILE&cache_ttl=30")
+            assert response.json()["cache_ttl"] == 30
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_canonical_query():
+    from app.cache import RedisCache
+
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = None
+    keys = []
+    real_cache = RedisCache("redis://localhost")
+    mock_cache.generate_key = MagicMock(
+        side_effect=lambda query: keys.append(real_cache.generate_key(query)) or keys[-1]
+    )
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.return_value = '{"NN": []}'
+    mock_client.parse_json_output = MagicMock(return_value={"prefixes": [], "count": 0})
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            for target, sources in [
+                ("as-hurricane", "radb"),
+                ("RADB::AS-HURRICANE", None),
+                ("AS-HURRICANE", "RADB,radb"),
+            ]:
+                params = {"target": target, **({"sources": sources} if sources else {})}
+                response = await client.get("/api/v1/as-set/expand", params=params)
+                assert response.status_code == 200
+            assert len(set(keys)) == 1
+            call = mock_client.execute_with_retry.call_args.kwargs
+            assert (call["target"], call["sources"]) == ("AS-HURRICANE", ["RADB"])
+
+            response = await client.get(
+                "/api/v1/as-set/expand", params={"target": "RADB::AS-X", "sources": "RIPE"}
+            )
+            assert response.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_transient_failure_falls_back_to_job(tmp_path):
+    """Test that a transient failure left once retries stop is handed to a job."""
+    from app.bgpq4 import BGPq4Client
+    from app.budget import RetryBudget
+
+    binary = tmp_path / "bgpq4"
+    binary.write_text("#!/bin/sh\necho 'Connection refused' >&2\nexit 1\n")
+    binary.chmod(0o755)
+    # An empty retry budget stops retries after the first attempt
+    client = BGPq4Client(
+        binary_path=str(binary),
+        default_sources=["RADB"],
+        max_retries=3,
+        retry_backoff=0.01,
+        retry_budget=RetryBudget(rate=0, burst=0),
+    )
+
+    mock_cache = AsyncMock()
+    mock_cache.eval.return_value = [1, "n1"]
+    mock_cache.get.return_value = None
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_broker = AsyncMock()
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: client
+    app.dependency_overrides[get_broker] = lambda: mock_broker
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as http:
+            response = await http.get("/api/v1/as-set/expand?target=AS-X")
+            assert response.status_code == 202
+            mock_broker.execute_bgpq4_query.kiq.assert_awaited_once()
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_unparseable_output_is_not_retried():
+    """Test that output bgpq4 cannot make sense of fails instead of becoming a job."""
+    from app.exceptions import BGPq4ParseError
+
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = None
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.return_value = "not json"
+    mock_client.parse_json_output = MagicMock(
+        side_effect=BGPq4ParseError("Failed to parse bgpq4 JSON output", "not json")
+    )
+    mock_broker = AsyncMock()
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+    app.dependency_overrides[get_broker] = lambda: mock_broker
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/as-set/expand?target=AS-X")
+            assert response.status_code == 502
+            assert "Failed to parse" in response.json()["detail"]
+            mock_broker.execute_bgpq4_query.kiq.assert_not_called()
+            mock_cache.set.assert_not_called()
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_as_set_expand_rejects_unknown_source():
+    mock_client = AsyncMock()
+    app.dependency_overrides[get_cache] = lambda: AsyncMock()
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+
+    try:
+        with patch("app.api.v1.query.settings.irr_allowed_sources", ["RADB", "RIPE"]):
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                response = await client.get("/api/v1/as-set/expand?target=AS-X&sources=NOT-AN-IRR")
+                assert response.status_code == 400
+            mock_client.execute_with_retry.assert_not_called()
+    finally:
+        app.dependency_overrides.clear()
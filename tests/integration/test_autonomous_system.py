@@ -12,7 +12,7 @@ async def test_autonomous_system_prefixes():
     # Mock cache
     mock_cache = AsyncMock()
     mock_cache.get.return_value = None
-    mock_cache.generate_key.return_value = "test-cache-key"
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
 
     # Mock bgpq4 client - parse_json_output is NOT async, so use MagicMock for it
     mock_client = AsyncMock()
@@ -43,7 +43,7 @@ async def test_autonomous_system_prefixes_cache_hit():
 
     mock_cache = AsyncMock()
     mock_cache.get.return_value = cached_data
-    mock_cache.generate_key.return_value = "test-cache-key"
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
 
     app.dependency_overrides[get_cache] = lambda: mock_cache
 
@@ -63,7 +63,7 @@ async def test_autonomous_system_prefixes_non_json_format():
     """Test non-JSON format returns raw output."""
     mock_cache = AsyncMock()
     mock_cache.get.return_value = None
-    mock_cache.generate_key.return_value = "test-cache-key"
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
 
     mock_client = AsyncMock()
     mock_client.execute_with_retry.return_value = "ip prefix-list test permit 192.0.2.0/24"
@@ -91,15 +91,15 @@ async def test_autonomous_system_prefixes_non_json_format():
 async def test_autonomous_system_prefixes_async_timeout():
     """Test that timeout triggers async job dispatch."""
     mock_cache = AsyncMock()
+    mock_cache.eval.return_value = [1, "n1"]
     mock_cache.get.return_value = None
-    mock_cache.generate_key.return_value = "test-cache-key"
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
 
     mock_client = AsyncMock()
     mock_client.execute_with_retry.side_effect = TimeoutError()
 
     mock_broker = AsyncMock()
     mock_task = AsyncMock()
-    mock_task.task_id = "test-job-id"
     mock_broker.execute_bgpq4_query.kiq.return_value = mock_task
 
     app.dependency_overrides[get_cache] = lambda: mock_cache
@@ -112,6 +112,53 @@ async def test_autonomous_system_prefixes_async_timeout():
             assert response.status_code == 202
             data = response.json()
             assert data["status"] == "processing"
-            assert data["job_id"] == "test-job-id"
+            assert data["job_id"] == mock_broker.execute_bgpq4_query.kiq.call_args.kwargs["job_id"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_autonomous_system_prefixes_rov_drop():
+    """Test that RPKI invalid prefixes are dropped from the response."""
+    from app.api.dependencies import get_vrp_holder
+    from app.rpki import VRPStore
+
+    store = VRPStore()
+    store.add("192.0.2.0/24", 15169)
+    vrps = AsyncMock()
+    vrps.get.return_value = store
+
+    cached_data = {"prefixes": ["192.0.2.0/24", "192.0.2.0/25", "10.0.0.0/8"], "count": 3}
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = cached_data
+    mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_vrp_holder] = lambda: vrps
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(
+                "/api/v1/autonomous-system/prefixes?target=AS15169&rov=drop"
+            )
+            assert response.status_code == 200
+            data = response.json()["data"]
+            assert data["prefixes"] == ["192.0.2.0/24", "10.0.0.0/8"]
+            assert data["count"] == 2
+            assert data["rov"]["dropped"] == ["192.0.2.0/25"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_autonomous_system_prefixes_rov_requires_json():
+    app.dependency_overrides[get_cache] = lambda: AsyncMock()
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(
+                "/api/v1/autonomous-system/prefixes?target=AS15169&rov=annotate&format=cisco"
+            )
+            assert response.status_code == 400
     finally:
         app.dependency_overrides.clear()
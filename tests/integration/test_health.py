@@ -1,14 +1,46 @@
+from unittest.mock import MagicMock
+
 import pytest
 from httpx import ASGITransport, AsyncClient
 
+from app.api.dependencies import get_cache
+from app.circuit_breaker import OPEN, CircuitBreaker
 from app.main import app
 
 
+def _mock_cache(breaker=None):
+    mock_cache = MagicMock()
+    mock_cache.breaker = breaker
+    return mock_cache
+
+
 @pytest.mark.asyncio
 async def test_health_check():
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
-        response = await client.get("/health")
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "healthy"
-        assert "timestamp" in data
+    app.dependency_overrides[get_cache] = lambda: _mock_cache(CircuitBreaker("redis"))
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/health")
+            assert response.status_code == 200
+            data = response.json()
+            assert data["status"] == "healthy"
+            assert "timestamp" in data
+            assert data["circuit_breakers"]["redis"]["state"] == "closed"
+            assert data["irr_mirrors"] == {}
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_health_check_degraded_while_redis_circuit_open():
+    breaker = CircuitBreaker("redis", min_calls=1)
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    app.dependency_overrides[get_cache] = lambda: _mock_cache(breaker)
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/health")
+            assert response.json()["status"] == "degraded"
+    finally:
+        app.dependency_overrides.clear()
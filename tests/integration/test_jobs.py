@@ -1,22 +1,27 @@
-from unittest.mock import AsyncMock
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
 
 import pytest
 from httpx import ASGITransport, AsyncClient
 
-from app.api.dependencies import get_cache
+from app.api.dependencies import get_cache, get_job_events, get_vrp_holder
+from app.config import settings
 from app.main import app
 
 
 @pytest.mark.asyncio
 async def test_get_job_status_completed():
-    # Mock cache
+    # Mock cache: a compact job record pointing at the cached result
     mock_cache = AsyncMock()
-    mock_cache.get.return_value = {
+    mock_cache.hgetall.return_value = {
         "status": "completed",
-        "job_id": "test-job",
-        "data": {"prefixes": [], "count": 0},
-        "execution_time_ms": 1500,
+        "created_at": "1700000000.0",
+        "result_key": "bgpq4:v2:json:abc:AS-HURRICANE",
+        "execution_time_ms": "1500",
     }
+    mock_cache.get.return_value = {"prefixes": [], "count": 0}
 
     # Override dependencies
     app.dependency_overrides[get_cache] = lambda: mock_cache
@@ -27,19 +32,76 @@ async def test_get_job_status_completed():
             assert response.status_code == 200
             data = response.json()
             assert data["status"] == "completed"
-            assert "data" in data
+            assert data["data"] == {"prefixes": [], "count": 0}
+            assert data["execution_time_ms"] == 1500
+            mock_cache.hgetall.assert_awaited_once_with("job:test-job")
+            mock_cache.get.assert_awaited_once_with("bgpq4:v2:json:abc:AS-HURRICANE")
     finally:
         # Clean up dependency overrides
         app.dependency_overrides.clear()
 
 
+@pytest.mark.asyncio
+async def test_get_job_status_completed_result_expired():
+    """Test that a job whose cached result is gone answers 410."""
+    mock_cache = AsyncMock()
+    mock_cache.hgetall.return_value = {
+        "status": "completed",
+        "result_key": "bgpq4:v2:json:abc:AS-HURRICANE",
+    }
+    mock_cache.get.return_value = None
+    mock_cache.get_stale.return_value = None
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/jobs/test-job")
+            assert response.status_code == 410
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_get_job_status_completed_applies_rov():
+    """Test that validation requested at dispatch is applied to the cached result."""
+    from app.rpki import VRPStore
+
+    store = VRPStore()
+    store.add("192.0.2.0/24", 64500)
+    vrps = AsyncMock()
+    vrps.get.return_value = store
+
+    mock_cache = AsyncMock()
+    mock_cache.hgetall.return_value = {
+        "status": "completed",
+        "rov": "drop",
+        "result_key": "bgpq4:v2:json:abc:AS64500",
+    }
+    mock_cache.get.return_value = {"prefixes": ["192.0.2.0/24", "192.0.2.0/25"], "count": 2}
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_vrp_holder] = lambda: vrps
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/jobs/test-job")
+            assert response.status_code == 200
+            data = response.json()["data"]
+            assert data["prefixes"] == ["192.0.2.0/24"]
+            assert data["rov"]["dropped"] == ["192.0.2.0/25"]
+    finally:
+        app.dependency_overrides.clear()
+
+
 @pytest.mark.asyncio
 async def test_get_job_status_processing():
     # Mock cache
     mock_cache = AsyncMock()
-    mock_cache.get.return_value = {
+    mock_cache.hgetall.return_value = {
         "status": "processing",
-        "job_id": "test-job",
+        "created_at": "1700000000.0",
+        "started_at": "1700000001.0",
     }
 
     # Override dependencies
@@ -51,6 +113,7 @@ async def test_get_job_status_processing():
             assert response.status_code == 202
             data = response.json()
             assert data["status"] == "processing"
+            mock_cache.get.assert_not_called()
     finally:
         # Clean up dependency overrides
         app.dependency_overrides.clear()
@@ -60,7 +123,7 @@ async def test_get_job_status_processing():
 async def test_get_job_status_not_found():
     # Mock cache
     mock_cache = AsyncMock()
-    mock_cache.get.return_value = None
+    mock_cache.hgetall.return_value = {}
 
     # Override dependencies
     app.dependency_overrides[get_cache] = lambda: mock_cache
@@ -78,11 +141,10 @@ async def test_get_job_status_not_found():
 async def test_get_job_status_failed():
     """Test that failed job status returns 200 with error info."""
     mock_cache = AsyncMock()
-    mock_cache.get.return_value = {
+    mock_cache.hgetall.return_value = {
         "status": "failed",
-        "job_id": "test-job",
         "error": "BGPq4 execution failed",
-        "execution_time_ms": 500,
+        "execution_time_ms": "500",
     }
 
     app.dependency_overrides[get_cache] = lambda: mock_cache
@@ -93,6 +155,172 @@ async def test_get_job_status_failed():
             assert response.status_code == 200
             data = response.json()
             assert data["status"] == "failed"
-            assert "error" in data
+            assert data["error"] == "BGPq4 execution failed"
+    finally:
+        app.dependency_overrides.clear()
+
+
+class FakeJobEvents:
+    """Job events whose watchers get the given statuses straight away."""
+
+    def __init__(self, *statuses):
+        self.queue = asyncio.Queue()
+        for status in statuses:
+            self.queue.put_nowait(status)
+
+    @asynccontextmanager
+    async def watch(self, job_id):
+        yield self.queue
+
+
+@pytest.mark.asyncio
+async def test_get_job_status_long_poll_wakes_on_completion():
+    """Test that a waiting poll re-reads the job when it is notified."""
+    mock_cache = AsyncMock()
+    mock_cache.hgetall.side_effect = [
+        {"status": "processing"},
+        {"status": "completed", "result_key": "bgpq4:v2:json:abc:AS-A"},
+    ]
+    mock_cache.get.return_value = {"prefixes": [], "count": 0}
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_job_events] = lambda: FakeJobEvents("completed")
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/jobs/test-job?wait=10")
+            assert response.status_code == 200
+            assert response.json()["data"] == {"prefixes": [], "count": 0}
+            assert mock_cache.hgetall.await_count == 2
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_get_job_status_long_poll_times_out():
+    """Test that a poll still unfinished after its wait answers 202."""
+    mock_cache = AsyncMock()
+    mock_cache.hgetall.return_value = {"status": "pending"}
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_job_events] = lambda: FakeJobEvents()
+
+    try:
+        with patch.object(settings, "job_wait_max_seconds", 0.05):
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                response = await client.get("/api/v1/jobs/test-job?wait=10")
+        assert response.status_code == 202
+        assert response.json()["status"] == "pending"
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_stream_job_events():
+    """Test that the event stream sends each transition, then the result."""
+    mock_cache = AsyncMock()
+    mock_cache.hgetall.side_effect = [
+        {"status": "pending"},
+        {"status": "pending"},
+        {"status": "processing"},
+        {"status": "completed", "result_key": "bgpq4:v2:json:abc:AS-A"},
+    ]
+    mock_cache.get.return_value = {"prefixes": ["192.0.2.0/24"], "count": 1}
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_job_events] = lambda: FakeJobEvents("processing", "completed")
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/jobs/test-job/events")
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = [block for block in response.text.split("\n\n") if block]
+            names = [block.split("\n")[0] for block in events]
+            assert names == ["event: status"] * 3 + ["event: result"]
+            result = json.loads(events[-1].split("data: ", 1)[1])
+            assert result["data"]["prefixes"] == ["192.0.2.0/24"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_stream_job_events_not_found():
+    mock_cache = AsyncMock()
+    mock_cache.hgetall.return_value = {}
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/jobs/nonexistent/events")
+            assert response.status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_cancel_job():
+    mock_cache = AsyncMock()
+    mock_cache.eval.return_value = ["processing", "cancelled"]
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.delete("/api/v1/jobs/test-job?token=t1")
+            assert response.status_code == 200
+            assert response.json()["status"] == "cancelled"
+            assert mock_cache.eval.call_args.args[1] == ["job:test-job"]
+            assert mock_cache.eval.call_args.args[2][2] == "t1"
+
+            # Shared with another client: the job runs on for them
+            mock_cache.eval.return_value = ["processing", "processing"]
+            response = await client.delete("/api/v1/jobs/test-job?token=t2")
+            assert response.status_code == 200
+            assert response.json()["status"] == "processing"
+
+            # Cancelling takes the token the submission returned
+            response = await client.delete("/api/v1/jobs/test-job")
+            assert response.status_code == 422
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_cancel_job_finished_or_unknown():
+    mock_cache = AsyncMock()
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            mock_cache.eval.return_value = ["completed", "completed"]
+            response = await client.delete("/api/v1/jobs/test-job?token=t1")
+            assert response.status_code == 409
+
+            mock_cache.eval.return_value = None
+            response = await client.delete("/api/v1/jobs/nonexistent?token=t1")
+            assert response.status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_get_job_status_cancelled():
+    """Test that a cancelled job is finished, without a result."""
+    mock_cache = AsyncMock()
+    mock_cache.hgetall.return_value = {"status": "cancelled", "cancelled_at": "1700000000.0"}
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/v1/jobs/test-job")
+            assert response.status_code == 200
+            assert response.json()["status"] == "cancelled"
+            mock_cache.get.assert_not_called()
     finally:
         app.dependency_overrides.clear()
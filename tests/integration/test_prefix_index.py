@@ -0,0 +1,61 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.dependencies import get_cache, get_prefix_index
+from app.main import app
+from app.prefix_index import PrefixIndex
+
+
+@pytest.fixture
+def index_holder():
+    index = PrefixIndex()
+    index.add("192.0.2.0/24", origin=64500)
+    index.add("192.0.0.0/16", as_set="AS-EXAMPLE")
+    holder = AsyncMock()
+    holder.get.return_value = index
+    return holder
+
+
+@pytest.mark.asyncio
+async def test_prefix_lookup(index_holder):
+    app.dependency_overrides[get_cache] = lambda: AsyncMock()
+    app.dependency_overrides[get_prefix_index] = lambda: index_holder
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/api/v1/prefix-index/lookup",
+                json={"prefixes": ["192.0.2.0/25", "198.51.100.0/24"]},
+            )
+            assert response.status_code == 200
+            data = response.json()
+            assert data["count"] == 2
+            assert data["index_size"] == 2
+            assert data["results"][0]["origins"] == [64500]
+            assert data["results"][0]["as_sets"] == ["AS-EXAMPLE"]
+            assert data["results"][1]["longest_match"] is None
+            # Lookups never force a rebuild
+            assert index_holder.get.call_args.kwargs.get("force") is None
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_prefix_lookup_batch_too_large(index_holder, monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "prefix_lookup_max_batch", 1)
+    app.dependency_overrides[get_cache] = lambda: AsyncMock()
+    app.dependency_overrides[get_prefix_index] = lambda: index_holder
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/api/v1/prefix-index/lookup",
+                json={"prefixes": ["192.0.2.0/25", "198.51.100.0/24"]},
+            )
+            assert response.status_code == 413
+    finally:
+        app.dependency_overrides.clear()
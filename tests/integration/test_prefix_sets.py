@@ -0,0 +1,94 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.dependencies import get_bgpq4_client, get_cache
+from app.main import app
+
+
+def _mock_cache(cached):
+    mock_cache = AsyncMock()
+    mock_cache.generate_key = MagicMock(side_effect=lambda query: f"key:{query.target}")
+    mock_cache.get_many.side_effect = lambda keys: [cached.get(key) for key in keys]
+    mock_cache.get.return_value = None
+    return mock_cache
+
+
+@pytest.mark.asyncio
+async def test_combine_all_cached():
+    mock_cache = _mock_cache(
+        {
+            "key:AS-A": {"prefixes": ["192.0.2.0/24", "198.51.100.0/24"], "count": 2},
+            "key:AS-B": {"prefixes": ["192.0.2.0/23"], "count": 1},
+        }
+    )
+    mock_client = AsyncMock()
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/api/v1/prefix-sets/combine",
+                json={
+                    "operation": "difference",
+                    "queries": [{"target": "AS-A"}, {"target": "AS-B"}],
+                },
+            )
+            assert response.status_code == 200
+            data = response.json()
+            assert data["prefixes"] == ["198.51.100.0/24"]
+            assert all(q["cached"] for q in data["queries"])
+            mock_client.execute_with_retry.assert_not_called()
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_combine_expands_only_missing():
+    mock_cache = _mock_cache({"key:AS-A": {"prefixes": ["192.0.2.0/24"], "count": 1}})
+    mock_client = AsyncMock()
+    mock_client.execute_with_retry.return_value = "{}"
+    mock_client.parse_json_output = MagicMock(
+        return_value={"prefixes": ["198.51.100.0/24"], "count": 1}
+    )
+
+    app.dependency_overrides[get_cache] = lambda: mock_cache
+    app.dependency_overrides[get_bgpq4_client] = lambda: mock_client
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/api/v1/prefix-sets/combine",
+                json={
+                    "operation": "union",
+                    "queries": [{"target": "AS-A"}, {"target": "AS-B"}, {"target": "AS-B"}],
+                },
+            )
+            assert response.status_code == 200
+            data = response.json()
+            assert data["prefixes"] == ["192.0.2.0/24", "198.51.100.0/24"]
+            assert [q["cached"] for q in data["queries"]] == [True, False, False]
+            mock_client.execute_with_retry.assert_called_once()
+            # One result written, next to the adaptive TTL state
+            written = [call.args[0] for call in mock_cache.set.call_args_list]
+            assert written == ["ttlstate:key:AS-B", "key:AS-B"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_combine_requires_two_queries():
+    app.dependency_overrides[get_cache] = lambda: AsyncMock()
+
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/api/v1/prefix-sets/combine",
+                json={"operation": "union", "queries": [{"target": "AS-A"}]},
+            )
+            assert response.status_code == 422
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,72 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.adaptive_ttl import AdaptiveTTL, content_hash
+from app.exceptions import CacheError
+
+DATA = {"prefixes": ["192.0.2.0/24"], "count": 1}
+
+
+@pytest.fixture
+def cache():
+    cache = AsyncMock()
+    cache.get.return_value = None
+    return cache
+
+
+def _ttls(cache, **kwargs):
+    config = {"default_ttl": 300, "min_ttl": 60, "max_ttl": 3600}
+    config.update(kwargs)
+    return AdaptiveTTL(cache, **config)
+
+
+def test_content_hash_ignores_key_order():
+    assert content_hash({"a": 1, "b": [1, 2]}) == content_hash({"b": [1, 2], "a": 1})
+    assert content_hash({"a": 1}) != content_hash({"a": 2})
+
+
+@pytest.mark.asyncio
+async def test_new_key_starts_at_default(cache):
+    assert await _ttls(cache).resolve("k", DATA) == 300
+    cache.set.assert_awaited_once_with(
+        "ttlstate:k", {"hash": content_hash(DATA), "ttl": 300}, 604800
+    )
+
+
+@pytest.mark.asyncio
+async def test_unchanged_result_grows_ttl_up_to_max(cache):
+    cache.get.return_value = {"hash": content_hash(DATA), "ttl": 1200}
+    assert await _ttls(cache).resolve("k", DATA) == 2400
+    cache.get.return_value = {"hash": content_hash(DATA), "ttl": 2400}
+    assert await _ttls(cache).resolve("k", DATA) == 3600
+
+
+@pytest.mark.asyncio
+async def test_changed_result_shrinks_ttl_down_to_min(cache):
+    cache.get.return_value = {"hash": "stale", "ttl": 1200}
+    assert await _ttls(cache).resolve("k", DATA) == 600
+    cache.get.return_value = {"hash": "stale", "ttl": 100}
+    assert await _ttls(cache).resolve("k", DATA) == 60
+
+
+@pytest.mark.asyncio
+async def test_explicit_ttl_is_capped_not_adapted(cache):
+    ttls = _ttls(cache)
+    assert await ttls.resolve("k", DATA, ttl=120) == 120
+    assert await ttls.resolve("k", DATA, ttl=86400) == 3600
+    cache.get.assert_not_called()
+    assert ttls.requested(None) == 300
+    assert ttls.requested(86400) == 3600
+
+
+@pytest.mark.asyncio
+async def test_disabled_uses_default(cache):
+    assert await _ttls(cache, enabled=False).resolve("k", DATA) == 300
+    cache.get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cache_errors_fall_back_to_default(cache):
+    cache.get.side_effect = CacheError("down")
+    assert await _ttls(cache).resolve("k", DATA) == 300
@@ -1,9 +1,23 @@
-from unittest.mock import AsyncMock, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from app.bgpq4 import BGPq4Client
-from app.exceptions import BGPq4ExecutionError, BGPq4ParseError, BGPq4TimeoutError
+from app.bgpq4 import BGPq4Client, is_permanent_failure
+from app.budget import Deadline, RetryBudget
+from app.circuit_breaker import HALF_OPEN, OPEN, CircuitBreakerRegistry
+from app.exceptions import (
+    BGPq4ExecutionError,
+    BGPq4ParseError,
+    BGPq4PermanentError,
+    BGPq4TimeoutError,
+    CircuitOpenError,
+    DeadlineExceededError,
+    ExecutionPoolFullError,
+)
+from app.execution_pool import ExecutionPool
+from app.hedging import HedgePolicy
+from app.irr_mirrors import MirrorPool
 
 
 @pytest.fixture
@@ -178,3 +192,328 @@ async def test_execute_with_retry_timeout():
         result = await client.execute_with_retry(target="AS-HURRICANE", sources=None, format="json")
         assert result == '{"NN": []}'
         assert mock_exec.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_execute_timeout_kills_process(client):
+    with patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec:
+        mock_process = AsyncMock()
+        mock_process.communicate.side_effect = TimeoutError()
+        mock_process.returncode = None
+        mock_process.kill = MagicMock()
+        mock_exec.return_value = mock_process
+
+        with pytest.raises(BGPq4TimeoutError):
+            await client.execute(target="AS-HURRICANE", sources=None, format="json")
+        mock_process.kill.assert_called_once()
+        mock_process.wait.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_execute_expired_deadline_does_not_spawn(client):
+    with patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec:
+        with pytest.raises(DeadlineExceededError):
+            await client.execute(
+                target="AS-HURRICANE", sources=None, format="json", deadline=Deadline.after(0)
+            )
+        mock_exec.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_execute_deadline_caps_timeout(client):
+    with (
+        patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec,
+        patch("app.bgpq4.asyncio.wait_for", side_effect=TimeoutError()) as mock_wait_for,
+    ):
+        mock_process = AsyncMock()
+        mock_process.communicate = MagicMock()
+        mock_exec.return_value = mock_process
+
+        with pytest.raises(DeadlineExceededError):
+            await client.execute(
+                target="AS-HURRICANE",
+                sources=None,
+                format="json",
+                timeout_seconds=30.0,
+                deadline=Deadline.after(0.5),
+            )
+        assert mock_wait_for.call_args.kwargs["timeout"] <= 0.5
+
+
+@pytest.mark.asyncio
+async def test_execute_with_retry_stops_at_deadline():
+    client = BGPq4Client(
+        binary_path="/usr/bin/bgpq4",
+        default_sources=["RIPE"],
+        max_retries=5,
+        retry_backoff=1.0,
+    )
+
+    with patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec:
+        mock_process = AsyncMock()
+        mock_process.communicate.return_value = (b"", b"connection error")
+        mock_process.returncode = 1
+        mock_exec.return_value = mock_process
+
+        # The first backoff (1s) does not fit in the deadline
+        with pytest.raises(BGPq4ExecutionError):
+            await client.execute_with_retry(
+                target="AS-HURRICANE", sources=None, format="json", deadline=Deadline.after(0.5)
+            )
+        assert mock_exec.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_with_retry_budget_exhausted():
+    budget = RetryBudget(rate=0.0, burst=1)
+    client = BGPq4Client(
+        binary_path="/usr/bin/bgpq4",
+        default_sources=["RIPE"],
+        max_retries=3,
+        retry_backoff=0.01,
+        retry_budget=budget,
+    )
+
+    with patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec:
+        mock_process = AsyncMock()
+        mock_process.communicate.return_value = (b"", b"connection error")
+        mock_process.returncode = 1
+        mock_exec.return_value = mock_process
+
+        with pytest.raises(BGPq4ExecutionError):
+            await client.execute_with_retry(target="AS-HURRICANE", sources=None, format="json")
+        # Initial attempt plus the single retry the budget allowed
+        assert mock_exec.call_count == 2
+
+        mock_exec.reset_mock()
+        with pytest.raises(BGPq4ExecutionError):
+            await client.execute_with_retry(target="AS-HURRICANE", sources=None, format="json")
+        assert mock_exec.call_count == 1
+
+
+@pytest.mark.parametrize(
+    ("return_code", "stderr", "permanent"),
+    [
+        (1, "ERROR: AS-TYPO: no such object", True),
+        (1, "%  No entries found for the selected source(s).", True),
+        (1, "Invalid AS number: ASFOO", True),
+        (1, "Unable to connect to whois.radb.net: Connection refused", False),
+        (1, "getaddrinfo: Temporary failure in name resolution", False),
+        (1, "", False),
+        (-9, "no such object", False),
+    ],
+)
+def test_is_permanent_failure(return_code, stderr, permanent):
+    assert is_permanent_failure(return_code, stderr) is permanent
+
+
+@pytest.mark.asyncio
+async def test_execute_with_retry_does_not_retry_permanent_failure():
+    client = BGPq4Client(
+        binary_path="/usr/bin/bgpq4",
+        default_sources=["RIPE"],
+        max_retries=3,
+        retry_backoff=0.01,
+    )
+
+    with patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec:
+        mock_process = AsyncMock()
+        mock_process.communicate.return_value = (b"", b"ERROR: AS-TYPO: no such object")
+        mock_process.returncode = 1
+        mock_exec.return_value = mock_process
+
+        with pytest.raises(BGPq4PermanentError):
+            await client.execute_with_retry(target="AS-TYPO", sources=None, format="json")
+        assert mock_exec.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_with_retry_circuit_opens_and_fails_fast():
+    breakers = CircuitBreakerRegistry(min_calls=2, failure_rate=0.5, open_seconds=30.0)
+    client = BGPq4Client(
+        binary_path="/usr/bin/bgpq4",
+        default_sources=["RADB"],
+        max_retries=3,
+        retry_backoff=0.01,
+        breakers=breakers,
+    )
+
+    with patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec:
+        mock_process = AsyncMock()
+        mock_process.communicate.return_value = (b"", b"Connection refused")
+        mock_process.returncode = 1
+        mock_exec.return_value = mock_process
+
+        # Two failures open the circuit; the next retry is rejected without a process
+        with pytest.raises(CircuitOpenError):
+            await client.execute_with_retry(target="AS-HURRICANE", sources=None, format="json")
+        assert mock_exec.call_count == 2
+        assert breakers.get("bgpq4:RADB").state == OPEN
+
+        # Other source sets have their own breaker
+        mock_process.communicate.return_value = (b'{"NN": []}', b"")
+        mock_process.returncode = 0
+        result = await client.execute(target="AS-HURRICANE", sources=["RIPE"], format="json")
+        assert result == '{"NN": []}'
+
+
+@pytest.mark.asyncio
+async def test_execute_permanent_failure_keeps_circuit_closed():
+    breakers = CircuitBreakerRegistry(min_calls=1, failure_rate=0.5)
+    client = BGPq4Client(binary_path="/usr/bin/bgpq4", default_sources=["RADB"], breakers=breakers)
+
+    with patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec:
+        mock_process = AsyncMock()
+        mock_process.communicate.return_value = (b"", b"ERROR: no such object")
+        mock_process.returncode = 1
+        mock_exec.return_value = mock_process
+
+        with pytest.raises(BGPq4PermanentError):
+            await client.execute(target="AS-TYPO", sources=None, format="json")
+        assert breakers.get("bgpq4:RADB").state != OPEN
+
+
+def test_breaker_key_is_server_and_source_set():
+    client = BGPq4Client(binary_path="/usr/bin/bgpq4", default_sources=["RADB"])
+    assert client.breaker_key(None) == "bgpq4:RADB"
+    assert client.breaker_key(["ripe", "RADB"]) == client.breaker_key(["RADB", "RIPE"])
+    client.host = "whois.radb.net"
+    assert client.breaker_key(None) == "bgpq4:whois.radb.net/RADB"
+
+
+@pytest.mark.asyncio
+async def test_execute_deadline_cut_off_does_not_close_half_open_circuit():
+    breakers = CircuitBreakerRegistry(min_calls=1, failure_rate=0.5, open_seconds=0.0)
+    client = BGPq4Client(binary_path="/usr/bin/bgpq4", default_sources=["RADB"], breakers=breakers)
+    breaker = breakers.get("bgpq4:RADB")
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+
+    with (
+        patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec,
+        patch("app.bgpq4.asyncio.wait_for", side_effect=TimeoutError()),
+    ):
+        mock_process = AsyncMock()
+        mock_process.communicate = MagicMock()
+        mock_exec.return_value = mock_process
+
+        with pytest.raises(DeadlineExceededError):
+            await client.execute(
+                target="AS-HURRICANE",
+                sources=None,
+                format="json",
+                timeout_seconds=30.0,
+                deadline=Deadline.after(0.5),
+            )
+    # The probe was cut off by the caller, so the circuit stays half-open
+    assert breaker.state == HALF_OPEN
+
+
+@pytest.mark.asyncio
+async def test_execute_sheds_load_when_pool_is_full():
+    pool = ExecutionPool(max_concurrency=1, max_queue=0)
+    client = BGPq4Client(binary_path="/usr/bin/bgpq4", default_sources=["RADB"], pool=pool)
+
+    with patch("app.bgpq4.asyncio.create_subprocess_exec") as mock_exec:
+        async with pool.slot():
+            with pytest.raises(ExecutionPoolFullError):
+                await client.execute_with_retry(target="AS-HURRICANE", sources=None, format="json")
+        mock_exec.assert_not_called()
+
+        mock_process = AsyncMock()
+        mock_process.communicate.return_value = (b'{"NN": []}', b"")
+        mock_process.returncode = 0
+        mock_exec.return_value = mock_process
+        assert await client.execute(target="AS-HURRICANE", sources=None, format="json")
+        assert pool.active == 0
+
+
+def test_build_command_with_host(client):
+    cmd = client._build_command(
+        target="AS-HURRICANE", sources=None, format="json", host="rr.ntt.net"
+    )
+    assert cmd[1:3] == ["-h", "rr.ntt.net"]
+    assert "-h" not in client._build_command(target="AS-HURRICANE", sources=None, format="json")
+
+
+def _process(output: bytes, delay: float):
+    process = AsyncMock()
+    process.returncode = None
+
+    async def communicate():
+        await asyncio.sleep(delay)
+        process.returncode = 0
+        return output, b""
+
+    process.communicate = communicate
+    process.kill = MagicMock()
+    return process
+
+
+@pytest.mark.asyncio
+async def test_execute_hedges_stalled_primary():
+    hedge = HedgePolicy("rr.ntt.net", default_delay=0.01)
+    client = BGPq4Client(
+        binary_path="/usr/bin/bgpq4", default_sources=["RADB"], host="whois.radb.net", hedge=hedge
+    )
+    primary = _process(b"primary", delay=10)
+    alternate = _process(b"alternate", delay=0)
+
+    def spawn(*cmd, **kwargs):
+        return alternate if "rr.ntt.net" in cmd else primary
+
+    with patch("app.bgpq4.asyncio.create_subprocess_exec", side_effect=spawn):
+        result = await client.execute(target="AS-HURRICANE", sources=None, format="json")
+
+    assert result == "alternate"
+    # The stalled primary is killed and reaped
+    primary.kill.assert_called_once()
+    primary.wait.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_execute_fast_primary_is_not_hedged():
+    hedge = HedgePolicy("rr.ntt.net", default_delay=1.0)
+    client = BGPq4Client(binary_path="/usr/bin/bgpq4", default_sources=["RADB"], hedge=hedge)
+
+    with patch(
+        "app.bgpq4.asyncio.create_subprocess_exec", return_value=_process(b"primary", delay=0)
+    ) as mock_exec:
+        assert await client.execute(target="AS-HURRICANE", sources=None, format="json") == (
+            "primary"
+        )
+    assert mock_exec.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_hedge_budget_exhausted_waits_for_primary():
+    hedge = HedgePolicy("rr.ntt.net", default_delay=0.01, budget=RetryBudget(rate=0.0, burst=0))
+    client = BGPq4Client(binary_path="/usr/bin/bgpq4", default_sources=["RADB"], hedge=hedge)
+
+    with patch(
+        "app.bgpq4.asyncio.create_subprocess_exec", return_value=_process(b"primary", delay=0.05)
+    ) as mock_exec:
+        assert await client.execute(target="AS-HURRICANE", sources=None, format="json") == (
+            "primary"
+        )
+    assert mock_exec.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_uses_mirror_pool():
+    mirrors = MirrorPool(["irr1.example.net:43"], eject_failures=1, max_ejected_fraction=1.0)
+    client = BGPq4Client(
+        binary_path="/usr/bin/bgpq4", default_sources=["RADB"], host="ignored", mirrors=mirrors
+    )
+    mock_process = AsyncMock()
+    mock_process.communicate.return_value = (b"", b"connection refused")
+    mock_process.returncode = 1
+
+    with patch("app.bgpq4.asyncio.create_subprocess_exec", return_value=mock_process) as mock_exec:
+        with pytest.raises(BGPq4ExecutionError):
+            await client.execute(target="AS-HURRICANE", sources=None, format="json")
+
+    assert mock_exec.call_args[0][1:3] == ("-h", "irr1.example.net:43")
+    state = mirrors.snapshot()["irr1.example.net:43"]
+    assert state["in_flight"] == 0
+    assert state["ejected"] is True
@@ -1,6 +1,11 @@
-from taskiq import InMemoryBroker
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from app.tasks.broker import get_broker
+import pytest
+from taskiq import InMemoryBroker, TaskiqMessage
+from taskiq.message import BrokerMessage
+
+from app.metrics import metrics
+from app.tasks.broker import PriorityLaneMiddleware, PriorityListQueueBroker, get_broker
 
 
 def test_get_broker():
@@ -14,3 +19,141 @@ def test_get_broker_in_memory():
     """Test that non-redis URL returns InMemoryBroker."""
     broker = get_broker("memory://")
     assert isinstance(broker, InMemoryBroker)
+
+
+def test_get_broker_registers_task():
+    broker = get_broker("redis://localhost:6379/0", lane_weights={"interactive": 4, "bulk": 1})
+    assert isinstance(broker, PriorityListQueueBroker)
+    assert broker.find_task("execute_bgpq4_query") is not None
+    assert broker.execute_bgpq4_query.task_name == "execute_bgpq4_query"
+    assert broker.lane_weights == {"interactive": 4, "bulk": 1}
+
+
+def test_get_broker_schedules_hot_key_refresh():
+    broker = get_broker("memory://", refresh_schedule="*/5 * * * *")
+    labels = broker.find_task("refresh_hot_keys").labels
+    assert labels["schedule"] == [{"cron": "*/5 * * * *"}]
+    assert labels["priority"] == "bulk"
+    assert "schedule" not in get_broker("memory://").find_task("refresh_hot_keys").labels
+
+
+def _message(**kwargs):
+    return TaskiqMessage(
+        task_id="t1", task_name="execute_bgpq4_query", labels={}, args=[], kwargs=kwargs
+    )
+
+
+def test_middleware_moves_priority_to_labels():
+    middleware = PriorityLaneMiddleware()
+    message = middleware.pre_send(_message(target="AS-A", priority="bulk"))
+    assert message.labels["priority"] == "bulk"
+    assert "enqueued_at" in message.labels
+    assert message.kwargs == {"target": "AS-A"}
+
+    assert middleware.pre_send(_message(priority="nonsense")).labels["priority"] == "interactive"
+    assert middleware.pre_send(_message()).labels["priority"] == "interactive"
+
+    scheduled = _message()
+    scheduled.labels = {"priority": "bulk"}
+    assert middleware.pre_send(scheduled).labels["priority"] == "bulk"
+
+
+def test_middleware_tracks_lane_wait():
+    middleware = PriorityLaneMiddleware()
+    message = _message(target="AS-A")
+    message.labels = {"priority": "bulk", "enqueued_at": 100.0}
+    with (
+        patch("app.tasks.broker.time.time", return_value=102.5),
+        patch("app.tasks.broker.metrics") as mock_metrics,
+    ):
+        middleware.pre_execute(message)
+    mock_metrics.track_lane_wait.assert_called_once_with("bulk", 2.5)
+
+
+def test_weighted_lane_order():
+    broker = PriorityListQueueBroker(
+        "redis://localhost:6379/0", lane_weights={"interactive": 3, "bulk": 1}
+    )
+    firsts = [broker._lane_order()[0] for _ in range(8)]
+    assert firsts.count("interactive") == 6
+    assert firsts.count("bulk") == 2
+
+
+def _mock_redis():
+    redis_conn = AsyncMock()
+    context = MagicMock()
+    context.__aenter__ = AsyncMock(return_value=redis_conn)
+    context.__aexit__ = AsyncMock(return_value=False)
+    return redis_conn, MagicMock(return_value=context)
+
+
+@pytest.mark.asyncio
+async def test_kick_pushes_to_lane():
+    broker = PriorityListQueueBroker("redis://localhost:6379/0")
+    redis_conn, redis_class = _mock_redis()
+    redis_conn.lpush.return_value = 3
+    with patch("app.tasks.broker.Redis", redis_class):
+        await broker.kick(
+            BrokerMessage(task_id="t1", task_name="x", message=b"m", labels={"priority": "bulk"})
+        )
+        await broker.kick(BrokerMessage(task_id="t2", task_name="x", message=b"n", labels={}))
+    keys = [call.args[0] for call in redis_conn.lpush.call_args_list]
+    assert keys == ["taskiq:bulk", "taskiq:interactive"]
+
+
+@pytest.mark.asyncio
+async def test_listen_falls_back_to_other_lanes():
+    broker = PriorityListQueueBroker(
+        "redis://localhost:6379/0", lane_weights={"interactive": 1, "bulk": 1}
+    )
+    redis_conn, redis_class = _mock_redis()
+    queued = {"taskiq:interactive": [], "taskiq:bulk": [b"bulk-job"]}
+    redis_conn.rpop.side_effect = lambda key: queued[key].pop() if queued[key] else None
+    redis_conn.brpop.return_value = [b"taskiq:interactive", b"late-job"]
+    redis_conn.llen.return_value = 0
+
+    with patch("app.tasks.broker.Redis", redis_class):
+        listener = broker.listen()
+        assert await listener.__anext__() == b"bulk-job"
+        assert await listener.__anext__() == b"late-job"
+        await listener.aclose()
+    redis_conn.brpop.assert_awaited_once_with(
+        ["taskiq:interactive", "taskiq:bulk", "taskiq"], timeout=1
+    )
+    keys = [call.args[0] for call in redis_conn.llen.call_args_list]
+    assert keys == ["taskiq:bulk", "taskiq:interactive"]
+
+
+@pytest.mark.asyncio
+async def test_listen_drains_list_queued_before_lanes():
+    broker = PriorityListQueueBroker("redis://localhost:6379/0")
+    redis_conn, redis_class = _mock_redis()
+    redis_conn.rpop.return_value = None
+    # Only the list jobs were pushed to before lanes existed still holds any
+    redis_conn.brpop.return_value = [b"taskiq", b"old-job"]
+
+    with patch("app.tasks.broker.Redis", redis_class):
+        listener = broker.listen()
+        assert await listener.__anext__() == b"old-job"
+        await listener.aclose()
+    assert redis_conn.brpop.call_args.args[0][-1] == "taskiq"
+    redis_conn.llen.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_lane_depth_falls_as_jobs_are_consumed():
+    broker = PriorityListQueueBroker("redis://localhost:6379/0")
+    redis_conn, redis_class = _mock_redis()
+    redis_conn.lpush.return_value = 1
+    redis_conn.rpop.side_effect = lambda key: b"job" if key == "taskiq:bulk" else None
+    redis_conn.llen.return_value = 0
+
+    with patch("app.tasks.broker.Redis", redis_class):
+        await broker.kick(
+            BrokerMessage(task_id="t1", task_name="x", message=b"job", labels={"priority": "bulk"})
+        )
+        assert metrics.lane_depth.labels(lane="bulk")._value.get() == 1
+        listener = broker.listen()
+        await listener.__anext__()
+        await listener.aclose()
+    assert metrics.lane_depth.labels(lane="bulk")._value.get() == 0
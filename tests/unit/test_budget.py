@@ -0,0 +1,46 @@
+import math
+from unittest.mock import patch
+
+from app.budget import Deadline, RetryBudget
+
+
+def test_deadline_without_expiry_is_unbounded():
+    deadline = Deadline()
+    assert deadline.remaining() == math.inf
+    assert not deadline.expired
+    assert deadline.cap(5.0) == 5.0
+
+
+def test_deadline_remaining_and_cap():
+    with patch("app.budget.time.monotonic", return_value=100.0):
+        deadline = Deadline.after(2.0)
+        assert deadline.remaining() == 2.0
+        assert deadline.cap(30.0) == 2.0
+        assert deadline.cap(1.0) == 1.0
+
+
+def test_deadline_expired():
+    with patch("app.budget.time.monotonic", return_value=100.0):
+        deadline = Deadline.after(1.0)
+    with patch("app.budget.time.monotonic", return_value=102.0):
+        assert deadline.remaining() == 0.0
+        assert deadline.expired
+
+
+def test_retry_budget_burst_then_exhausted():
+    with patch("app.budget.time.monotonic", return_value=0.0):
+        budget = RetryBudget(rate=1.0, burst=2)
+        assert budget.try_acquire()
+        assert budget.try_acquire()
+        assert not budget.try_acquire()
+
+
+def test_retry_budget_refills_up_to_burst():
+    with patch("app.budget.time.monotonic", return_value=0.0):
+        budget = RetryBudget(rate=2.0, burst=3)
+        for _ in range(3):
+            assert budget.try_acquire()
+    with patch("app.budget.time.monotonic", return_value=1.0):
+        assert budget.available == 2.0
+    with patch("app.budget.time.monotonic", return_value=100.0):
+        assert budget.available == 3.0
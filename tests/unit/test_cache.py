@@ -1,8 +1,10 @@
+import time
 from unittest.mock import AsyncMock, patch
 
 import pytest
 
 from app.cache import RedisCache
+from app.exceptions import CacheError
 
 
 @pytest.fixture
@@ -42,11 +44,16 @@ async def test_cache_set(mock_redis):
 
 @pytest.mark.asyncio
 async def test_cache_generate_key():
+    from app.cache import key_target
+    from app.models.query import CanonicalQuery
+
     cache = RedisCache("redis://localhost")
-    key = cache.generate_key(target="AS-HURRICANE", sources=["RIPE"], aggregate=True, format="json")
-    assert "AS-HURRICANE" in key
-    assert "RIPE" in key
-    assert key.startswith("bgpq4:")
+    query = CanonicalQuery.normalize("AS-HURRICANE", ["RIPE"], aggregate=True)
+    key = cache.generate_key(query)
+    assert key.startswith("bgpq4:v2:json:")
+    assert key_target(key) == "AS-HURRICANE"
+    # Options are hashed: a different source set is a different key
+    assert key != cache.generate_key(CanonicalQuery.normalize("AS-HURRICANE", ["RADB"]))
 
 
 @pytest.mark.asyncio
@@ -107,3 +114,478 @@ async def test_cache_delete_error(mock_redis):
     with pytest.raises(CacheError) as exc_info:
         await cache.delete("test_key")
     assert "Failed to delete from cache" in str(exc_info.value)
+
+
+@pytest.mark.asyncio
+async def test_cache_get_many(mock_redis):
+    mock_redis.mget.return_value = [b'{"data": "a"}', None]
+    cache = RedisCache("redis://localhost")
+    result = await cache.get_many(["a", "b"])
+    assert result == [{"data": "a"}, None]
+    mock_redis.mget.assert_called_once_with(["a", "b"])
+
+
+@pytest.mark.asyncio
+async def test_cache_get_many_empty(mock_redis):
+    cache = RedisCache("redis://localhost")
+    assert await cache.get_many([]) == []
+    mock_redis.mget.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cache_scan_keys(mock_redis):
+    async def scan_iter(match, count):
+        for key in [b"bgpq4:a", b"bgpq4:b"]:
+            yield key
+
+    mock_redis.scan_iter = scan_iter
+    cache = RedisCache("redis://localhost")
+    keys = [key async for key in cache.scan_keys("bgpq4:*")]
+    assert keys == ["bgpq4:a", "bgpq4:b"]
+
+
+@pytest.mark.asyncio
+async def test_cache_eval(mock_redis):
+    mock_redis.eval.return_value = 1
+    cache = RedisCache("redis://localhost")
+    assert await cache.eval("return 1", ["a", "b"], [1, 2]) == 1
+    mock_redis.eval.assert_called_once_with("return 1", 2, "a", "b", 1, 2)
+
+
+@pytest.mark.asyncio
+async def test_cache_hmget_many(mock_redis):
+    from unittest.mock import MagicMock
+
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[[b"1", None], [None, None]])
+    mock_redis.pipeline = MagicMock(return_value=pipe)
+    cache = RedisCache("redis://localhost")
+    result = await cache.hmget_many(["a", "b"], ["x", "y"])
+    assert result == [[b"1", None], [None, None]]
+    assert pipe.hmget.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_top_scores(mock_redis):
+    from unittest.mock import MagicMock
+
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[[(b"k1", 5.0), (b"k2", 2.0)], []])
+    mock_redis.pipeline = MagicMock(return_value=pipe)
+    cache = RedisCache("redis://localhost")
+    assert await cache.top_scores(["a", "b"], 10) == [[("k1", 5.0), ("k2", 2.0)], []]
+    pipe.zrevrange.assert_any_call("a", 0, 9, withscores=True)
+
+
+@pytest.mark.asyncio
+async def test_cache_ttl_many(mock_redis):
+    from unittest.mock import MagicMock
+
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[120, -2])
+    mock_redis.pipeline = MagicMock(return_value=pipe)
+    cache = RedisCache("redis://localhost")
+    assert await cache.ttl_many(["a", "b"]) == [120, -2]
+    assert pipe.ttl.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_set_with_stale_copy(mock_redis):
+    from unittest.mock import MagicMock
+
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[True, True])
+    mock_redis.pipeline = MagicMock(return_value=pipe)
+    cache = RedisCache("redis://localhost")
+    await cache.set("test_key", {"data": "test"}, ttl=300, stale_ttl=86400)
+    keys_and_ttls = [call.args[:2] for call in pipe.setex.call_args_list]
+    assert keys_and_ttls == [("test_key", 300), ("stale:test_key", 86400)]
+    mock_redis.setex.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cache_get_stale(mock_redis):
+    mock_redis.get.return_value = b'{"data": "old"}'
+    cache = RedisCache("redis://localhost")
+    assert await cache.get_stale("test_key") == {"data": "old"}
+    mock_redis.get.assert_called_once_with("stale:test_key")
+
+
+@pytest.mark.asyncio
+async def test_cache_operation_timeout_configures_client():
+    with patch("app.cache.redis.from_url") as mock_from_url:
+        cache = RedisCache("redis://localhost", operation_timeout=0.25)
+        await cache.get_client()
+        kwargs = mock_from_url.call_args.kwargs
+        assert kwargs["socket_timeout"] == 0.25
+        assert kwargs["socket_connect_timeout"] == 0.25
+
+
+@pytest.mark.asyncio
+async def test_cache_falls_back_to_local_when_redis_fails(mock_redis):
+    from app.cache import LocalCache
+
+    mock_redis.setex.side_effect = Exception("Redis connection failed")
+    mock_redis.get.side_effect = Exception("Redis connection failed")
+    mock_redis.mget.side_effect = Exception("Redis connection failed")
+    cache = RedisCache("redis://localhost", fallback=LocalCache(max_entries=10))
+
+    await cache.set("test_key", {"data": "test"}, ttl=300)
+    assert await cache.get("test_key") == {"data": "test"}
+    assert await cache.get_many(["test_key", "other"]) == [{"data": "test"}, None]
+    assert cache.fallback.has_dirty
+
+
+@pytest.mark.asyncio
+async def test_write_many_without_fallback_raises(mock_redis):
+    from app.cache import LocalCache
+
+    pipe = _pipeline(mock_redis)
+    pipe.execute.side_effect = Exception("Redis connection failed")
+    cache = RedisCache("redis://localhost", fallback=LocalCache())
+
+    with pytest.raises(CacheError):
+        await cache.write_many([("a", "{}", 60)], fallback=False)
+    assert cache.fallback.get("a") is None
+    await cache.write_many([("a", "{}", 60)])
+    assert cache.fallback.get("a") == {}
+
+
+@pytest.mark.asyncio
+async def test_cache_circuit_open_skips_redis(mock_redis):
+    from app.cache import LocalCache
+    from app.circuit_breaker import OPEN, CircuitBreaker
+
+    mock_redis.get.side_effect = Exception("Redis connection failed")
+    breaker = CircuitBreaker("redis", min_calls=2, failure_rate=0.5, open_seconds=30.0)
+    cache = RedisCache("redis://localhost", breaker=breaker, fallback=LocalCache())
+
+    for _ in range(2):
+        assert await cache.get("test_key") is None
+    assert breaker.state == OPEN
+
+    mock_redis.get.reset_mock()
+    assert await cache.get("test_key") is None
+    mock_redis.get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cache_replays_local_writes_after_recovery(mock_redis):
+    import asyncio
+    from unittest.mock import MagicMock
+
+    from app.cache import LocalCache
+
+    mock_redis.setex.side_effect = Exception("Redis connection failed")
+    cache = RedisCache("redis://localhost", fallback=LocalCache())
+    await cache.set("test_key", {"data": "test"}, ttl=300)
+
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[True])
+    mock_redis.pipeline = MagicMock(return_value=pipe)
+    mock_redis.get.return_value = None
+    await cache.get("other_key")
+    await asyncio.wait_for(cache._replay_task, timeout=1)
+
+    key, ttl, value = pipe.setex.call_args.args
+    assert key == "test_key"
+    assert 298 <= ttl <= 300
+    assert value == '{"data": "test"}'
+    assert not cache.fallback.has_dirty
+
+
+def test_local_cache_evicts_least_recently_used():
+    from app.cache import LocalCache
+
+    local = LocalCache(max_entries=2)
+    local.set("a", '{"v": 1}', 60, dirty=True)
+    local.set("b", '{"v": 2}', 60)
+    assert local.get("a") == {"v": 1}
+    local.set("c", '{"v": 3}', 60)
+    assert local.get("b") is None
+    assert local.get("a") == {"v": 1}
+    assert len(local) == 2
+
+
+def test_local_cache_expires_entries():
+    from app.cache import LocalCache
+
+    local = LocalCache()
+    with patch("app.cache.time.monotonic", return_value=0.0):
+        local.set("a", '{"v": 1}', 60, dirty=True)
+    with patch("app.cache.time.monotonic", return_value=61.0):
+        assert local.get("a") is None
+        assert local.take_dirty() == []
+
+
+def _pipeline(mock_redis):
+    from unittest.mock import MagicMock
+
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    mock_redis.pipeline = MagicMock(return_value=pipe)
+    return pipe
+
+
+@pytest.mark.asyncio
+async def test_write_behind_batches_writes_in_one_pipeline(mock_redis):
+    import asyncio
+
+    pipe = _pipeline(mock_redis)
+    cache = RedisCache("redis://localhost", write_behind_max_pending=100)
+    for i in range(5):
+        await cache.set(f"k{i}", {"i": i}, ttl=300)
+    await cache.set("k0", {"i": "latest"}, ttl=300)
+
+    # Acknowledged before Redis saw anything, yet readable
+    mock_redis.setex.assert_not_called()
+    assert len(cache.write_behind) == 5
+    assert await cache.get("k0") == {"i": "latest"}
+    mock_redis.get.assert_not_called()
+
+    await asyncio.sleep(0.05)
+    assert len(cache.write_behind) == 0
+    pipe.execute.assert_awaited_once()
+    assert pipe.setex.call_count == 5
+    pipe.setex.assert_any_call("k0", 300, '{"i": "latest"}')
+
+
+@pytest.mark.asyncio
+async def test_write_behind_backpressure_flushes_inline(mock_redis):
+    pipe = _pipeline(mock_redis)
+    cache = RedisCache("redis://localhost", write_behind_max_pending=2, write_behind_batch_size=2)
+    await cache.set("a", {}, ttl=60)
+    await cache.set("b", {}, ttl=60)
+    await cache.set("c", {}, ttl=60)
+    # The third writer flushed the first batch itself
+    assert pipe.setex.call_count == 2
+    assert len(cache.write_behind) == 1
+
+
+@pytest.mark.asyncio
+async def test_write_behind_flushed_on_close(mock_redis):
+    pipe = _pipeline(mock_redis)
+    cache = RedisCache("redis://localhost", write_behind_max_pending=100)
+    await cache.set("a", {}, ttl=60, stale_ttl=600)
+    await cache.get_client()
+    await cache.close()
+    pipe.setex.assert_any_call("a", 60, "{}")
+    pipe.setex.assert_any_call("stale:a", 600, "{}")
+    mock_redis.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_failed_flush_falls_back_locally(mock_redis):
+    from app.cache import LocalCache
+
+    pipe = _pipeline(mock_redis)
+    pipe.execute.side_effect = ConnectionError("down")
+    fallback = LocalCache()
+    cache = RedisCache("redis://localhost", fallback=fallback, write_behind_max_pending=100)
+    await cache.set("a", {"x": 1}, ttl=60)
+    await cache.write_behind.flush()
+    assert fallback.get("a") == {"x": 1}
+    assert fallback.has_dirty
+
+
+@pytest.mark.asyncio
+async def test_write_behind_delete_drops_pending_write(mock_redis):
+    cache = RedisCache("redis://localhost", write_behind_max_pending=100)
+    await cache.set("a", {}, ttl=60)
+    await cache.delete("a")
+    assert len(cache.write_behind) == 0
+
+
+@pytest.mark.asyncio
+async def test_dump_many_pairs_values_with_ttls(mock_redis):
+    pipe = _pipeline(mock_redis)
+    pipe.execute.return_value = [b'{"a": 1}', 120, None, -2]
+    cache = RedisCache("redis://localhost")
+    assert await cache.dump_many(["a", "b"]) == [(b'{"a": 1}', 120), (None, -2)]
+
+
+@pytest.mark.asyncio
+async def test_hget_many_reads_one_field_per_hash(mock_redis):
+    pipe = _pipeline(mock_redis)
+    pipe.execute.return_value = [b'{"target": "AS-A"}', None]
+    cache = RedisCache("redis://localhost")
+    assert await cache.hget_many(["h1", "h2"], ["a", "b"]) == ['{"target": "AS-A"}', None]
+    assert [call.args for call in pipe.hget.call_args_list] == [("h1", "a"), ("h2", "b")]
+
+
+@pytest.mark.asyncio
+async def test_write_many_nx_keeps_existing_keys(mock_redis):
+    pipe = _pipeline(mock_redis)
+    cache = RedisCache("redis://localhost")
+    await cache.write_many([("a", "{}", 60)], nx=True)
+    pipe.set.assert_called_once_with("a", "{}", ex=60, nx=True)
+    pipe.setex.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_shared_tier_sits_in_front_of_redis(mock_redis, tmp_path):
+    from app.shared_cache import SharedMemoryCache
+
+    shared = SharedMemoryCache(str(tmp_path / "shm"), arena_bytes=4096, slots=64)
+    cache = RedisCache("redis://localhost", shared=shared)
+    pipe = _pipeline(mock_redis)
+    pipe.execute.return_value = [b'{"a": 1}', 300]
+
+    assert await cache.get("bgpq4:AS-A") == {"a": 1}
+    # The read was kept for the other workers
+    assert await cache.get("bgpq4:AS-A") == {"a": 1}
+    pipe.execute.assert_awaited_once()
+
+    pipe.execute.return_value = [b'{"b": 2}', 300]
+    assert await cache.get_many(["bgpq4:AS-A", "bgpq4:AS-B"]) == [{"a": 1}, {"b": 2}]
+    assert [call.args for call in pipe.get.call_args_list] == [("bgpq4:AS-A",), ("bgpq4:AS-B",)]
+
+    await cache.delete("bgpq4:AS-A")
+    assert shared.get("bgpq4:AS-A") is None
+
+
+@pytest.mark.asyncio
+async def test_shared_tier_never_outlives_redis_ttl(mock_redis, tmp_path):
+    from app.shared_cache import SharedMemoryCache
+
+    shared = SharedMemoryCache(str(tmp_path / "shm"), arena_bytes=4096, slots=64, max_ttl=30)
+    cache = RedisCache("redis://localhost", shared=shared)
+    pipe = _pipeline(mock_redis)
+    pipe.execute.return_value = [b'{"a": 1}', 2]
+    assert await cache.get("bgpq4:AS-A") == {"a": 1}
+    pipe.execute.return_value = [b'{"b": 2}', 2]
+    assert await cache.get_many(["bgpq4:AS-B"]) == [{"b": 2}]
+
+    with patch("app.shared_cache.time.time", return_value=time.time() + 5):
+        assert shared.get("bgpq4:AS-A") is None
+        assert shared.get("bgpq4:AS-B") is None
+
+
+@pytest.fixture
+def sharded_redis():
+    from unittest.mock import MagicMock
+
+    clients = {}
+
+    def from_url(url, **options):
+        client = AsyncMock()
+        client.get.return_value = None
+        client.mget.side_effect = lambda keys: [f'"{url}"'.encode() for _ in keys]
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(side_effect=lambda: [True] * len(pipe.setex.call_args_list))
+        client.pipeline = MagicMock(return_value=pipe)
+        clients[url] = client
+        return client
+
+    with patch("app.cache.redis.from_url", side_effect=from_url):
+        yield clients
+
+
+@pytest.mark.asyncio
+async def test_sharded_cache_routes_keys_by_ring(sharded_redis):
+    urls = ["redis://a", "redis://b", "redis://c"]
+    cache = RedisCache("redis://jobs", shard_urls=urls)
+    keys = [f"bgpq4:AS{i}" for i in range(30)]
+
+    values = await cache.get_many(keys)
+    # Each key was read from the node owning it, one MGET per node
+    assert values == [cache.ring.node_for(key) for key in keys]
+    assert set(sharded_redis) == set(urls)
+    for url, client in sharded_redis.items():
+        client.mget.assert_awaited_once()
+
+    await cache.write_many([(key, "{}", 60) for key in keys])
+    for url, client in sharded_redis.items():
+        written = [call.args[0] for call in client.pipeline().setex.call_args_list]
+        assert written and all(cache.ring.node_for(key) == url for key in written)
+
+    await cache.get("bgpq4:AS1")
+    sharded_redis[cache.ring.node_for("bgpq4:AS1")].get.assert_awaited_once_with("bgpq4:AS1")
+    assert "redis://jobs" not in sharded_redis
+
+
+@pytest.mark.asyncio
+async def test_sharded_scan_visits_every_node(sharded_redis):
+    cache = RedisCache("redis://jobs", shard_urls=["redis://a", "redis://b"])
+    for node in cache.ring.nodes:
+        client = await cache.get_client(node)
+
+        async def scan_iter(match, count, node=node):
+            yield f"bgpq4:{node}".encode()
+
+        client.scan_iter = scan_iter
+    assert sorted([key async for key in cache.scan_keys("bgpq4:*")]) == [
+        "bgpq4:redis://a",
+        "bgpq4:redis://b",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cluster_cache_uses_non_atomic_mget():
+    with patch("app.cache.redis.RedisCluster.from_url") as from_url:
+        client = AsyncMock()
+        client.mget_nonatomic.return_value = [b"{}", None]
+        from_url.return_value = client
+        cache = RedisCache("redis://cluster:7000", cluster=True)
+        assert await cache.get_many(["a", "b"]) == [{}, None]
+        client.mget.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_delete_many_pipelines_and_drops_pending(mock_redis):
+    pipe = _pipeline(mock_redis)
+    cache = RedisCache("redis://localhost", write_behind_max_pending=100)
+    await cache.set("a", {}, ttl=60)
+    await cache.delete_many(["a", "b"])
+    assert len(cache.write_behind) == 0
+    assert [call.args[0] for call in pipe.delete.call_args_list] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_eval_many_and_scan_hash(mock_redis):
+    pipe = _pipeline(mock_redis)
+    pipe.execute.return_value = [0, 1]
+    cache = RedisCache("redis://localhost")
+    calls = [(["t1", "{t1}:expiry"], ["key", "{}"]), (["t2", "{t2}:expiry"], ["key", "{}"])]
+    assert await cache.eval_many("script", calls) == [0, 1]
+    pipe.eval.assert_any_call("script", 2, "t2", "{t2}:expiry", "key", "{}")
+
+    pipe.execute.side_effect = Exception("down")
+    with pytest.raises(CacheError):
+        await cache.eval_many("script", calls)
+
+    async def hscan_iter(key, count):
+        yield b"key", b"{}"
+
+    mock_redis.hscan_iter = hscan_iter
+    assert [item async for item in cache.scan_hash("t1")] == [("key", "{}")]
+
+
+@pytest.mark.asyncio
+async def test_hset_and_hgetall(mock_redis):
+    pipe = _pipeline(mock_redis)
+    pipe.execute.return_value = [2, True]
+    cache = RedisCache("redis://localhost")
+    await cache.hset("job:j1", {"status": "pending"}, 600)
+    pipe.hset.assert_called_once_with("job:j1", mapping={"status": "pending"})
+    pipe.expire.assert_called_once_with("job:j1", 600)
+
+    mock_redis.hgetall.return_value = {b"status": b"pending"}
+    assert await cache.hgetall("job:j1") == {"status": "pending"}
+
+    mock_redis.hgetall.side_effect = Exception("down")
+    with pytest.raises(CacheError):
+        await cache.hgetall("job:j1")
+
+
+@pytest.mark.asyncio
+async def test_publish_and_pubsub(mock_redis):
+    cache = RedisCache("redis://localhost")
+    await cache.publish("jobs:events", "{}")
+    mock_redis.publish.assert_awaited_once_with("jobs:events", "{}")
+    mock_redis.pubsub = lambda: "pubsub"
+    assert await cache.pubsub("jobs:events") == "pubsub"
+
+    mock_redis.publish.side_effect = Exception("down")
+    with pytest.raises(CacheError):
+        await cache.publish("jobs:events", "{}")
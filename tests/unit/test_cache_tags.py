@@ -0,0 +1,134 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.cache_tags import TAG_SCRIPT, CacheTags
+from app.exceptions import CacheError
+from app.models.query import CanonicalQuery
+
+
+def _cache(hashes):
+    cache = AsyncMock()
+
+    async def scan_hash(key, count=1000):
+        for field, value in hashes.get(key, {}).items():
+            yield field, json.dumps(value)
+
+    cache.scan_hash = MagicMock(side_effect=scan_hash)
+    return cache
+
+
+def test_tags_of_a_query():
+    tags = CacheTags(AsyncMock())
+    assert tags.tags(CanonicalQuery.normalize("AS-EXAMPLE", ["RADB", "RIPE"])) == [
+        "tag:target:AS-EXAMPLE",
+        "tag:source:RADB",
+        "tag:source:RIPE",
+    ]
+    assert tags.tags(CanonicalQuery.normalize("as64500", ["RADB"]))[-1] == "tag:asn:64500"
+
+
+@pytest.mark.asyncio
+async def test_record_indexes_query_under_each_tag():
+    cache = AsyncMock()
+    tags = CacheTags(cache, ttl=900)
+    query = CanonicalQuery.normalize("AS-EXAMPLE", ["RADB"])
+    with patch("app.cache_tags.time.time", return_value=1000.4):
+        await tags.record("bgpq4:key", query, "as_set")
+
+    script, calls = cache.eval_many.call_args.args
+    assert script == TAG_SCRIPT
+    assert [keys for keys, _ in calls] == [
+        ["tag:target:AS-EXAMPLE", "{tag:target:AS-EXAMPLE}:expiry"],
+        ["tag:source:RADB", "{tag:source:RADB}:expiry"],
+    ]
+    field, spec, now, ttl, limit = calls[0][1]
+    assert (field, now, ttl, limit) == ("bgpq4:key", 1000, 900, 500)
+    assert json.loads(spec) == {
+        "target": "AS-EXAMPLE",
+        "sources": ["RADB"],
+        "aggregate": False,
+        "min_masklen": None,
+        "max_masklen": None,
+        "format": "json",
+        "resource": "as_set",
+    }
+
+
+@pytest.mark.asyncio
+async def test_record_is_best_effort():
+    cache = AsyncMock()
+    cache.eval_many.side_effect = CacheError("down")
+    await CacheTags(cache).record("k", CanonicalQuery.normalize("AS-A", ["RADB"]))
+
+    cache = AsyncMock()
+    await CacheTags(cache, enabled=False).record("k", CanonicalQuery.normalize("AS-A", ["RADB"]))
+    cache.eval_many.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_queries_read_from_target_tags():
+    cache = AsyncMock()
+    cache.hget_many.return_value = [json.dumps({"target": "AS-A"}), None]
+    keys = ["bgpq4:v2:json:abc:AS-A", "bgpq4:v2:json:def:AS-B"]
+
+    assert await CacheTags(cache).queries(keys) == [{"target": "AS-A"}, None]
+    cache.hget_many.assert_awaited_once_with(["tag:target:AS-A", "tag:target:AS-B"], keys)
+    assert await CacheTags(cache, enabled=False).queries(keys) == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_restore_records_the_recorded_query():
+    cache = AsyncMock()
+    query = CanonicalQuery.normalize("AS-A", ["RADB"], min_masklen=24)
+    spec = {**query.model_dump(), "sources": ["RADB"], "resource": "as_set"}
+
+    await CacheTags(cache).restore("bgpq4:key", spec)
+
+    _, calls = cache.eval_many.call_args.args
+    assert [keys[0] for keys, _ in calls] == ["tag:target:AS-A", "tag:source:RADB"]
+    field, recorded, *_ = calls[0][1]
+    assert field == "bgpq4:key"
+    assert json.loads(recorded) == spec
+
+
+HASHES = {
+    "tag:target:AS-A": {"k1": {"target": "AS-A"}, "k2": {"target": "AS-A"}},
+    "tag:source:RADB": {"k2": {"target": "AS-A"}, "k3": {"target": "AS-B"}},
+}
+
+
+@pytest.mark.asyncio
+async def test_invalidate_delete_in_batches():
+    cache = _cache(HASHES)
+    tags = CacheTags(cache, batch_size=2)
+    count = await tags.invalidate(["tag:target:AS-A", "tag:source:RADB"])
+
+    # k2 is under both tags but counted once
+    assert count == 3
+    batches = [call.args[0] for call in cache.delete_many.call_args_list]
+    assert batches[0] == ["k1", "k2", "negative:k1", "negative:k2", "stale:k1", "stale:k2"]
+    assert batches[1] == ["k3", "negative:k3", "stale:k3"]
+    assert batches[2] == [
+        "tag:target:AS-A",
+        "tag:source:RADB",
+        "{tag:target:AS-A}:expiry",
+        "{tag:source:RADB}:expiry",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_invalidate_stale_keeps_stale_copies():
+    cache = _cache(HASHES)
+    assert await CacheTags(cache).invalidate(["tag:target:AS-A"], "stale") == 2
+    cache.delete_many.assert_awaited_once_with(["k1", "k2", "negative:k1", "negative:k2"])
+
+
+@pytest.mark.asyncio
+async def test_invalidate_refresh_reruns_queries():
+    cache = _cache(HASHES)
+    refresh = AsyncMock()
+    assert await CacheTags(cache).invalidate(["tag:source:RADB"], "refresh", refresh) == 2
+    refresh.assert_awaited_once_with([{"target": "AS-A"}, {"target": "AS-B"}])
+    cache.delete_many.assert_not_called()
@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakerRegistry
+from app.exceptions import CircuitOpenError
+
+
+def _breaker(**kwargs):
+    config = {"min_calls": 4, "failure_rate": 0.5, "open_seconds": 30.0, "slow_call_seconds": 5.0}
+    config.update(kwargs)
+    return CircuitBreaker("bgpq4:RADB", **config)
+
+
+def test_stays_closed_below_min_calls():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_error_rate_and_fails_fast():
+    breaker = _breaker()
+    for failed in (False, True, False, True):
+        breaker.allow()
+        breaker.record(failed, 0.1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as exc_info:
+        breaker.allow()
+    assert exc_info.value.breaker == "bgpq4:RADB"
+    assert 0 < exc_info.value.retry_after <= 30.0
+
+
+def test_slow_calls_count_as_failures():
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.allow()
+        breaker.record(False, 6.0)
+    assert breaker.state == OPEN
+
+
+def test_old_calls_leave_the_window():
+    breaker = _breaker(window_seconds=10.0)
+    with patch("app.circuit_breaker.time.monotonic", return_value=0.0):
+        for _ in range(3):
+            breaker.record(True, 0.1)
+    with patch("app.circuit_breaker.time.monotonic", return_value=20.0):
+        breaker.record(True, 0.1)
+        assert breaker.state == CLOSED
+        assert breaker.snapshot()["calls"] == 1
+
+
+def test_half_open_probe_closes_circuit():
+    breaker = _breaker()
+    with patch("app.circuit_breaker.time.monotonic", return_value=0.0):
+        for _ in range(4):
+            breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+
+    with patch("app.circuit_breaker.time.monotonic", return_value=31.0):
+        breaker.allow()
+        assert breaker.state == HALF_OPEN
+        # Only one probe at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+        breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.error_rate == 0.0
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = _breaker()
+    with patch("app.circuit_breaker.time.monotonic", return_value=0.0):
+        for _ in range(4):
+            breaker.record(True, 0.1)
+    with patch("app.circuit_breaker.time.monotonic", return_value=31.0):
+        breaker.allow()
+        breaker.record(True, 0.1)
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+
+
+def test_release_frees_probe_slot():
+    breaker = _breaker()
+    with patch("app.circuit_breaker.time.monotonic", return_value=0.0):
+        for _ in range(4):
+            breaker.record(True, 0.1)
+    with patch("app.circuit_breaker.time.monotonic", return_value=31.0):
+        breaker.allow()
+        breaker.release()
+        breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+
+def test_registry_creates_breakers_per_key():
+    registry = CircuitBreakerRegistry(min_calls=1, failure_rate=0.5)
+    registry.get("bgpq4:RADB").record(True, 0.1)
+    registry.get("bgpq4:RIPE").record(False, 0.1)
+    assert registry.get("bgpq4:RADB") is registry.get("bgpq4:RADB")
+    snapshot = registry.snapshot()
+    assert snapshot["bgpq4:RADB"]["state"] == OPEN
+    assert snapshot["bgpq4:RIPE"]["state"] == CLOSED
+
+
+def test_registry_evicts_least_recently_used_closed_breaker():
+    registry = CircuitBreakerRegistry(max_breakers=2, min_calls=1, failure_rate=0.5)
+    registry.get("bgpq4:A").record(True, 0.1)
+    closed = registry.get("bgpq4:B")
+    registry.get("bgpq4:C")
+    # The open breaker survives, the closed one goes
+    assert set(registry.snapshot()) == {"bgpq4:A", "bgpq4:C"}
+    assert registry.get("bgpq4:B") is not closed
@@ -20,3 +20,8 @@ def test_settings_from_env(monkeypatch):
     settings = Settings()
     assert settings.sync_timeout_ms == 2000
     assert settings.max_retries == 5
+
+
+def test_settings_job_lane_weights_from_string():
+    settings = Settings(job_lane_weights="interactive=4, bulk=2")
+    assert settings.job_lane_weights == {"interactive": 4, "bulk": 2}
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.budget import Deadline
+from app.exceptions import DeadlineExceededError, ExecutionPoolFullError
+from app.execution_pool import ExecutionPool
+
+
+@pytest.mark.asyncio
+async def test_limits_concurrency():
+    pool = ExecutionPool(max_concurrency=2, max_queue=10)
+    running = 0
+    peak = 0
+
+    async def work():
+        nonlocal running, peak
+        async with pool.slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(work() for _ in range(6)))
+    assert peak == 2
+    assert pool.active == 0
+    assert pool.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full():
+    pool = ExecutionPool(max_concurrency=1, max_queue=1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with pool.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert pool.active == 1
+    assert pool.waiting == 1
+
+    with pytest.raises(ExecutionPoolFullError) as exc_info:
+        async with pool.slot():
+            pass
+    assert exc_info.value.retry_after > 0
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+
+
+@pytest.mark.asyncio
+async def test_queue_wait_is_bounded_by_deadline():
+    pool = ExecutionPool(max_concurrency=1, max_queue=5)
+    release = asyncio.Event()
+
+    async def hold():
+        async with pool.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(DeadlineExceededError):
+        async with pool.slot(Deadline.after(0.01)):
+            pass
+    assert pool.waiting == 0
+
+    release.set()
+    await holder
+
+
+@pytest.mark.asyncio
+async def test_retry_after_tracks_hold_time():
+    pool = ExecutionPool(max_concurrency=1, max_queue=1, ewma_alpha=1.0)
+    async with pool.slot():
+        await asyncio.sleep(0.02)
+    assert pool.hold_seconds >= 0.02
+    assert pool.retry_after() == pytest.approx(pool.hold_seconds)
@@ -0,0 +1,54 @@
+import pytest
+
+from app.hashring import HashRing, routing_key
+
+NODES = [f"redis://cache-{i}:6379/0" for i in range(3)]
+KEYS = [f"bgpq4:AS{i}:default:False:none:none:json" for i in range(20000)]
+
+
+def test_routing_key_honours_hash_tags():
+    assert routing_key("{hotkeys}:cms:1") == "hotkeys"
+    assert routing_key("latency:{as_set}:AS-A") == "as_set"
+    assert routing_key("bgpq4:AS-A") == "bgpq4:AS-A"
+    # Empty tags hash the whole key, like Redis Cluster
+    assert routing_key("a{}b") == "a{}b"
+
+
+def test_keys_spread_evenly():
+    ring = HashRing(NODES)
+    counts = {node: 0 for node in NODES}
+    for key in KEYS:
+        counts[ring.node_for(key)] += 1
+    for count in counts.values():
+        assert abs(count - len(KEYS) / 3) < len(KEYS) * 0.05
+
+
+def test_adding_a_node_moves_few_keys():
+    before = HashRing(NODES)
+    after = HashRing([*NODES, "redis://cache-3:6379/0"])
+    moved = sum(before.node_for(key) != after.node_for(key) for key in KEYS)
+    # Ideally 1/4; never anything like a full reshuffle
+    assert moved / len(KEYS) < 0.3
+    assert all(
+        after.node_for(key) == "redis://cache-3:6379/0"
+        for key in KEYS
+        if before.node_for(key) != after.node_for(key)
+    )
+
+
+def test_tagged_keys_share_a_node():
+    ring = HashRing(NODES)
+    assert len({ring.node_for(f"{{hotkeys}}:query:{key}") for key in KEYS[:100]}) == 1
+
+
+def test_partition_keeps_positions():
+    ring = HashRing(NODES)
+    groups = ring.partition(KEYS[:50])
+    assert sorted(i for positions in groups.values() for i in positions) == list(range(50))
+    for node, positions in groups.items():
+        assert all(ring.node_for(KEYS[i]) == node for i in positions)
+
+
+def test_empty_ring_rejected():
+    with pytest.raises(ValueError):
+        HashRing([])
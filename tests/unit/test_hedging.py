@@ -0,0 +1,39 @@
+from app.budget import RetryBudget
+from app.hedging import HedgePolicy
+
+
+def test_default_delay_until_enough_samples():
+    policy = HedgePolicy("rr.ntt.net", default_delay=2.0, min_samples=5)
+    for _ in range(4):
+        policy.observe(0.1)
+    assert policy.delay() == 2.0
+
+
+def test_delay_is_recent_latency_percentile():
+    policy = HedgePolicy("rr.ntt.net", percentile=0.9, min_delay=0.0, min_samples=10)
+    for i in range(1, 101):
+        policy.observe(i / 100)
+    assert policy.delay() == 0.9
+
+
+def test_delay_has_a_floor():
+    policy = HedgePolicy("rr.ntt.net", min_delay=0.2, min_samples=1)
+    policy.observe(0.01)
+    assert policy.delay() == 0.2
+
+
+def test_window_forgets_old_samples():
+    policy = HedgePolicy("rr.ntt.net", min_delay=0.0, min_samples=1, window=10)
+    for _ in range(10):
+        policy.observe(5.0)
+    for _ in range(10):
+        policy.observe(0.5)
+    assert policy.delay() == 0.5
+
+
+def test_budget_caps_hedges():
+    policy = HedgePolicy("rr.ntt.net", budget=RetryBudget(rate=0.0, burst=2))
+    assert policy.try_acquire()
+    assert policy.try_acquire()
+    assert not policy.try_acquire()
+    assert HedgePolicy("rr.ntt.net").try_acquire()
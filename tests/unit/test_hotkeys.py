@@ -0,0 +1,124 @@
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.exceptions import CacheError
+from app.hotkeys import HitBuffer, HotKeyTracker
+from app.metrics import metrics
+
+
+@pytest.fixture
+def cache():
+    return AsyncMock()
+
+
+QUERY = {"target": "AS-EXAMPLE", "cache_ttl": 300}
+
+
+@pytest.mark.asyncio
+async def test_requests_are_counted_locally_until_flushed(cache):
+    cache.eval.return_value = [[], []]
+    tracker = HotKeyTracker(cache, top_k=10, window_seconds=60, depth=3, width=100)
+    for _ in range(3):
+        tracker.record("bgpq4:AS-EXAMPLE", QUERY, hit=False)
+    tracker.record("bgpq4:AS-OTHER", QUERY, hit=True)
+    assert not tracker.due
+    cache.eval.assert_not_called()
+
+    with patch("app.hotkeys.time.time", return_value=6000):
+        await tracker.flush()
+
+    _, keys, args = cache.eval.call_args[0]
+    assert keys == [
+        "{hotkeys}:cms:100",
+        "{hotkeys}:top:100",
+        "{hotkeys}:refreshed:bgpq4:AS-OTHER",
+    ]
+    assert args[:3] == [120, 10, 3]
+    # Per key: key, count, marker position in KEYS, one column per row
+    assert args[3:6] == ["bgpq4:AS-EXAMPLE", 3, 0]
+    assert args[6:9] == tracker._columns("bgpq4:AS-EXAMPLE")
+    assert args[9:12] == ["bgpq4:AS-OTHER", 1, 3]
+    assert all(0 <= column < 100 for column in args[6:9])
+    assert len(tracker.buffer) == 0
+
+    cache.eval.reset_mock()
+    await tracker.flush()
+    cache.eval.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_flush_stores_queries_of_keys_entering_top_k(cache):
+    cache.eval.return_value = [[b"bgpq4:AS-A"], [b"bgpq4:AS-B"]]
+    tracker = HotKeyTracker(cache, window_seconds=60)
+    tracker.record("bgpq4:AS-A", QUERY, hit=False)
+    tracker.record("bgpq4:AS-B", {**QUERY, "resource": "as_set"}, hit=True)
+    hits = metrics.hot_key_refresh_hits.labels(resource="as_set")
+    before = hits._value.get()
+
+    await tracker.flush()
+
+    cache.write_many.assert_awaited_once_with(
+        [("{hotkeys}:query:bgpq4:AS-A", json.dumps(QUERY), 120)]
+    )
+    assert hits._value.get() == before + 1
+
+
+@pytest.mark.asyncio
+async def test_record_flushes_in_background_when_due(cache):
+    cache.eval.return_value = [[], []]
+    tracker = HotKeyTracker(cache, max_pending=2)
+    tracker.record("a", QUERY, hit=False)
+    assert tracker.buffer.flusher is None
+    tracker.record("b", QUERY, hit=False)
+    await tracker.buffer.flusher
+    cache.eval.assert_awaited_once()
+    assert len(tracker.buffer) == 0
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_shared_by_trackers(cache):
+    buffer = HitBuffer()
+    HotKeyTracker(cache, buffer=buffer).record("k", QUERY, hit=False)
+    HotKeyTracker(cache, buffer=buffer).record("k", QUERY, hit=False)
+    assert buffer.counts == {"k": 2}
+
+
+@pytest.mark.asyncio
+async def test_record_disabled_and_flush_errors(cache):
+    tracker = HotKeyTracker(cache, top_k=0)
+    tracker.record("k", QUERY, hit=False)
+    assert len(tracker.buffer) == 0
+
+    cache.eval.side_effect = CacheError("down")
+    tracker = HotKeyTracker(cache)
+    tracker.record("k", QUERY, hit=False)
+    # Counts are dropped, never raised
+    await tracker.flush()
+    assert len(tracker.buffer) == 0
+
+
+@pytest.mark.asyncio
+async def test_hottest_merges_windows(cache):
+    cache.top_scores.return_value = [
+        [("a", 10.0), ("b", 3.0), ("c", 1.0)],
+        [("b", 20.0), ("d", 4.0)],
+    ]
+    cache.get_many.return_value = [{"target": "B"}, {"target": "A"}, None]
+    tracker = HotKeyTracker(cache, top_k=3, min_hits=4)
+
+    hottest = await tracker.hottest()
+
+    assert hottest == [("b", 23, {"target": "B"}), ("a", 10, {"target": "A"})]
+    cache.get_many.assert_called_once_with(
+        ["{hotkeys}:query:b", "{hotkeys}:query:a", "{hotkeys}:query:d"]
+    )
+
+
+@pytest.mark.asyncio
+async def test_mark_refreshed(cache):
+    await HotKeyTracker(cache).mark_refreshed("k", 300)
+    key, _, ttl = cache.set.call_args[0]
+    assert key == "{hotkeys}:refreshed:k"
+    assert ttl == 300
@@ -0,0 +1,93 @@
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+
+from app.irr_mirrors import MirrorPool
+
+
+def _pool(**kwargs):
+    return MirrorPool(["irr1.example.net", "irr2.example.net:43", "irr3.example.net"], **kwargs)
+
+
+def test_requires_a_mirror():
+    with pytest.raises(ValueError):
+        MirrorPool([])
+
+
+def test_load_spreads_evenly_across_equal_mirrors():
+    pool = _pool()
+    picks = Counter()
+    for _ in range(300):
+        mirror = pool.acquire()
+        picks[mirror.address] += 1
+        pool.release(mirror, 0.5, failed=False)
+    assert len(picks) == 3
+    assert min(picks.values()) > 60
+
+
+def test_in_flight_steers_away_from_busy_mirror():
+    pool = MirrorPool(["irr1.example.net", "irr2.example.net"])
+    busy = pool.acquire()
+    assert pool.acquire() is not busy
+
+
+def test_slow_mirror_gets_less_traffic():
+    pool = _pool()
+    for mirror in pool.mirrors:
+        mirror.latency = 5.0 if mirror.address == "irr1.example.net" else 0.5
+    picks = Counter()
+    for _ in range(300):
+        mirror = pool.acquire()
+        picks[mirror.address] += 1
+        pool.release(mirror, mirror.latency, failed=False)
+    assert picks["irr1.example.net"] < picks["irr2.example.net:43"] / 5
+
+
+def test_latency_is_an_ewma():
+    pool = _pool(ewma_alpha=0.5)
+    mirror = pool.mirrors[0]
+    mirror.in_flight = 2
+    pool.release(mirror, 1.0, failed=False)
+    pool.release(mirror, 3.0, failed=False)
+    assert mirror.latency == 2.0
+    assert mirror.in_flight == 0
+
+
+def test_cancelled_run_only_raises_latency():
+    pool = _pool()
+    mirror = pool.mirrors[0]
+    mirror.latency = 1.0
+    mirror.in_flight = 2
+    pool.release(mirror, 0.1, failed=None)
+    assert mirror.latency == 1.0
+    pool.release(mirror, 2.0, failed=None)
+    assert mirror.latency > 1.0
+
+
+def test_consecutive_failures_eject_mirror():
+    pool = _pool(eject_failures=2, eject_seconds=30)
+    bad = pool.mirrors[0]
+    bad.in_flight = 3
+    pool.release(bad, 0.1, failed=True)
+    pool.release(bad, 0.1, failed=False)
+    pool.release(bad, 0.1, failed=True)
+    assert pool.snapshot()["irr1.example.net"]["ejected"] is False
+
+    pool.release(bad, 0.1, failed=True)
+    assert pool.snapshot()["irr1.example.net"]["ejected"] is True
+    for _ in range(50):
+        mirror = pool.acquire()
+        assert mirror is not bad
+        pool.release(mirror, 0.1, failed=False)
+
+    with patch("app.irr_mirrors.time.monotonic", return_value=bad.ejected_until + 1):
+        assert pool.snapshot()["irr1.example.net"]["ejected"] is False
+
+
+def test_ejection_is_capped():
+    pool = _pool(eject_failures=1, max_ejected_fraction=0.5)
+    for mirror in pool.mirrors:
+        mirror.in_flight = 1
+        pool.release(mirror, 0.1, failed=True)
+    assert sum(state["ejected"] for state in pool.snapshot().values()) == 1
@@ -0,0 +1,79 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.exceptions import CacheError
+from app.job_events import JobEvents
+
+
+class FakePubSub:
+    """Pub/sub connection delivering queued messages."""
+
+    def __init__(self):
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self.subscribe = AsyncMock()
+        self.reset = AsyncMock()
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except TimeoutError:
+            return None
+
+    def send(self, job_id, status):
+        data = json.dumps({"job_id": job_id, "status": status}).encode()
+        self.messages.put_nowait({"type": "message", "data": data})
+
+
+@pytest.mark.asyncio
+async def test_publish_sends_status_on_channel():
+    cache = AsyncMock()
+    await JobEvents(cache, channel="jobs:events").publish("j1", "completed")
+    channel, message = cache.publish.call_args.args
+    assert channel == "jobs:events"
+    assert json.loads(message) == {"job_id": "j1", "status": "completed"}
+
+
+@pytest.mark.asyncio
+async def test_publish_errors_are_swallowed():
+    cache = AsyncMock()
+    cache.publish.side_effect = CacheError("down")
+    await JobEvents(cache).publish("j1", "completed")
+
+
+@pytest.mark.asyncio
+async def test_watchers_get_their_jobs_events_over_one_subscription():
+    pubsub = FakePubSub()
+    cache = MagicMock()
+    cache.pubsub = AsyncMock(return_value=pubsub)
+    events = JobEvents(cache)
+
+    async with events.watch("j1") as first, events.watch("j1") as second:
+        async with events.watch("j2") as other:
+            pubsub.send("j1", "completed")
+            pubsub.messages.put_nowait({"type": "message", "data": b"not json"})
+            assert await asyncio.wait_for(first.get(), 1) == "completed"
+            assert await asyncio.wait_for(second.get(), 1) == "completed"
+            assert other.empty()
+
+    cache.pubsub.assert_awaited_once()
+    pubsub.subscribe.assert_awaited_once_with("jobs:events")
+    assert events._watchers == {}
+    await events.close()
+    pubsub.reset.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_subscription_is_reopened_after_failure():
+    pubsub = FakePubSub()
+    cache = MagicMock()
+    cache.pubsub = AsyncMock(side_effect=[ConnectionError("down"), pubsub])
+    events = JobEvents(cache, reconnect_seconds=0)
+
+    async with events.watch("j1") as updates:
+        await asyncio.wait_for(events._subscribed.wait(), 1)
+        pubsub.send("j1", "failed")
+        assert await asyncio.wait_for(updates.get(), 1) == "failed"
+    await events.close()
@@ -0,0 +1,201 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.exceptions import CacheError
+from app.job_store import CANCEL_SCRIPT, CREATE_SCRIPT, JobStore
+from app.models.query import CanonicalQuery
+
+
+@pytest.mark.asyncio
+async def test_job_store_lifecycle_writes_small_fields():
+    cache = AsyncMock()
+    store = JobStore(cache, ttl=600)
+
+    await store.create("j1", "t1", rov="drop")
+    await store.start("j1")
+    await store.complete("j1", "bgpq4:v2:json:abc:AS-A", 1200)
+
+    records = [call.args for call in cache.hset.call_args_list]
+    assert all(key == "job:j1" and ttl == 600 for key, _, ttl in records)
+    statuses = [record["status"] for _, record, _ in records]
+    assert statuses == ["pending", "processing", "completed"]
+    assert records[0][1]["rov"] == "drop"
+    assert records[0][1]["client:t1"] == "1"
+    assert records[2][1]["result_key"] == "bgpq4:v2:json:abc:AS-A"
+    assert records[2][1]["execution_time_ms"] == "1200"
+
+
+@pytest.mark.asyncio
+async def test_job_store_skips_unset_fields():
+    cache = AsyncMock()
+    await JobStore(cache).create("j1", "t1")
+    assert "rov" not in cache.hset.call_args.args[1]
+
+
+@pytest.mark.asyncio
+async def test_job_store_fail_records_error():
+    cache = AsyncMock()
+    await JobStore(cache).fail("j1", "bgpq4 failed", 30)
+    record = cache.hset.call_args.args[1]
+    assert record["status"] == "failed"
+    assert record["error"] == "bgpq4 failed"
+    assert "finished_at" in record
+
+
+@pytest.mark.asyncio
+async def test_job_store_write_errors_are_swallowed():
+    cache = AsyncMock()
+    cache.hset.side_effect = CacheError("down")
+    await JobStore(cache).start("j1")
+
+
+@pytest.mark.asyncio
+async def test_job_store_get_parses_numbers():
+    cache = AsyncMock()
+    cache.hgetall.return_value = {
+        "status": "completed",
+        "created_at": "1700000000.5",
+        "execution_time_ms": "42",
+        "result_key": "bgpq4:v2:json:abc:AS-A",
+    }
+    record = await JobStore(cache).get("j1")
+    cache.hgetall.assert_awaited_once_with("job:j1")
+    assert record["created_at"] == 1700000000.5
+    assert record["execution_time_ms"] == 42
+
+
+@pytest.mark.asyncio
+async def test_job_store_get_missing():
+    cache = AsyncMock()
+    cache.hgetall.return_value = {}
+    assert await JobStore(cache).get("nope") is None
+
+
+def test_job_store_new_id_is_content_addressed():
+    store = JobStore(AsyncMock(), dedup_window=300)
+    query = CanonicalQuery.normalize("as-hurricane", default_sources=["RADB"])
+    same = CanonicalQuery.normalize("AS-HURRICANE", ["radb"])
+    other = CanonicalQuery.normalize("AS-HURRICANE", ["RIPE"])
+
+    assert store.new_id(query) == store.new_id(same)
+    assert store.new_id(query) != store.new_id(other)
+    assert store.new_id(query) != store.new_id(query, rov="drop")
+    # Without a window every job is distinct
+    assert JobStore(AsyncMock()).new_id(query) != JobStore(AsyncMock()).new_id(query)
+
+
+@pytest.mark.asyncio
+async def test_job_store_create_deduplicates_through_script():
+    cache = AsyncMock()
+    store = JobStore(cache, ttl=600, dedup_window=300)
+
+    cache.eval.return_value = [1, b"n1"]
+    assert await store.create("d1", "t1", rov="drop") == ("d1.n1", True)
+    script, keys, args = cache.eval.call_args.args
+    assert script == CREATE_SCRIPT
+    assert keys == ["job:{d1}"]
+    assert args[:2] == [600, 300]
+    assert args[3] == "t1"
+    fields = dict(zip(args[4::2], args[5::2], strict=True))
+    assert fields == {
+        "status": "pending",
+        "created_at": fields["created_at"],
+        "clients": "1",
+        "rov": "drop",
+    }
+
+    # A duplicate only adds its own token to the running job
+    cache.eval.return_value = [0, b"n1"]
+    assert await store.create("d1", "t2") == ("d1.n1", False)
+    assert cache.eval.call_args.args[2][3] == "t2"
+    cache.hset.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_job_store_create_never_reuses_an_id():
+    cache = AsyncMock()
+    store = JobStore(cache, dedup_window=300)
+
+    cache.eval.side_effect = lambda script, keys, args: [1, args[2]]
+    first, _ = await store.create("d1", "t1")
+    second, _ = await store.create("d1", "t2")
+    # A finished job's record stays readable under its own ID
+    assert first != second
+    assert first.startswith("d1.") and second.startswith("d1.")
+
+
+def test_job_store_keys_of_deduplicated_jobs_share_a_slot():
+    assert JobStore.key("d1.n1") == "job:{d1}:n1"
+    assert JobStore.dedup_key("d1") == "job:{d1}"
+    assert JobStore.key("550e8400-e29b-41d4-a716-446655440000") == (
+        "job:550e8400-e29b-41d4-a716-446655440000"
+    )
+
+
+@pytest.mark.asyncio
+async def test_job_store_record_cancelled_marks_the_worker_stopped():
+    cache = AsyncMock()
+    await JobStore(cache).record_cancelled("j1", 20)
+    key, mapping, _ = cache.hset.call_args.args
+    assert mapping["status"] == "cancelled"
+    assert mapping["stopped_at"] == mapping["finished_at"]
+
+
+@pytest.mark.asyncio
+async def test_job_store_create_runs_job_when_redis_fails():
+    cache = AsyncMock()
+    cache.eval.side_effect = CacheError("down")
+    assert await JobStore(cache, dedup_window=300).create("j1", "t1") == ("j1", True)
+
+
+@pytest.mark.asyncio
+async def test_job_store_publishes_transitions():
+    events = AsyncMock()
+    store = JobStore(AsyncMock(), events=events)
+    await store.start("j1")
+    await store.complete("j1", "bgpq4:v2:json:abc:AS-A", 10)
+    assert [call.args for call in events.publish.call_args_list] == [
+        ("j1", "processing"),
+        ("j1", "completed"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_job_store_cancel_running_job():
+    cache = AsyncMock()
+    cache.eval.return_value = [b"processing", b"cancelled"]
+    events = AsyncMock()
+    store = JobStore(cache, ttl=600, events=events)
+
+    assert await store.cancel("j1", "t1") == "cancelled"
+    assert cache.eval.call_args.args[:2] == (CANCEL_SCRIPT, ["job:j1"])
+    ttl, _, token = cache.eval.call_args.args[2]
+    assert (ttl, token) == (600, "t1")
+    events.publish.assert_awaited_once_with("j1", "cancelled")
+
+
+@pytest.mark.asyncio
+async def test_job_store_cancel_shared_job_only_withdraws_the_client():
+    cache = AsyncMock()
+    # Another client still waits on the job
+    cache.eval.return_value = [b"processing", b"processing"]
+    events = AsyncMock()
+
+    assert await JobStore(cache, events=events).cancel("j1", "t1") == "processing"
+    events.publish.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_job_store_cancel_finished_or_unknown_job():
+    cache = AsyncMock()
+    events = AsyncMock()
+    store = JobStore(cache, events=events)
+
+    cache.eval.return_value = ["completed", "completed"]
+    assert await store.cancel("j1", "t1") == "completed"
+    cache.eval.return_value = ["cancelled", "cancelled"]
+    assert await store.cancel("j1", "t1") == "cancelled"
+    cache.eval.return_value = None
+    assert await store.cancel("j2", "t1") is None
+    events.publish.assert_not_called()
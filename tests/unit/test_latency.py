@@ -0,0 +1,55 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.exceptions import CacheError
+from app.latency import LatencyTracker
+
+
+@pytest.fixture
+def cache():
+    return AsyncMock()
+
+
+@pytest.mark.asyncio
+async def test_record_updates_target_and_resource(cache):
+    tracker = LatencyTracker(cache, alpha=0.5, stats_ttl=60)
+    await tracker.record("as_set", "as-example", 1500.0)
+    script, keys, args = cache.eval.call_args[0]
+    assert keys == ["latency:{as_set}:AS-EXAMPLE", "latency:{as_set}"]
+    assert args == [1500.0, 0.5, 60]
+
+
+@pytest.mark.asyncio
+async def test_record_swallows_cache_errors(cache):
+    cache.eval.side_effect = CacheError("down")
+    tracker = LatencyTracker(cache)
+    await tracker.record("as_set", "AS-EXAMPLE", 100.0)
+
+
+@pytest.mark.asyncio
+async def test_predict_prefers_target_stats(cache):
+    cache.hmget_many.return_value = [[b"20000", b"1000", b"5"], [b"800", b"50", b"100"]]
+    tracker = LatencyTracker(cache, min_samples=3)
+    assert await tracker.predict("as_set", "AS-EXAMPLE") == 21000
+
+
+@pytest.mark.asyncio
+async def test_predict_falls_back_to_resource(cache):
+    cache.hmget_many.return_value = [[b"20000", b"0", b"1"], [b"800", b"50", b"100"]]
+    tracker = LatencyTracker(cache, min_samples=3)
+    assert await tracker.predict("as_set", "AS-EXAMPLE") == 850
+
+
+@pytest.mark.asyncio
+async def test_predict_unknown(cache):
+    cache.hmget_many.return_value = [[None, None, None], [None, None, None]]
+    tracker = LatencyTracker(cache)
+    assert await tracker.predict("as_set", "AS-EXAMPLE") is None
+
+
+@pytest.mark.asyncio
+async def test_predict_cache_error(cache):
+    cache.hmget_many.side_effect = CacheError("down")
+    tracker = LatencyTracker(cache)
+    assert await tracker.predict("as_set", "AS-EXAMPLE") is None
@@ -50,3 +50,21 @@ def test_increment_decrement_active_jobs():
     assert metrics.active_jobs._value.get() == initial + 1
     metrics.decrement_active_jobs()
     assert metrics.active_jobs._value.get() == initial
+
+
+def test_track_job_duplicate():
+    """Test deduplicated job submission tracking."""
+    labeled = metrics.job_duplicates.labels(resource="as_set")
+    initial = labeled._value.get()
+    metrics.track_job_duplicate("as_set")
+    assert labeled._value.get() == initial + 1
+
+
+def test_track_job_cancelled():
+    """Test cancelled job tracking with reclaimed worker time."""
+    cancelled = metrics.jobs_cancelled.labels(stage="running")
+    reclaimed = metrics.job_cancel_reclaimed.labels(stage="running")
+    initial = cancelled._value.get(), reclaimed._value.get()
+    metrics.track_job_cancelled("running", 2.5)
+    assert cancelled._value.get() == initial[0] + 1
+    assert reclaimed._value.get() == initial[1] + 2.5
@@ -2,6 +2,7 @@ import pytest
 from pydantic import ValidationError
 
 from app.models.job import JobStatus
+from app.models.query import CanonicalQuery
 from app.models.requests import BGPQueryRequest
 from app.models.responses import AsyncResponse, SyncResponse
 
@@ -27,6 +28,51 @@ def test_bgp_query_request_invalid_masklen():
         BGPQueryRequest(target="AS-HURRICANE", min_masklen=129)
 
 
+def test_canonical_query_spellings_are_equal():
+    defaults = ["RADB", "RIPE"]
+    canonical = CanonicalQuery.normalize("AS-HURRICANE", default_sources=defaults)
+    assert canonical.sources == ("RADB", "RIPE")
+    assert CanonicalQuery.normalize(" as-hurricane ", default_sources=defaults) == canonical
+    assert CanonicalQuery.normalize("AS-HURRICANE", ["radb", "RIPE", "RADB"]) == canonical
+    assert CanonicalQuery.normalize("AS-HURRICANE", [" RADB ", "ripe", ""]) == canonical
+    assert CanonicalQuery.normalize("AS-HURRICANE", format="JSON", default_sources=defaults) == (
+        canonical
+    )
+
+
+def test_canonical_query_source_prefix():
+    canonical = CanonicalQuery.normalize("radb::as-hurricane", default_sources=["RIPE"])
+    assert (canonical.target, canonical.sources) == ("AS-HURRICANE", ("RADB",))
+    assert CanonicalQuery.normalize("RADB::AS-HURRICANE", ["RIPE", "RADB"]) == canonical
+    with pytest.raises(ValueError):
+        CanonicalQuery.normalize("RADB::AS-HURRICANE", ["RIPE"])
+    with pytest.raises(ValueError):
+        CanonicalQuery.normalize("RADB::")
+
+
+def test_canonical_query_keeps_zero_masklen():
+    unset = CanonicalQuery.normalize("AS-HURRICANE", ["RADB"])
+    zero = CanonicalQuery.normalize("AS-HURRICANE", ["RADB"], min_masklen=0)
+    assert unset != zero
+    assert unset.digest() != zero.digest()
+    # Source order is IRR priority, not spelling
+    assert unset.digest() != CanonicalQuery.normalize("AS-HURRICANE", ["RADB", "RIPE"]).digest()
+
+
+def test_canonical_query_allowed_sources():
+    allowed = ["RADB", "RIPE"]
+    query = CanonicalQuery.normalize("AS-A", ["radb"], allowed_sources=allowed)
+    assert query.sources == ("RADB",)
+    # Defaults are always allowed
+    assert CanonicalQuery.normalize(
+        "AS-A", ["ARIN"], default_sources=["ARIN"], allowed_sources=allowed
+    )
+    with pytest.raises(ValueError, match="Unknown IRR source: XYZ"):
+        CanonicalQuery.normalize("AS-A", ["RADB", "xyz"], allowed_sources=allowed)
+    with pytest.raises(ValueError):
+        CanonicalQuery.normalize("XYZ::AS-A", allowed_sources=allowed)
+
+
 def test_sync_response_structure():
     resp = SyncResponse(
         status="completed",
@@ -43,9 +89,11 @@ def test_async_response_structure():
         status="processing",
         job_id="test-job-id",
         poll_url="/api/v1/jobs/test-job-id",
+        cancel_token="t1",
     )
     assert resp.status == "processing"
     assert resp.job_id == "test-job-id"
+    assert resp.cancel_token == "t1"
 
 
 def test_job_status_enum():
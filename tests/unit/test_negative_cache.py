@@ -0,0 +1,128 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.exceptions import BGPq4PermanentError, CacheError
+from app.negative_cache import BLOOM_KEY, BloomFilter, NegativeCache, describe_failure
+
+
+def _failure(stderr="ERROR: AS-TYPO: no such object"):
+    return BGPq4PermanentError(message="bgpq4 failed", return_code=1, stderr=stderr)
+
+
+def test_bloom_filter_membership():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"bgpq4:AS-{i}")
+    assert all(f"bgpq4:AS-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"bgpq4:AS-OTHER-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+@pytest.mark.asyncio
+async def test_record_and_get():
+    cache = AsyncMock()
+    negative = NegativeCache(cache, ttl=60)
+
+    await negative.record("bgpq4:AS-TYPO", _failure())
+    cache.set.assert_awaited_once_with(
+        "negative:bgpq4:AS-TYPO",
+        {"error": "ERROR: AS-TYPO: no such object", "return_code": 1},
+        60,
+    )
+
+    cache.get.return_value = {"error": "ERROR: AS-TYPO: no such object", "return_code": 1}
+    assert (await negative.get("bgpq4:AS-TYPO"))["return_code"] == 1
+    cache.get.assert_awaited_once_with("negative:bgpq4:AS-TYPO")
+
+
+@pytest.mark.asyncio
+async def test_bloom_skips_lookup_for_unknown_keys():
+    cache = AsyncMock()
+    cache.get.return_value = {"error": "no such object", "return_code": 1}
+    cache.dump_many.return_value = [(None, -2)]
+    negative = NegativeCache(cache, ttl=60, bloom=BloomFilter(capacity=100))
+
+    assert await negative.get("bgpq4:AS-GOOD") is None
+    cache.get.assert_not_awaited()
+
+    await negative.record("bgpq4:AS-TYPO", _failure())
+    assert await negative.get("bgpq4:AS-TYPO") is not None
+
+
+def _shared_bits():
+    """A cache mock keeping Bloom filter bits the way Redis SETBIT does."""
+    bits = bytearray()
+    cache = AsyncMock()
+
+    async def eval(script, keys, args):
+        assert keys == [BLOOM_KEY]
+        for offset in args:
+            if offset >> 3 >= len(bits):
+                bits.extend(bytes((offset >> 3) + 1 - len(bits)))
+            bits[offset >> 3] |= 0x80 >> (offset & 7)
+
+    async def dump_many(keys):
+        return [(bytes(bits) or None, -1)]
+
+    cache.eval.side_effect = eval
+    cache.dump_many.side_effect = dump_many
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_bloom_is_shared_between_processes():
+    cache = _shared_bits()
+    cache.get.return_value = {"error": "no such object", "return_code": 1}
+    recorder = NegativeCache(cache, ttl=60, bloom=BloomFilter(capacity=100))
+    replica = NegativeCache(cache, ttl=60, bloom=BloomFilter(capacity=100), bloom_sync_seconds=10)
+
+    await recorder.record("bgpq4:AS-TYPO", _failure())
+    # The replica's first lookup merges the shared bits in the background
+    assert await replica.get("bgpq4:AS-TYPO") is None
+    await replica.bloom.sync_task
+    assert await replica.get("bgpq4:AS-TYPO") is not None
+    cache.get.assert_awaited_once_with("negative:bgpq4:AS-TYPO")
+
+    # Merged again only once the sync interval has passed
+    await recorder.record("bgpq4:AS-OTHER", _failure())
+    assert await replica.get("bgpq4:AS-OTHER") is None
+    assert cache.dump_many.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_bloom_sync_failure_keeps_local_filter():
+    cache = AsyncMock()
+    cache.dump_many.side_effect = CacheError("down")
+    negative = NegativeCache(cache, ttl=60, bloom=BloomFilter(capacity=100))
+    await negative.record("bgpq4:AS-TYPO", _failure())
+
+    assert await negative.get("bgpq4:AS-TYPO") is not None
+    await negative.bloom.sync_task
+    assert "bgpq4:AS-TYPO" in negative.bloom
+
+
+@pytest.mark.asyncio
+async def test_disabled_with_zero_ttl():
+    cache = AsyncMock()
+    negative = NegativeCache(cache, ttl=0)
+
+    await negative.record("bgpq4:AS-TYPO", _failure())
+    assert await negative.get("bgpq4:AS-TYPO") is None
+    cache.set.assert_not_awaited()
+    cache.get.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_cache_errors_are_swallowed():
+    cache = AsyncMock()
+    cache.get.side_effect = CacheError("down")
+    cache.set.side_effect = CacheError("down")
+    negative = NegativeCache(cache, ttl=60)
+
+    await negative.record("bgpq4:AS-TYPO", _failure())
+    assert await negative.get("bgpq4:AS-TYPO") is None
+
+
+def test_describe_failure_falls_back_to_message():
+    assert describe_failure(_failure(stderr="  ")) == "bgpq4 failed"
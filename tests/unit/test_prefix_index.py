@@ -0,0 +1,172 @@
+import gzip
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.prefix_index import (
+    PrefixIndex,
+    PrefixIndexHolder,
+    PrefixTrie,
+    build_index_from_cache,
+    format_prefix,
+    parse_asn,
+    parse_prefix,
+)
+
+
+def test_parse_prefix_masks_host_bits():
+    assert parse_prefix("192.0.2.77/24") == (4, 0xC0000200, 24)
+    assert parse_prefix("2001:db8::1/32") == (6, 0x20010DB8 << 96, 32)
+
+
+def test_parse_prefix_invalid():
+    with pytest.raises(ValueError):
+        parse_prefix("not-a-prefix")
+    with pytest.raises(ValueError):
+        parse_prefix("192.0.2.0/33")
+
+
+def test_format_prefix_roundtrip():
+    assert format_prefix(*parse_prefix("198.51.100.0/24")) == "198.51.100.0/24"
+    assert format_prefix(*parse_prefix("2001:db8::/48")) == "2001:db8::/48"
+
+
+def test_parse_asn():
+    assert parse_asn("AS64500") == 64500
+    assert parse_asn("as64500") == 64500
+    assert parse_asn("64500") == 64500
+    assert parse_asn("AS-HURRICANE") is None
+
+
+def test_trie_covering_most_specific_first():
+    trie = PrefixTrie(4)
+    for prefix, value in [("10.0.0.0/8", "a"), ("10.1.0.0/16", "b"), ("10.1.2.0/24", "c")]:
+        _, network, length = parse_prefix(prefix)
+        trie.insert(network, length, value)
+
+    _, network, length = parse_prefix("10.1.2.128/25")
+    matches = trie.covering(network, length)
+    assert [m[2] for m in matches] == [("c",), ("b",), ("a",)]
+    assert len(trie) == 3
+
+
+def test_trie_split_and_branch_nodes():
+    trie = PrefixTrie(4)
+    for prefix in ["10.1.2.0/24", "10.1.3.0/24", "10.1.0.0/16", "10.0.0.0/8"]:
+        _, network, length = parse_prefix(prefix)
+        trie.insert(network, length, prefix)
+
+    assert len(trie) == 4
+    assert sorted(v[0] for _, _, v in trie) == sorted(
+        ["10.1.2.0/24", "10.1.3.0/24", "10.1.0.0/16", "10.0.0.0/8"]
+    )
+    _, network, length = parse_prefix("10.1.3.0/24")
+    assert [m[2][0] for m in trie.covering(network, length)] == [
+        "10.1.3.0/24",
+        "10.1.0.0/16",
+        "10.0.0.0/8",
+    ]
+    _, network, length = parse_prefix("10.2.0.0/16")
+    assert [m[2][0] for m in trie.covering(network, length)] == ["10.0.0.0/8"]
+
+
+def test_trie_no_match():
+    trie = PrefixTrie(4)
+    _, network, length = parse_prefix("10.0.0.0/8")
+    trie.insert(network, length, "a")
+    _, network, length = parse_prefix("192.0.2.0/24")
+    assert trie.covering(network, length) == []
+
+
+def test_index_lookup_origins_and_sets():
+    index = PrefixIndex()
+    index.add("192.0.2.0/24", origin=64500)
+    index.add("192.0.0.0/16", origin=64501)
+    index.add("192.0.0.0/16", as_set="AS-EXAMPLE")
+
+    result = index.lookup("192.0.2.0/25")
+    assert result["longest_match"] == "192.0.2.0/24"
+    assert result["origins"] == [64500]
+    assert result["as_sets"] == ["AS-EXAMPLE"]
+    assert [c["prefix"] for c in result["covering"]] == ["192.0.2.0/24", "192.0.0.0/16"]
+
+
+def test_index_lookup_ipv6():
+    index = PrefixIndex()
+    index.add("2001:db8::/32", origin=64500)
+    assert index.lookup("2001:db8:1::/48")["origins"] == [64500]
+    assert index.lookup("2001:db9::/48")["longest_match"] is None
+
+
+def test_index_lookup_many_invalid_prefix():
+    index = PrefixIndex()
+    results = index.lookup_many(["bogus", "192.0.2.0/24"])
+    assert results[0]["error"] == "Invalid prefix"
+    assert results[1]["longest_match"] is None
+
+
+def test_index_add_expansion():
+    index = PrefixIndex()
+    index.add_expansion("AS64500", ["192.0.2.0/24"])
+    index.add_expansion("as-example", ["192.0.2.0/24", "bogus"])
+    result = index.lookup("192.0.2.0/24")
+    assert result["origins"] == [64500]
+    assert result["as_sets"] == ["AS-EXAMPLE"]
+
+
+def test_index_load_rpsl(tmp_path):
+    dump = tmp_path / "radb.db.gz"
+    with gzip.open(dump, "wt") as f:
+        f.write(
+            "route:      192.0.2.0/24\norigin:     AS64500\nsource:     RADB\n\n"
+            "route6:     2001:db8::/32\norigin:     AS64501\n\n"
+            "aut-num:    AS64500\n\n"
+            "route:      198.51.100.0/24\norigin:     AS64502\n"
+        )
+    index = PrefixIndex()
+    assert index.load_rpsl(str(dump)) == 3
+    assert index.lookup("2001:db8::/48")["origins"] == [64501]
+    assert index.lookup("198.51.100.0/24")["origins"] == [64502]
+
+
+async def _scan(keys):
+    for key in keys:
+        yield key
+
+
+@pytest.mark.asyncio
+async def test_build_index_from_cache():
+    cache = MagicMock()
+    keys = [
+        "bgpq4:v2:json:0123456789abcdef:AS64500",
+        # Hierarchical set names contain colons
+        "bgpq4:v2:json:fedcba9876543210:AS64500:AS-EXAMPLE",
+    ]
+    cache.scan_keys = MagicMock(return_value=_scan(keys))
+    cache.get_many = AsyncMock(
+        return_value=[{"prefixes": ["192.0.2.0/24"]}, {"prefixes": ["192.0.2.0/24"]}]
+    )
+
+    index = await build_index_from_cache(cache)
+    cache.scan_keys.assert_called_once_with("bgpq4:v2:json:*")
+    result = index.lookup("192.0.2.0/24")
+    assert result["origins"] == [64500]
+    assert result["as_sets"] == ["AS64500:AS-EXAMPLE"]
+    assert index.built_at is not None
+
+
+@pytest.mark.asyncio
+async def test_index_holder_builds_once():
+    cache = MagicMock()
+    cache.scan_keys = MagicMock(side_effect=lambda pattern: _scan([]))
+    cache.get_many = AsyncMock(return_value=[])
+
+    holder = PrefixIndexHolder(max_age_seconds=300)
+    assert holder.is_stale()
+    first = await holder.get(cache)
+    second = await holder.get(cache)
+    assert first is second
+    assert cache.scan_keys.call_count == 1
+
+    await holder.get(cache, force=True)
+    assert cache.scan_keys.call_count == 2
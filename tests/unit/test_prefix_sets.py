@@ -0,0 +1,84 @@
+import pytest
+
+from app.prefix_sets import combine, pack, to_intervals, to_prefixes, unpack
+
+A = ["10.0.0.0/24", "192.0.2.0/24", "2001:db8::/32"]
+B = ["10.0.0.0/25", "10.0.0.128/25", "198.51.100.0/24", "2001:db8::/48"]
+
+
+def test_pack_sorts_and_dedups():
+    packed = pack(["192.0.2.0/24", "10.0.0.0/8", "192.0.2.1/24", "2001:db8::/32"])
+    assert unpack(packed) == ["10.0.0.0/8", "192.0.2.0/24", "2001:db8::/32"]
+
+
+def test_to_intervals_merges_adjacent_and_nested():
+    intervals = to_intervals(pack(["10.0.0.0/25", "10.0.0.128/25", "10.0.0.0/26"]))
+    assert intervals[4] == [(0x0A000000, 0x0A0000FF)]
+
+
+def test_to_prefixes_minimal_cidrs():
+    assert to_prefixes(4, [(0x0A000000, 0x0A0000FF)]) == [(0x0A000000, 24)]
+    assert to_prefixes(4, [(0, 2**32 - 1)]) == [(0, 0)]
+    # 10.0.0.1 - 10.0.0.6
+    assert to_prefixes(4, [(0x0A000001, 0x0A000006)]) == [
+        (0x0A000001, 32),
+        (0x0A000002, 31),
+        (0x0A000004, 31),
+        (0x0A000006, 32),
+    ]
+
+
+def test_union():
+    assert combine("union", [A, B]) == [
+        "10.0.0.0/24",
+        "10.0.0.0/25",
+        "10.0.0.128/25",
+        "192.0.2.0/24",
+        "198.51.100.0/24",
+        "2001:db8::/32",
+        "2001:db8::/48",
+    ]
+
+
+def test_union_aggregate():
+    assert combine("union", [A, B], aggregate=True) == [
+        "10.0.0.0/24",
+        "192.0.2.0/24",
+        "198.51.100.0/24",
+        "2001:db8::/32",
+    ]
+
+
+def test_intersection_is_containment_aware():
+    # The /24 is covered by the two /25s and vice versa
+    assert combine("intersection", [A, B]) == [
+        "10.0.0.0/24",
+        "10.0.0.0/25",
+        "10.0.0.128/25",
+        "2001:db8::/48",
+    ]
+
+
+def test_intersection_aggregate():
+    assert combine("intersection", [A, B], aggregate=True) == ["10.0.0.0/24", "2001:db8::/48"]
+
+
+def test_difference_drops_covered_more_specifics():
+    assert combine("difference", [B, A]) == ["198.51.100.0/24"]
+    assert combine("difference", [A, B]) == ["192.0.2.0/24", "2001:db8::/32"]
+
+
+def test_difference_aggregate_splits_address_space():
+    assert combine("difference", [["10.0.0.0/8"], ["10.0.0.0/9", "10.192.0.0/10"]], True) == [
+        "10.128.0.0/10"
+    ]
+
+
+def test_three_way_intersection():
+    lists = [["10.0.0.0/8"], ["10.1.0.0/16"], ["10.1.2.0/24", "192.0.2.0/24"]]
+    assert combine("intersection", lists) == ["10.1.2.0/24"]
+
+
+def test_unknown_operation():
+    with pytest.raises(ValueError):
+        combine("xor", [A, B])
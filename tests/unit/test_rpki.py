@@ -0,0 +1,174 @@
+import json
+import os
+
+import pytest
+
+from app.exceptions import RPKIError
+from app.prefix_index import PrefixIndex, PrefixIndexHolder
+from app.rpki import (
+    INVALID,
+    NOT_FOUND,
+    UNKNOWN,
+    VALID,
+    VRPHolder,
+    VRPStore,
+    apply_rov,
+    load_vrps,
+    resolve_origins,
+)
+
+
+@pytest.fixture
+def store():
+    store = VRPStore()
+    store.add("192.0.2.0/24", 64500)
+    store.add("198.51.100.0/22", 64501, max_length=24)
+    store.add("203.0.113.0/24", 0)
+    store.add("2001:db8::/32", 64502, max_length=48)
+    return store
+
+
+def test_validate_valid(store):
+    assert store.validate("192.0.2.0/24", 64500) == VALID
+    assert store.validate("198.51.101.0/24", 64501) == VALID
+    assert store.validate("2001:db8:1::/48", 64502) == VALID
+
+
+def test_validate_invalid_origin(store):
+    assert store.validate("192.0.2.0/24", 64999) == INVALID
+
+
+def test_validate_invalid_length(store):
+    assert store.validate("192.0.2.0/25", 64500) == INVALID
+    assert store.validate("2001:db8::/64", 64502) == INVALID
+
+
+def test_validate_as0(store):
+    assert store.validate("203.0.113.0/24", 0) == INVALID
+
+
+def test_validate_not_found(store):
+    assert store.validate("10.0.0.0/8", 64500) == NOT_FOUND
+
+
+def test_validate_unknown_origin(store):
+    assert store.validate("192.0.2.0/24", None) == UNKNOWN
+    # No VRP allows a /25, so every origin is invalid
+    assert store.validate("192.0.2.0/25", None) == INVALID
+    assert store.validate("203.0.113.0/24", None) == INVALID
+
+
+def test_validate_many(store):
+    pairs = [("192.0.2.0/24", 64500), ("10.0.0.0/8", 64500)]
+    assert store.validate_many(pairs) == [VALID, NOT_FOUND]
+
+
+def test_load_vrps_routinator_json(tmp_path):
+    path = tmp_path / "vrps.json"
+    path.write_text(
+        json.dumps(
+            {
+                "roas": [
+                    {"asn": "AS64500", "prefix": "192.0.2.0/24", "maxLength": 24, "ta": "ripe"},
+                    {"asn": 64501, "prefix": "2001:db8::/32", "maxLength": 48, "ta": "arin"},
+                ]
+            }
+        )
+    )
+    store = load_vrps(str(path))
+    assert store.count == 2
+    assert store.loaded_at is not None
+    assert store.validate("2001:db8:1::/48", 64501) == VALID
+
+
+def test_load_vrps_csv(tmp_path):
+    path = tmp_path / "vrps.csv"
+    path.write_text(
+        "ASN,IP Prefix,Max Length,Trust Anchor\n"
+        "AS64500,192.0.2.0/24,24,ripe\n"
+        "AS64501,198.51.100.0/22,23,arin\n"
+    )
+    store = load_vrps(str(path))
+    assert store.count == 2
+    assert store.validate("198.51.100.0/23", 64501) == VALID
+    assert store.validate("198.51.100.0/24", 64501) == INVALID
+
+
+def test_load_vrps_invalid(tmp_path):
+    path = tmp_path / "vrps.json"
+    path.write_text('{"roas": [{"asn": "bogus", "prefix": "192.0.2.0/24"}]}')
+    with pytest.raises(RPKIError):
+        load_vrps(str(path))
+
+
+@pytest.mark.asyncio
+async def test_vrp_holder_not_configured():
+    holder = VRPHolder(None)
+    with pytest.raises(RPKIError):
+        await holder.get()
+
+
+@pytest.mark.asyncio
+async def test_vrp_holder_hot_reload(tmp_path):
+    path = tmp_path / "vrps.csv"
+    path.write_text("AS64500,192.0.2.0/24,24,ripe\n")
+    holder = VRPHolder(str(path), reload_interval=0)
+
+    first = await holder.get()
+    assert first.count == 1
+
+    path.write_text("AS64500,192.0.2.0/24,24,ripe\nAS64501,198.51.100.0/24,24,ripe\n")
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    # The reload happens in the background while the old VRPs keep serving
+    assert await holder.get() is first
+    await holder._reload_task
+    assert (await holder.get()).count == 2
+
+
+@pytest.mark.asyncio
+async def test_vrp_holder_keeps_previous_on_bad_reload(tmp_path):
+    path = tmp_path / "vrps.csv"
+    path.write_text("AS64500,192.0.2.0/24,24,ripe\n")
+    holder = VRPHolder(str(path))
+    first = await holder.get()
+
+    path.write_text("bogus,row\n")
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert await holder.reload() is first
+
+
+def test_resolve_origins_from_asn_target():
+    assert resolve_origins("AS64500", ["192.0.2.0/24"], None) == [64500]
+
+
+def test_resolve_origins_from_index():
+    index = PrefixIndex()
+    index.add("192.0.2.0/24", origin=64500)
+    holder = PrefixIndexHolder(max_age_seconds=300)
+    holder.index = index
+    origins = resolve_origins("AS-EXAMPLE", ["192.0.2.0/24", "192.0.2.0/25"], holder)
+    assert origins == [64500, None]
+
+
+def test_apply_rov_annotate(store):
+    data = {"prefixes": ["192.0.2.0/24", "192.0.2.0/25", "10.0.0.0/8"], "count": 3}
+    result = apply_rov(data, "AS64500", "annotate", store)
+    assert result["count"] == 3
+    assert result["rov"]["states"] == {
+        "192.0.2.0/24": VALID,
+        "192.0.2.0/25": INVALID,
+        "10.0.0.0/8": NOT_FOUND,
+    }
+    assert result["rov"]["summary"][INVALID] == 1
+    assert "rov" not in data
+
+
+def test_apply_rov_drop(store):
+    data = {"prefixes": ["192.0.2.0/24", "192.0.2.0/25"], "count": 2}
+    result = apply_rov(data, "AS64500", "drop", store)
+    assert result["prefixes"] == ["192.0.2.0/24"]
+    assert result["count"] == 1
+    assert result["rov"]["dropped"] == ["192.0.2.0/25"]
@@ -0,0 +1,170 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from taskiq import InMemoryBroker, TaskiqEvents, TaskiqMessage, TaskiqResult
+
+from app.metrics import metrics
+from app.models.job import JobStatus
+from app.tasks.runtime import WorkerRuntime, WorkerRuntimeMiddleware, current_runtime
+
+
+def _message(**labels):
+    return TaskiqMessage(
+        task_id="t1", task_name="execute_bgpq4_query", labels=labels, args=[], kwargs={}
+    )
+
+
+@pytest.mark.asyncio
+async def test_runtime_holds_shared_clients_until_stopped():
+    cache = AsyncMock()
+    with (
+        patch("app.tasks.bgpq4_tasks.new_result_cache", return_value=cache),
+        patch("app.tasks.bgpq4_tasks.new_bgpq4_client") as new_client,
+    ):
+        runtime = WorkerRuntime(concurrency=4, name="w1")
+        await runtime.start()
+
+    assert runtime.started
+    assert current_runtime() is runtime
+    assert runtime.client is new_client.return_value
+    assert metrics.worker_capacity.labels(worker="w1")._value.get() == 4
+
+    await runtime.stop()
+    assert current_runtime() is None
+    assert not runtime.started
+    cache.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_runtime_drains_running_jobs_before_closing():
+    cache = AsyncMock()
+    with (
+        patch("app.tasks.bgpq4_tasks.new_result_cache", return_value=cache),
+        patch("app.tasks.bgpq4_tasks.new_bgpq4_client"),
+    ):
+        runtime = WorkerRuntime(drain_timeout=5, name="w1")
+        await runtime.start()
+
+    runtime.job_started()
+    stopping = asyncio.create_task(runtime.stop())
+    await asyncio.sleep(0.01)
+    assert not stopping.done()
+    cache.close.assert_not_called()
+
+    runtime.job_finished()
+    await stopping
+    cache.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_runtime_drain_gives_up_after_timeout():
+    with (
+        patch("app.tasks.bgpq4_tasks.new_result_cache", return_value=AsyncMock()),
+        patch("app.tasks.bgpq4_tasks.new_bgpq4_client"),
+    ):
+        runtime = WorkerRuntime(drain_timeout=0.01, name="w1")
+        await runtime.start()
+    runtime.job_started()
+    await runtime.stop()
+    assert not runtime.started
+
+
+def test_middleware_tracks_throughput_and_queue_latency():
+    runtime = WorkerRuntime(name="w2")
+    runtime.index = 3
+    middleware = WorkerRuntimeMiddleware(runtime)
+    ok = metrics.worker_tasks.labels(worker="w2", task="execute_bgpq4_query", outcome="ok")
+    before = ok._value.get()
+
+    middleware.pre_execute(_message(enqueued_at=time.time() - 2))
+    assert runtime.in_flight == 1
+    assert metrics.worker_in_flight.labels(worker="w2")._value.get() == 1
+    # Labelled by process index, not by hostname and pid
+    assert metrics.worker_queue_latency.labels(worker="worker-3")._sum.get() >= 2
+
+    result = TaskiqResult(is_err=False, return_value=None, execution_time=0.1)
+    middleware.post_execute(_message(), result)
+    assert runtime.in_flight == 0
+    assert ok._value.get() == before + 1
+
+
+@pytest.mark.asyncio
+async def test_runtime_metrics_port_is_offset_per_worker_process():
+    process = MagicMock()
+    process.name = "worker-2"
+    with (
+        patch("app.tasks.bgpq4_tasks.new_result_cache", return_value=AsyncMock()),
+        patch("app.tasks.bgpq4_tasks.new_bgpq4_client"),
+        patch("app.tasks.runtime.multiprocessing.current_process", return_value=process),
+        patch("app.tasks.runtime.start_http_server") as start_http_server,
+    ):
+        runtime = WorkerRuntime(metrics_port=9000, name="w4")
+        await runtime.start()
+        await runtime.stop()
+    start_http_server.assert_called_once_with(9002)
+    assert runtime.index == 2
+
+
+def test_runtime_install_hooks_worker_events():
+    broker = InMemoryBroker()
+    runtime = WorkerRuntime()
+    runtime.install(broker)
+    assert broker.event_handlers[TaskiqEvents.WORKER_STARTUP]
+    assert broker.event_handlers[TaskiqEvents.WORKER_SHUTDOWN]
+    assert any(isinstance(m, WorkerRuntimeMiddleware) for m in broker.middlewares)
+
+
+@pytest.mark.asyncio
+async def test_execute_bgpq4_query_uses_runtime_clients():
+    from app.tasks.bgpq4_tasks import execute_bgpq4_query
+
+    cache = AsyncMock()
+    cache.generate_key = MagicMock(return_value="bgpq4:AS-A")
+    client = AsyncMock()
+    client.execute_with_retry.return_value = "ip prefix-list test permit 192.0.2.0/24"
+    with (
+        patch("app.tasks.bgpq4_tasks.new_result_cache", return_value=cache),
+        patch("app.tasks.bgpq4_tasks.new_bgpq4_client", return_value=client),
+    ):
+        runtime = WorkerRuntime(name="w3")
+        await runtime.start()
+
+    with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
+        try:
+            result = await execute_bgpq4_query(
+                job_id=None,
+                target="AS-A",
+                sources=None,
+                format="cisco",
+                aggregate=False,
+                min_masklen=None,
+                max_masklen=None,
+                cache_ttl=300,
+            )
+        finally:
+            await runtime.stop()
+
+    assert result["status"] == JobStatus.COMPLETED
+    mock_cache_class.assert_not_called()
+    client.execute_with_retry.assert_awaited_once()
+    # Closed once by the runtime, never by the job
+    cache.close.assert_awaited_once()
+
+
+def test_worker_args_follow_settings():
+    from app.config import settings
+    from app.tasks.worker import worker_args
+
+    with (
+        patch.object(settings, "worker_concurrency", 25),
+        patch.object(settings, "worker_prefetch", 5),
+        patch.object(settings, "worker_drain_timeout", 60.0),
+    ):
+        args = worker_args()
+    assert args.broker == "app.tasks.worker:broker"
+    assert args.max_async_tasks == 25
+    assert args.max_prefetch == 5
+    assert args.wait_tasks_timeout == 60.0
+    assert args.shutdown_timeout > 60.0
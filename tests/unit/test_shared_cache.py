@@ -0,0 +1,112 @@
+import fcntl
+import json
+import multiprocessing
+import os
+from unittest.mock import patch
+
+import pytest
+
+from app.shared_cache import SharedMemoryCache
+
+
+def _cache(tmp_path, **options):
+    return SharedMemoryCache(str(tmp_path / "shm"), **{"arena_bytes": 4096, "slots": 64, **options})
+
+
+def test_set_get_delete(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("bgpq4:AS-A", json.dumps({"prefixes": ["192.0.2.0/24"]}), 30)
+    assert cache.get("bgpq4:AS-A") == {"prefixes": ["192.0.2.0/24"]}
+    assert cache.get("bgpq4:AS-B") is None
+
+    cache.set("bgpq4:AS-A", json.dumps({"prefixes": []}), 30)
+    assert cache.get("bgpq4:AS-A") == {"prefixes": []}
+    assert len(cache) == 1
+
+    cache.delete("bgpq4:AS-A")
+    assert cache.get("bgpq4:AS-A") is None
+    assert len(cache) == 0
+
+
+def test_only_prefixed_keys_are_kept(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("ttlstate:bgpq4:AS-A", "{}", 30)
+    assert cache.get("ttlstate:bgpq4:AS-A") is None
+    assert len(cache) == 0
+
+
+def test_ttl_is_capped(tmp_path):
+    cache = _cache(tmp_path, max_ttl=10)
+    with patch("app.shared_cache.time.time", return_value=1000.0):
+        cache.set("bgpq4:AS-A", "{}", 3600)
+    with patch("app.shared_cache.time.time", return_value=1009.0):
+        assert cache.get("bgpq4:AS-A") == {}
+    with patch("app.shared_cache.time.time", return_value=1010.0):
+        assert cache.get("bgpq4:AS-A") is None
+
+
+def test_compaction_evicts_least_recently_read(tmp_path):
+    cache = _cache(tmp_path, arena_bytes=2048)
+    value = json.dumps({"data": "x" * 180})
+    for i in range(5):
+        cache.set(f"bgpq4:AS-{i}", value, 30)
+    # Keep AS-0 recently used while the arena fills up
+    cache.get("bgpq4:AS-0")
+    for i in range(5, 12):
+        cache.set(f"bgpq4:AS-{i}", value, 30)
+        cache.get("bgpq4:AS-0")
+
+    assert cache.get("bgpq4:AS-0") is not None
+    assert cache.get("bgpq4:AS-1") is None
+    assert cache.get("bgpq4:AS-11") is not None
+    assert len(cache) < 12
+
+
+def test_index_full_compacts(tmp_path):
+    cache = _cache(tmp_path, arena_bytes=65536, slots=16)
+    for i in range(40):
+        cache.set(f"bgpq4:AS-{i}", "{}", 30)
+    assert cache.get("bgpq4:AS-39") == {}
+    assert len(cache) <= 12
+
+
+def test_reopened_with_other_layout_is_reset(tmp_path):
+    _cache(tmp_path).set("bgpq4:AS-A", "{}", 30)
+    assert _cache(tmp_path).get("bgpq4:AS-A") == {}
+    assert _cache(tmp_path, slots=128).get("bgpq4:AS-A") is None
+
+
+def _write(path):
+    SharedMemoryCache(path, arena_bytes=4096, slots=64).set("bgpq4:AS-A", '{"n": 1}', 30)
+
+
+@pytest.mark.asyncio
+async def test_async_access_waits_for_the_lock_off_the_loop(tmp_path):
+    cache = _cache(tmp_path)
+    await cache.aset("bgpq4:AS-A", json.dumps({"n": 1}), 10)
+    assert await cache.aget("bgpq4:AS-A") == {"n": 1}
+
+    # Another process holding the lock: reads fall back to a thread
+    other = os.open(f"{tmp_path / 'shm'}.index", os.O_RDWR)
+    fcntl.flock(other, fcntl.LOCK_EX)
+    try:
+        with patch("app.shared_cache.asyncio.to_thread") as to_thread:
+            to_thread.return_value = {"n": 2}
+            assert await cache.aget("bgpq4:AS-A") == {"n": 2}
+        to_thread.assert_called_once_with(cache.get, "bgpq4:AS-A")
+    finally:
+        fcntl.flock(other, fcntl.LOCK_UN)
+        os.close(other)
+
+    await cache.adelete("bgpq4:AS-A", "other:key")
+    assert await cache.aget("bgpq4:AS-A") is None
+
+
+def test_visible_across_processes(tmp_path):
+    path = str(tmp_path / "shm")
+    cache = SharedMemoryCache(path, arena_bytes=4096, slots=64)
+    process = multiprocessing.get_context("spawn").Process(target=_write, args=(path,))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+    assert cache.get("bgpq4:AS-A") == {"n": 1}
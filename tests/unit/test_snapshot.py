@@ -0,0 +1,183 @@
+import gzip
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.cache_tags import CacheTags
+from app.exceptions import CacheError
+from app.snapshot import (
+    export_file,
+    gunzip_lines,
+    gzip_stream,
+    iter_snapshot,
+    restore_file,
+    restore_snapshot,
+)
+
+
+def _cache(entries):
+    """A cache holding {key: (value, ttl, ttl_state)}."""
+    cache = AsyncMock()
+
+    async def scan_keys(pattern, count=1000):
+        for key in entries:
+            yield key
+
+    cache.scan_keys = MagicMock(side_effect=scan_keys)
+    cache.dump_many.side_effect = lambda keys: [
+        (json.dumps(entries[key][0]).encode(), entries[key][1]) for key in keys
+    ]
+    cache.get_many.side_effect = lambda keys: [
+        entries[key.removeprefix("ttlstate:")][2] for key in keys
+    ]
+    return cache
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+async def _lines(lines):
+    for line in lines:
+        yield line
+
+
+@pytest.mark.asyncio
+async def test_snapshot_lists_entries_with_metadata():
+    cache = _cache(
+        {
+            "bgpq4:AS-A": ({"prefixes": ["192.0.2.0/24"]}, 300, {"hash": "h", "ttl": 600}),
+            "bgpq4:AS-B": ({"prefixes": []}, -1, None),
+        }
+    )
+    hotkeys = AsyncMock()
+    hotkeys.counts.return_value = {"bgpq4:AS-A": 12}
+
+    lines = await _collect(iter_snapshot(cache, hotkeys, batch_size=1))
+
+    header = json.loads(lines[0])
+    assert header["version"] == 1
+    # Entries without expiry are not ours to snapshot
+    assert len(lines) == 2
+    assert json.loads(lines[1]) == {
+        "key": "bgpq4:AS-A",
+        "value": {"prefixes": ["192.0.2.0/24"]},
+        "ttl": 300,
+        "ttl_state": {"hash": "h", "ttl": 600},
+        "hits": 12,
+    }
+
+
+@pytest.mark.asyncio
+async def test_snapshot_carries_recorded_queries():
+    key = "bgpq4:v2:json:abc:AS-A"
+    cache = _cache({key: ({"count": 0}, 300, None)})
+    spec = {"target": "AS-A", "sources": ["RADB"], "resource": "as_set"}
+    cache.hget_many.return_value = [json.dumps(spec)]
+
+    lines = await _collect(iter_snapshot(cache, tags=CacheTags(cache)))
+
+    assert json.loads(lines[1])["query"] == spec
+    cache.hget_many.assert_awaited_once_with(["tag:target:AS-A"], [key])
+
+
+@pytest.mark.asyncio
+async def test_gzip_round_trip():
+    lines = ['{"version": 1}\n', '{"key": "a"}\n', '{"key": "b"}\n']
+    chunks = await _collect(gzip_stream(_lines(lines)))
+    assert gzip.decompress(b"".join(chunks)).decode() == "".join(lines)
+
+    async def rechunk():
+        data = b"".join(chunks)
+        for i in range(0, len(data), 7):
+            yield data[i : i + 7]
+
+    restored = [line for line in await _collect(gunzip_lines(rechunk())) if line]
+    assert restored == [line.strip() for line in lines]
+
+
+def _snapshot(created_at, *records):
+    header = json.dumps({"version": 1, "created_at": created_at})
+    return _lines([header, *(json.dumps(record) for record in records)])
+
+
+@pytest.mark.asyncio
+async def test_restore_filters_and_ages_entries():
+    cache = AsyncMock()
+    short = {"hash": "h", "ttl": 600}
+    long = {"hash": "h", "ttl": 3600}
+    snapshot = _snapshot(
+        1000.0,
+        {"key": "fresh", "value": {"n": 1}, "ttl": 500, "ttl_state": None, "hits": 9},
+        {"key": "cold", "value": {"n": 2}, "ttl": 500, "ttl_state": None, "hits": 1},
+        {"key": "expired", "value": {"n": 3}, "ttl": 50, "ttl_state": None, "hits": 9},
+        {"key": "old", "value": {}, "ttl": 500, "ttl_state": long, "hits": 9},
+        {"key": "young", "value": {}, "ttl": 500, "ttl_state": short, "hits": 9},
+    )
+
+    with patch("app.snapshot.time.time", return_value=1100.0):
+        result = await restore_snapshot(cache, snapshot, min_hits=5, max_age=600)
+
+    assert result == {"restored": 2, "skipped": 3}
+    entries = cache.write_many.call_args.args[0]
+    assert entries == [
+        ("fresh", '{"n": 1}', 400),
+        ("young", "{}", 400),
+        ("ttlstate:young", '{"hash": "h", "ttl": 600}', 604800),
+    ]
+    assert cache.write_many.call_args.kwargs == {"nx": True, "fallback": False}
+
+
+@pytest.mark.asyncio
+async def test_restore_tags_entries_again():
+    cache = AsyncMock()
+    query = {"target": "AS-A", "sources": ["RADB"], "format": "json", "resource": "as_set"}
+    snapshot = _snapshot(
+        time.time(),
+        {"key": "k1", "value": {}, "ttl": 500, "ttl_state": None, "hits": 0, "query": query},
+        {"key": "k2", "value": {}, "ttl": 500, "ttl_state": None, "hits": 0},
+    )
+
+    await restore_snapshot(cache, snapshot, tags=CacheTags(cache, ttl=900))
+
+    # Only the entry with a recorded query can be tagged
+    _, calls = cache.eval_many.call_args.args
+    assert [keys[0] for keys, _ in calls] == ["tag:target:AS-A", "tag:source:RADB"]
+    field, spec, *_ = calls[0][1]
+    assert field == "k1"
+    assert json.loads(spec)["resource"] == "as_set"
+
+
+@pytest.mark.asyncio
+async def test_restore_fails_while_redis_is_unavailable():
+    cache = AsyncMock()
+    cache.write_many.side_effect = CacheError("circuit open")
+    snapshot = _snapshot(
+        time.time(), {"key": "k", "value": {}, "ttl": 500, "ttl_state": None, "hits": 0}
+    )
+    with pytest.raises(CacheError):
+        await restore_snapshot(cache, snapshot, tags=CacheTags(cache))
+    cache.eval_many.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_restore_rejects_unknown_version():
+    with pytest.raises(ValueError):
+        await restore_snapshot(AsyncMock(), _lines(['{"version": 99}']))
+    with pytest.raises(ValueError):
+        await restore_snapshot(AsyncMock(), _lines([]))
+
+
+@pytest.mark.asyncio
+async def test_file_round_trip(tmp_path):
+    path = str(tmp_path / "cache.jsonl.gz")
+    source = _cache({"bgpq4:AS-A": ({"count": 0}, 300, None)})
+    assert await export_file(source, path) == 1
+
+    target = AsyncMock()
+    assert await restore_file(target, path) == {"restored": 1, "skipped": 0}
+    key, value, ttl = target.write_many.call_args.args[0][0]
+    assert (key, value) == ("bgpq4:AS-A", '{"count": 0}')
+    assert 299 <= ttl <= 300
@@ -1,4 +1,5 @@
-from unittest.mock import AsyncMock, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -11,11 +12,12 @@ async def test_execute_bgpq4_query_success():
     with patch("app.tasks.bgpq4_tasks.BGPq4Client") as mock_client_class:
         mock_client = AsyncMock()
         mock_client.execute_with_retry.return_value = '{"NN": []}'
-        mock_client.parse_json_output.return_value = {"prefixes": [], "count": 0}
+        mock_client.parse_json_output = MagicMock(return_value={"prefixes": [], "count": 0})
         mock_client_class.return_value = mock_client
 
         with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
             mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="test-cache-key")
             mock_cache_class.return_value = mock_cache
 
             result = await execute_bgpq4_query(
@@ -30,7 +32,9 @@ async def test_execute_bgpq4_query_success():
             )
 
             assert result["status"] == JobStatus.COMPLETED
-            assert "data" in result
+            # The payload is only cached, the job result points at it
+            assert "data" not in result
+            assert result["result_key"] == mock_cache.set.call_args[0][0]
 
 
 @pytest.mark.asyncio
@@ -42,6 +46,7 @@ async def test_execute_bgpq4_query_failure():
 
         with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
             mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="test-cache-key")
             mock_cache_class.return_value = mock_cache
 
             result = await execute_bgpq4_query(
@@ -69,6 +74,7 @@ async def test_execute_bgpq4_query_non_json_format():
 
         with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
             mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="test-cache-key")
             mock_cache_class.return_value = mock_cache
 
             result = await execute_bgpq4_query(
@@ -83,7 +89,7 @@ async def test_execute_bgpq4_query_non_json_format():
             )
 
             assert result["status"] == JobStatus.COMPLETED
-            assert "output" in result["data"]
+            assert "output" in mock_cache.set.call_args[0][1]
             # parse_json_output should NOT be called for non-json format
             mock_client.parse_json_output.assert_not_called()
 
@@ -102,6 +108,7 @@ async def test_execute_bgpq4_query_bgpq4_error():
 
         with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
             mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="test-cache-key")
             mock_cache_class.return_value = mock_cache
 
             result = await execute_bgpq4_query(
@@ -118,3 +125,306 @@ async def test_execute_bgpq4_query_bgpq4_error():
             assert result["status"] == JobStatus.FAILED
             assert "error" in result
             assert "bgpq4 failed" in result["error"]
+
+
+@pytest.mark.asyncio
+async def test_execute_bgpq4_query_records_job():
+    """Test that the job record tracks the run and points at the cached result."""
+    with patch("app.tasks.bgpq4_tasks.BGPq4Client") as mock_client_class:
+        mock_client = AsyncMock()
+        mock_client.execute_with_retry.return_value = "{}"
+        mock_client.parse_json_output = MagicMock(
+            return_value={"prefixes": ["192.0.2.0/24"], "count": 1}
+        )
+        mock_client_class.return_value = mock_client
+
+        with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
+            mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+            mock_cache_class.return_value = mock_cache
+
+            result = await execute_bgpq4_query(
+                job_id="test-job",
+                target="AS64500",
+                sources=None,
+                format="json",
+                aggregate=False,
+                min_masklen=None,
+                max_masklen=None,
+                cache_ttl=300,
+            )
+
+            assert result["status"] == JobStatus.COMPLETED
+            job_writes = [c for c in mock_cache.hset.call_args_list if c[0][0] == "job:test-job"]
+            assert [c[0][1]["status"] for c in job_writes] == ["processing", "completed"]
+            assert job_writes[1][0][1]["result_key"] == "test-cache-key"
+            assert "prefixes" not in str(job_writes)
+
+
+@pytest.mark.asyncio
+async def test_execute_bgpq4_query_records_job_failure():
+    """Test that failures are recorded, and jobs without an ID are not."""
+    with patch("app.tasks.bgpq4_tasks.BGPq4Client") as mock_client_class:
+        mock_client = AsyncMock()
+        mock_client.execute_with_retry.side_effect = Exception("Connection failed")
+        mock_client_class.return_value = mock_client
+
+        with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
+            mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+            mock_cache_class.return_value = mock_cache
+
+            query = {
+                "target": "AS64500",
+                "sources": None,
+                "format": "json",
+                "aggregate": False,
+                "min_masklen": None,
+                "max_masklen": None,
+                "cache_ttl": 300,
+            }
+            await execute_bgpq4_query(job_id="test-job", **query)
+            key, record, _ = mock_cache.hset.call_args[0]
+            assert key == "job:test-job"
+            assert record["status"] == "failed"
+            assert "Connection failed" in record["error"]
+
+            mock_cache.hset.reset_mock()
+            result = await execute_bgpq4_query(job_id=None, **query)
+            assert result["status"] == JobStatus.FAILED
+            mock_cache.hset.assert_not_called()
+            mock_cache.close.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_execute_bgpq4_query_records_latency():
+    with patch("app.tasks.bgpq4_tasks.BGPq4Client") as mock_client_class:
+        mock_client = AsyncMock()
+        mock_client.execute_with_retry.return_value = "ip prefix-list test permit 192.0.2.0/24"
+        mock_client_class.return_value = mock_client
+
+        with (
+            patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class,
+            patch("app.tasks.bgpq4_tasks.LatencyTracker") as mock_tracker_class,
+        ):
+            mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+            mock_cache_class.return_value = mock_cache
+            mock_tracker = AsyncMock()
+            mock_tracker_class.return_value = mock_tracker
+
+            await execute_bgpq4_query(
+                job_id="test-job",
+                target="AS-HURRICANE",
+                sources=None,
+                format="cisco",
+                aggregate=False,
+                min_masklen=None,
+                max_masklen=None,
+                cache_ttl=300,
+                resource="as_set",
+            )
+
+            mock_tracker.record.assert_called_once()
+            assert mock_tracker.record.call_args[0][:2] == ("as_set", "AS-HURRICANE")
+
+
+@pytest.mark.asyncio
+async def test_execute_bgpq4_query_permanent_failure_cached():
+    from app.exceptions import BGPq4PermanentError
+
+    with patch("app.tasks.bgpq4_tasks.BGPq4Client") as mock_client_class:
+        mock_client = AsyncMock()
+        mock_client.execute_with_retry.side_effect = BGPq4PermanentError(
+            message="bgpq4 failed", return_code=1, stderr="no such object"
+        )
+        mock_client_class.return_value = mock_client
+
+        with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
+            mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="bgpq4:AS-TYPO")
+            mock_cache_class.return_value = mock_cache
+
+            result = await execute_bgpq4_query(
+                job_id="test-job",
+                target="AS-TYPO",
+                sources=None,
+                format="json",
+                aggregate=False,
+                min_masklen=None,
+                max_masklen=None,
+                cache_ttl=300,
+            )
+
+            assert result["status"] == JobStatus.FAILED
+            mock_cache.set.assert_awaited_once()
+            assert mock_cache.set.call_args.args[0] == "negative:bgpq4:AS-TYPO"
+
+
+@pytest.mark.asyncio
+async def test_execute_bgpq4_query_skips_job_cancelled_while_queued():
+    with patch("app.tasks.bgpq4_tasks.BGPq4Client") as mock_client_class:
+        mock_client = AsyncMock()
+        mock_client_class.return_value = mock_client
+
+        with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
+            mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+            mock_cache.hgetall.return_value = {
+                "status": "cancelled",
+                "cancelled_at": "1700000000.0",
+            }
+            mock_cache_class.return_value = mock_cache
+
+            result = await execute_bgpq4_query(
+                job_id="test-job",
+                target="AS-HURRICANE",
+                sources=None,
+                format="json",
+                aggregate=False,
+                min_masklen=None,
+                max_masklen=None,
+                cache_ttl=300,
+            )
+
+            assert result["status"] == JobStatus.CANCELLED
+            mock_client.execute_with_retry.assert_not_called()
+            statuses = [c.args[1]["status"] for c in mock_cache.hset.call_args_list]
+            assert statuses == ["cancelled"]
+
+
+@pytest.mark.asyncio
+async def test_execute_bgpq4_query_stops_job_cancelled_while_running():
+    from app.config import settings
+
+    stopped = asyncio.Event()
+
+    async def slow_query(*args, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        finally:
+            stopped.set()
+
+    with patch("app.tasks.bgpq4_tasks.BGPq4Client") as mock_client_class:
+        mock_client = AsyncMock()
+        mock_client.execute_with_retry.side_effect = slow_query
+        mock_client_class.return_value = mock_client
+
+        with (
+            patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class,
+            patch.object(settings, "job_cancel_poll_seconds", 0.01),
+        ):
+            mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="test-cache-key")
+            # Cancelled after the worker started it, the status overwritten by the start
+            mock_cache.hgetall.side_effect = [
+                {"status": "pending"},
+                {"status": "processing"},
+                {"status": "processing", "cancelled_at": "1700000000.0"},
+            ]
+            mock_cache_class.return_value = mock_cache
+
+            result = await execute_bgpq4_query(
+                job_id="test-job",
+                target="AS-HURRICANE",
+                sources=None,
+                format="json",
+                aggregate=False,
+                min_masklen=None,
+                max_masklen=None,
+                cache_ttl=300,
+            )
+
+            assert result["status"] == JobStatus.CANCELLED
+            assert stopped.is_set()
+            mock_cache.set.assert_not_called()
+            statuses = [c.args[1]["status"] for c in mock_cache.hset.call_args_list]
+            assert statuses == ["processing", "cancelled"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_hot_keys_refreshes_entries_about_to_expire():
+    from app.models.job import JobStatus
+    from app.tasks.bgpq4_tasks import refresh_hot_keys
+
+    query = {"target": "AS-HOT", "cache_ttl": 300}
+    with (
+        patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class,
+        patch("app.tasks.bgpq4_tasks.HotKeyTracker") as mock_tracker_class,
+        patch("app.tasks.bgpq4_tasks.execute_bgpq4_query") as mock_execute,
+    ):
+        mock_cache = AsyncMock()
+        # About to expire, fresh, already gone
+        mock_cache.ttl_many.return_value = [30, 1000, -2]
+        mock_cache_class.return_value = mock_cache
+        mock_tracker = AsyncMock()
+        mock_tracker.hottest.return_value = [
+            ("k1", 50, query),
+            ("k2", 40, query),
+            ("k3", 30, query),
+        ]
+        mock_tracker_class.return_value = mock_tracker
+        mock_execute.return_value = {"status": JobStatus.COMPLETED, "cache_ttl": 600}
+
+        result = await refresh_hot_keys()
+
+    assert result == {"hot": 3, "due": 1, "refreshed": 1}
+    # Not recorded as a job: no record, events or cancellation polling
+    mock_execute.assert_awaited_once_with(job_id=None, **query)
+    mock_tracker.mark_refreshed.assert_awaited_once_with("k1", 600)
+
+
+@pytest.mark.asyncio
+async def test_refresh_hot_keys_failed_refresh_not_marked():
+    from app.models.job import JobStatus
+    from app.tasks.bgpq4_tasks import refresh_hot_keys
+
+    with (
+        patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class,
+        patch("app.tasks.bgpq4_tasks.HotKeyTracker") as mock_tracker_class,
+        patch("app.tasks.bgpq4_tasks.execute_bgpq4_query") as mock_execute,
+    ):
+        mock_cache = AsyncMock()
+        mock_cache.ttl_many.return_value = [10]
+        mock_cache_class.return_value = mock_cache
+        mock_tracker = AsyncMock()
+        mock_tracker.hottest.return_value = [("k1", 50, {"target": "AS-HOT", "cache_ttl": 300})]
+        mock_tracker_class.return_value = mock_tracker
+        mock_execute.return_value = {"status": JobStatus.FAILED}
+
+        assert (await refresh_hot_keys())["refreshed"] == 0
+
+    mock_tracker.mark_refreshed.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_execute_bgpq4_query_adaptive_ttl():
+    from app.adaptive_ttl import content_hash
+
+    data = {"prefixes": [], "count": 0}
+    with patch("app.tasks.bgpq4_tasks.BGPq4Client") as mock_client_class:
+        mock_client = AsyncMock()
+        mock_client.execute_with_retry.return_value = '{"NN": []}'
+        mock_client.parse_json_output = MagicMock(return_value=data)
+        mock_client_class.return_value = mock_client
+
+        with patch("app.tasks.bgpq4_tasks.RedisCache") as mock_cache_class:
+            mock_cache = AsyncMock()
+            mock_cache.generate_key = MagicMock(return_value="bgpq4:AS-STABLE")
+            # The result did not change since the last write
+            mock_cache.get.return_value = {"hash": content_hash(data), "ttl": 600}
+            mock_cache_class.return_value = mock_cache
+
+            result = await execute_bgpq4_query(
+                job_id="test-job",
+                target="AS-STABLE",
+                sources=None,
+                format="json",
+                aggregate=False,
+                min_masklen=None,
+                max_masklen=None,
+                cache_ttl=None,
+            )
+
+            assert result["cache_ttl"] == 1200
+            mock_cache.set.assert_any_call("bgpq4:AS-STABLE", data, 1200, stale_ttl=0)